@@ -0,0 +1,168 @@
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from models.achievementModel import Achievement
+from models.achievementStatusModel import UserAchievementStatus
+from sockets_events import sio
+import cache_invalidation
+
+# Eventos que disparam a avaliação dos troféus
+SCREENTIME_RECORDED = "screentime_recorded"
+TASK_TOGGLED = "task_toggled"
+QUESTIONS_ANSWERED = "questions_answered"
+
+
+# Nome da cache do catálogo no canal de invalidação
+ACHIEVEMENT_CATALOG = "achievement_catalog"
+
+
+class AchievementInfo(NamedTuple):
+    id: int
+    name: str
+    description: str
+    tag: str
+    image: Optional[str]
+
+
+class Catalog(NamedTuple):
+    achievements: List[AchievementInfo]
+    by_id: Dict[int, AchievementInfo]
+    by_tag: Dict[str, AchievementInfo]
+
+
+# Catálogo de troféus em memória. Muda raramente, por isso é lido uma vez e só volta à base
+# de dados depois de ser invalidado (ver cache_invalidation, também entre processos).
+_catalog: Optional[Catalog] = None
+_catalog_version = 0
+_catalog_lock = threading.Lock()
+
+def load_catalog(db: Session) -> Catalog:
+    global _catalog
+    version = _catalog_version
+    achievements = [
+        AchievementInfo(achievement.id, achievement.name, achievement.description, achievement.tag, achievement.image)
+        for achievement in db.query(Achievement).order_by(Achievement.id).all()
+    ]
+    # Com tags repetidas fica o troféu com menor ID, como acontecia com `.first()`
+    by_tag = {}
+    for achievement in achievements:
+        by_tag.setdefault(achievement.tag, achievement)
+    catalog = Catalog(achievements, {achievement.id: achievement for achievement in achievements}, by_tag)
+
+    # Se o catálogo foi invalidado durante a leitura, esta versão pode já estar desatualizada
+    with _catalog_lock:
+        if version == _catalog_version:
+            _catalog = catalog
+    return catalog
+
+def get_catalog(db: Session) -> Catalog:
+    return _catalog or load_catalog(db)
+
+def invalidate_catalog(key: Optional[str] = None):
+    global _catalog, _catalog_version
+    with _catalog_lock:
+        _catalog = None
+        _catalog_version += 1
+
+cache_invalidation.register(ACHIEVEMENT_CATALOG, invalidate_catalog)
+
+
+class Rule(NamedTuple):
+    tag: str
+    events: Tuple[str, ...]
+    predicate: Callable[["RuleContext", int, Any], bool]
+
+
+# Registo das regras: evento -> regras, pela ordem em que foram registadas
+_rules_by_event: Dict[str, List[Rule]] = defaultdict(list)
+
+# Regista uma regra de troféu. O predicado recebe o contexto, o ID do utilizador e os dados
+# do evento desse utilizador, e devolve True se o troféu deve ser desbloqueado. Ex:
+#
+#     @achievement_rule("horaderecolher", SCREENTIME_RECORDED)
+#     def horaderecolher(ctx, user_id, usages):
+#         return any(less_than_4_hours(usage) for usage in usages)
+def achievement_rule(tag: str, *events: str):
+    def register(predicate):
+        rule = Rule(tag, events, predicate)
+        for event in events:
+            _rules_by_event[event].append(rule)
+        return predicate
+    return register
+
+def rules_for(event: str) -> List[Rule]:
+    return _rules_by_event.get(event, [])
+
+
+# Estado partilhado pelas regras durante uma avaliação. `cached` guarda resultados caros
+# (ex: o streak de tarefas) para que várias regras os calculem uma só vez.
+class RuleContext:
+    def __init__(self, db: Session, payloads: Dict[int, Any]):
+        self.db = db
+        self.payloads = payloads
+        self._cache = {}
+
+    def cached(self, key, compute: Callable[[], Any]):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+
+# Avalia as regras do evento para um ou mais utilizadores ({user_id: dados do evento}).
+# Lê de uma vez os troféus já desbloqueados, só avalia as regras ainda por desbloquear
+# e insere os novos num único INSERT. Devolve a lista de (user_id, achievement) desbloqueados (sem commit).
+def evaluate_achievements(db: Session, event: str, payloads: Dict[int, Any]) -> List[Tuple[int, AchievementInfo]]:
+    catalog = get_catalog(db)
+    rules = [rule for rule in rules_for(event) if rule.tag in catalog.by_tag]
+    if not rules or not payloads:
+        return []
+
+    user_ids = list(payloads.keys())
+    unlocked = set(
+        db.query(UserAchievementStatus.id_user, UserAchievementStatus.id_achievement)
+        .filter(
+            UserAchievementStatus.id_user.in_(user_ids),
+            UserAchievementStatus.id_achievement.in_([catalog.by_tag[rule.tag].id for rule in rules])
+        )
+        .all()
+    )
+
+    ctx = RuleContext(db, payloads)
+    unlocked_now = [
+        (user_id, catalog.by_tag[rule.tag])
+        for user_id in user_ids
+        for rule in rules
+        if (user_id, catalog.by_tag[rule.tag].id) not in unlocked and rule.predicate(ctx, user_id, payloads[user_id])
+    ]
+    if not unlocked_now:
+        return []
+
+    # ON CONFLICT: outro pedido ou worker pode ter atribuído o mesmo troféu entretanto
+    inserted = set(db.execute(
+        insert(UserAchievementStatus).values([
+            {"id_user": user_id, "id_achievement": achievement.id, "done": True}
+            for user_id, achievement in unlocked_now
+        ]).on_conflict_do_nothing().returning(UserAchievementStatus.id_user, UserAchievementStatus.id_achievement)
+    ).all())
+    return [(user_id, achievement) for user_id, achievement in unlocked_now if (user_id, achievement.id) in inserted]
+
+# Notificações por socket, como tuplos (evento, dados, sala), com os dados do catálogo em memória
+def trophy_notifications(unlocked: List[Tuple[int, AchievementInfo]]):
+    return [
+        (
+            'trophy_unlocked',
+            {
+                "title": achievement.name,
+                "description": achievement.description,
+                "image": achievement.image
+            },
+            f"user_{user_id}"
+        )
+        for user_id, achievement in unlocked
+    ]
+
+async def emit_notifications(notifications):
+    for event, data, room in notifications:
+        await sio.emit(event, data, room=room)
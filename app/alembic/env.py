@@ -19,7 +19,7 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
-from models import userModel, taskModel, taskStatusModel, digitalHabitModel, userDigitalHabitModel, screentimeModel, questionModel, questionStatusModel, achievementModel, achievementStatusModel
+from models import userModel, taskModel, taskStatusModel, digitalHabitModel, userDigitalHabitModel, screentimeModel, questionModel, questionStatusModel, achievementModel, achievementStatusModel, screentimeDailyModel, lumicheckUsageModel, appNameModel, appUsageDailyModel, userStreakModel, jobRunModel
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
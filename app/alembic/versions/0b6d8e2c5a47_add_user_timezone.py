@@ -0,0 +1,30 @@
+"""add timezone to user
+
+Revision ID: 0b6d8e2c5a47
+Revises: f4c1a7e93d25
+Create Date: 2025-07-03 15:20:11.384705
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b6d8e2c5a47'
+down_revision: Union[str, None] = 'f4c1a7e93d25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('user', sa.Column('timezone', sa.String(), nullable=True))
+    op.create_index(op.f('ix_user_timezone'), 'user', ['timezone'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_user_timezone'), table_name='user')
+    op.drop_column('user', 'timezone')
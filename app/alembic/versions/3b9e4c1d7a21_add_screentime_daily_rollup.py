@@ -0,0 +1,35 @@
+"""add screentime_daily rollup
+
+Revision ID: 3b9e4c1d7a21
+Revises: fcedf6f2f446
+Create Date: 2025-06-02 10:12:31.418233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9e4c1d7a21'
+down_revision: Union[str, None] = 'fcedf6f2f446'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('screentime_daily',
+    sa.Column('id_user', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('total_minutes', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['id_user'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id_user', 'day')
+    )
+    # O backfill dos dados existentes é feito com `python backfill_screentime.py`
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('screentime_daily')
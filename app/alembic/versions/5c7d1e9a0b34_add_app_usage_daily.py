@@ -0,0 +1,80 @@
+"""add app_name and app_usage_daily
+
+Revision ID: 5c7d1e9a0b34
+Revises: 8f2a6d0c4e17
+Create Date: 2025-06-11 09:27:45.150392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c7d1e9a0b34'
+down_revision: Union[str, None] = '8f2a6d0c4e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_CHUNK_SIZE = 20000
+
+# jsonb_each falha com valores que não são objetos, por isso usa-se um objeto vazio nesses casos
+APP_BREAKDOWN = "CASE WHEN jsonb_typeof(s.usage_data -> 'app_breakdown') = 'object' THEN s.usage_data -> 'app_breakdown' ELSE '{}'::jsonb END"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('app_name',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('app_usage_daily',
+    sa.Column('id_user', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('id_app', sa.Integer(), nullable=False),
+    sa.Column('minutes', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['id_user'], ['user.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['id_app'], ['app_name.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id_user', 'day', 'id_app')
+    )
+    op.create_index('ix_app_usage_daily_user_app_day', 'app_usage_daily', ['id_user', 'id_app', 'day'], unique=False, postgresql_include=['minutes'])
+
+    # Backfill a partir do JSONB existente, em blocos de IDs com commit por bloco
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        min_id, max_id = bind.execute(sa.text("SELECT min(id), max(id) FROM screentime")).one()
+        if min_id is None:
+            return
+
+        for start in range(min_id, max_id + 1, BACKFILL_CHUNK_SIZE):
+            params = {"start": start, "end": start + BACKFILL_CHUNK_SIZE}
+            bind.execute(sa.text(f"""
+                INSERT INTO app_name (name)
+                SELECT DISTINCT app.key
+                FROM screentime s
+                CROSS JOIN LATERAL jsonb_each({APP_BREAKDOWN}) AS app
+                WHERE s.id >= :start AND s.id < :end
+                ON CONFLICT (name) DO NOTHING
+            """), params)
+            bind.execute(sa.text(f"""
+                INSERT INTO app_usage_daily (id_user, day, id_app, minutes)
+                SELECT s.id_user, date(s.timestamp), a.id, max(round((app.value #>> '{{}}')::numeric))::int
+                FROM screentime s
+                CROSS JOIN LATERAL jsonb_each({APP_BREAKDOWN}) AS app
+                JOIN app_name a ON a.name = app.key
+                WHERE s.id >= :start AND s.id < :end
+                  AND jsonb_typeof(app.value) = 'number'
+                GROUP BY s.id_user, date(s.timestamp), a.id
+                ON CONFLICT (id_user, day, id_app) DO UPDATE
+                SET minutes = GREATEST(app_usage_daily.minutes, excluded.minutes)
+            """), params)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_app_usage_daily_user_app_day', table_name='app_usage_daily')
+    op.drop_table('app_usage_daily')
+    op.drop_table('app_name')
@@ -0,0 +1,56 @@
+"""add per-user composite indexes
+
+Revision ID: 7a3f9d2b6e18
+Revises: 0b6d8e2c5a47
+Create Date: 2025-07-08 11:45:27.006913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3f9d2b6e18'
+down_revision: Union[str, None] = '0b6d8e2c5a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def drop_invalid_index(name: str, table_name: str, concurrently: bool = True) -> None:
+    # Um CREATE INDEX CONCURRENTLY que falhe deixa um índice INVALID com o mesmo nome: o if_not_exists
+    # (ou o to_regclass) dava-o como criado e o planeador nunca o usaria
+    invalid = op.get_bind().execute(
+        sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+    if invalid:
+        op.drop_index(name, table_name=table_name, postgresql_concurrently=concurrently)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY não bloqueia as escritas, mas não pode correr dentro de uma transação
+    with op.get_context().autocommit_block():
+        drop_invalid_index('ix_task_status_user_completed_at', 'task_status')
+        drop_invalid_index('ix_task_status_user_done', 'task_status')
+        op.create_index('ix_task_status_user_completed_at', 'task_status', ['id_user', 'completed_at'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_task_status_user_done', 'task_status', ['id_user', 'done'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+        # Normalmente já existe (b41c8e2f6d90). Tabelas particionadas e hypertables não aceitam CONCURRENTLY.
+        bind = op.get_bind()
+        relkind = bind.execute(sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass('screentime')")).scalar()
+        timescale = bind.execute(sa.text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'timescaledb')")).scalar()
+        concurrently = relkind == 'r' and not timescale
+        drop_invalid_index('ix_screentime_user_timestamp', 'screentime', concurrently)
+        if not bind.execute(sa.text("SELECT to_regclass('ix_screentime_user_timestamp') IS NOT NULL")).scalar():
+            op.create_index('ix_screentime_user_timestamp', 'screentime', ['id_user', 'timestamp'], unique=False, postgresql_concurrently=concurrently)
+
+    # question_status: a chave primária (id_user, id_question) já serve as consultas por utilizador
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_task_status_user_done', table_name='task_status', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_task_status_user_completed_at', table_name='task_status', postgresql_concurrently=True, if_exists=True)
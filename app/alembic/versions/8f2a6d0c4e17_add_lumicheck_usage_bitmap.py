@@ -0,0 +1,35 @@
+"""add lumicheck_usage bitmap
+
+Revision ID: 8f2a6d0c4e17
+Revises: 3b9e4c1d7a21
+Create Date: 2025-06-05 16:40:08.702115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2a6d0c4e17'
+down_revision: Union[str, None] = '3b9e4c1d7a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('lumicheck_usage',
+    sa.Column('id_user', sa.Integer(), nullable=False),
+    sa.Column('last_day', sa.Date(), nullable=False),
+    sa.Column('days_bitmap', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['id_user'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id_user')
+    )
+    # O backfill dos dados existentes é feito com `python backfill_screentime.py`
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('lumicheck_usage')
@@ -0,0 +1,61 @@
+"""exclude daily snapshots from screentime_hourly
+
+Revision ID: 9d4b2f7c1e53
+Revises: 7a3f9d2b6e18
+Create Date: 2025-07-15 10:22:41.518306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4b2f7c1e53'
+down_revision: Union[str, None] = '7a3f9d2b6e18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def create_screentime_hourly(where: str) -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP MATERIALIZED VIEW screentime_hourly")
+        op.execute(f"""
+            CREATE MATERIALIZED VIEW screentime_hourly
+            WITH (timescaledb.continuous) AS
+            SELECT id_user,
+                   time_bucket(INTERVAL '1 hour', "timestamp") AS bucket,
+                   max(round((usage_data ->> 'total_minutes')::numeric)::int) AS max_minutes,
+                   avg(round((usage_data ->> 'total_minutes')::numeric)::int) AS avg_minutes,
+                   count(usage_data ->> 'total_minutes') AS samples
+            FROM screentime
+            {where}
+            GROUP BY id_user, time_bucket(INTERVAL '1 hour', "timestamp")
+            WITH NO DATA
+        """)
+        op.execute("""
+            SELECT add_continuous_aggregate_policy('screentime_hourly',
+                start_offset => INTERVAL '3 days',
+                end_offset => INTERVAL '1 hour',
+                schedule_interval => INTERVAL '30 minutes')
+        """)
+        op.execute("CALL refresh_continuous_aggregate('screentime_hourly', NULL, now() - INTERVAL '1 hour')")
+
+
+def has_screentime_hourly() -> bool:
+    return op.get_bind().execute(sa.text("SELECT to_regclass('screentime_hourly') IS NOT NULL")).scalar()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Os snapshots diários têm o timestamp no início do dia (a chave única de uma hypertable tem de
+    # incluir a coluna de partição), por isso não dizem a que hora o uso foi registado
+    if has_screentime_hourly():
+        create_screentime_hourly("WHERE NOT daily_snapshot")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if has_screentime_hourly():
+        create_screentime_hourly("")
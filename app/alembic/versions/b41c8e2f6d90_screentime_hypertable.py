@@ -0,0 +1,141 @@
+"""screentime as hypertable (or monthly partitions)
+
+Revision ID: b41c8e2f6d90
+Revises: 5c7d1e9a0b34
+Create Date: 2025-06-18 11:03:52.664020
+
+"""
+import os
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41c8e2f6d90'
+down_revision: Union[str, None] = '5c7d1e9a0b34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Configuração (intervalos no formato do PostgreSQL, ex: '30 days'). Retenção vazia = sem retenção.
+CHUNK_INTERVAL = os.getenv("SCREENTIME_CHUNK_INTERVAL", "7 days")
+COMPRESS_AFTER = os.getenv("SCREENTIME_COMPRESS_AFTER", "30 days")
+RETENTION = os.getenv("SCREENTIME_RETENTION", "")
+# Meses de partições criados à frente no modo sem TimescaleDB
+PARTITION_MONTHS_AHEAD = 3
+
+
+# Ativa o TimescaleDB se possível. Estar em pg_available_extensions só quer dizer que o pacote está instalado:
+# sem o timescaledb em shared_preload_libraries o CREATE EXTENSION falha, e a migração segue sem ele.
+def enable_timescale(bind) -> bool:
+    if bind.execute(sa.text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'timescaledb')")).scalar():
+        return True
+    if not bind.execute(sa.text("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'timescaledb')")).scalar():
+        return False
+    try:
+        with bind.begin_nested():
+            bind.execute(sa.text("CREATE EXTENSION timescaledb"))
+    except sa.exc.DBAPIError:
+        return False
+    return True
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+
+    if enable_timescale(bind):
+        # A chave primária de uma hypertable tem de incluir a coluna de partição
+        op.drop_constraint('screentime_pkey', 'screentime', type_='primary')
+        op.create_primary_key('screentime_pkey', 'screentime', ['id', 'timestamp'])
+        op.execute(f"SELECT create_hypertable('screentime', 'timestamp', chunk_time_interval => INTERVAL '{CHUNK_INTERVAL}', migrate_data => true)")
+        op.create_index('ix_screentime_user_timestamp', 'screentime', ['id_user', 'timestamp'], unique=False)
+
+        op.execute("ALTER TABLE screentime SET (timescaledb.compress, timescaledb.compress_segmentby = 'id_user', timescaledb.compress_orderby = 'timestamp DESC, id')")
+        op.execute(f"SELECT add_compression_policy('screentime', INTERVAL '{COMPRESS_AFTER}')")
+        # Os totais diários e o uso por app ficam nas tabelas agregadas, por isso os dados em bruto podem expirar
+        if RETENTION:
+            op.execute(f"SELECT add_retention_policy('screentime', INTERVAL '{RETENTION}')")
+
+        # Agregação contínua por hora, usada por /screentime/analytics com bucket=hour
+        with op.get_context().autocommit_block():
+            op.execute("""
+                CREATE MATERIALIZED VIEW screentime_hourly
+                WITH (timescaledb.continuous) AS
+                SELECT id_user,
+                       time_bucket(INTERVAL '1 hour', "timestamp") AS bucket,
+                       max(round((usage_data ->> 'total_minutes')::numeric)::int) AS max_minutes,
+                       avg(round((usage_data ->> 'total_minutes')::numeric)::int) AS avg_minutes,
+                       count(usage_data ->> 'total_minutes') AS samples
+                FROM screentime
+                GROUP BY id_user, time_bucket(INTERVAL '1 hour', "timestamp")
+                WITH NO DATA
+            """)
+            op.execute("""
+                SELECT add_continuous_aggregate_policy('screentime_hourly',
+                    start_offset => INTERVAL '3 days',
+                    end_offset => INTERVAL '1 hour',
+                    schedule_interval => INTERVAL '30 minutes')
+            """)
+            op.execute("CALL refresh_continuous_aggregate('screentime_hourly', NULL, now() - INTERVAL '1 hour')")
+        return
+
+    # Sem TimescaleDB: particionamento nativo por mês (a compressão não está disponível).
+    # As partições futuras e a retenção ficam a cargo de cronjob.maintain_screentime_partitions.
+    first_day = bind.execute(sa.text('SELECT min("timestamp")::date FROM screentime')).scalar() or date.today()
+
+    op.execute("ALTER TABLE screentime RENAME TO screentime_old")
+    op.execute("ALTER TABLE screentime_old RENAME CONSTRAINT screentime_pkey TO screentime_old_pkey")
+    op.execute("""
+        CREATE TABLE screentime (
+            id INTEGER NOT NULL DEFAULT nextval('screentime_id_seq'),
+            id_user INTEGER NOT NULL REFERENCES "user" (id) ON DELETE CASCADE,
+            "timestamp" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            usage_data JSONB NOT NULL,
+            CONSTRAINT screentime_pkey PRIMARY KEY (id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp")
+    """)
+    op.execute("ALTER SEQUENCE screentime_id_seq OWNED BY screentime.id")
+
+    month = month_start(first_day)
+    last_month = month_start(date.today())
+    for _ in range(PARTITION_MONTHS_AHEAD):
+        last_month = next_month(last_month)
+    while month <= last_month:
+        op.execute(f"CREATE TABLE screentime_{month:%Y_%m} PARTITION OF screentime FOR VALUES FROM ('{month}') TO ('{next_month(month)}')")
+        month = next_month(month)
+    op.execute("CREATE TABLE screentime_default PARTITION OF screentime DEFAULT")
+
+    op.execute('INSERT INTO screentime (id, id_user, "timestamp", usage_data) SELECT id, id_user, "timestamp", usage_data FROM screentime_old')
+    op.execute("DROP TABLE screentime_old")
+    op.create_index('ix_screentime_user_timestamp', 'screentime', ['id_user', 'timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Volta a uma tabela simples, venha ela de uma hypertable ou de partições nativas
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS screentime_hourly")
+    op.execute("ALTER TABLE screentime RENAME TO screentime_partitioned")
+    op.execute("ALTER TABLE screentime_partitioned RENAME CONSTRAINT screentime_pkey TO screentime_partitioned_pkey")
+    op.execute("""
+        CREATE TABLE screentime (
+            id INTEGER NOT NULL DEFAULT nextval('screentime_id_seq'),
+            id_user INTEGER NOT NULL REFERENCES "user" (id) ON DELETE CASCADE,
+            "timestamp" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            usage_data JSONB NOT NULL,
+            CONSTRAINT screentime_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("ALTER SEQUENCE screentime_id_seq OWNED BY screentime.id")
+    op.execute('INSERT INTO screentime (id, id_user, "timestamp", usage_data) SELECT id, id_user, "timestamp", usage_data FROM screentime_partitioned')
+    op.execute("DROP TABLE screentime_partitioned CASCADE")
@@ -0,0 +1,42 @@
+"""add (timestamp, id) index to screentime
+
+Revision ID: c5e8a3d1f702
+Revises: 9d4b2f7c1e53
+Create Date: 2025-07-16 09:37:12.840215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e8a3d1f702'
+down_revision: Union[str, None] = '9d4b2f7c1e53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def concurrently() -> bool:
+    # Tabelas particionadas e hypertables não aceitam CONCURRENTLY
+    bind = op.get_bind()
+    relkind = bind.execute(sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass('screentime')")).scalar()
+    timescale = bind.execute(sa.text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'timescaledb')")).scalar()
+    return relkind == 'r' and not timescale
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Listagem global de GET /screentime/ (sem id_user): paginação por (timestamp, id)
+    with op.get_context().autocommit_block():
+        # Um CREATE INDEX CONCURRENTLY que falhe deixa o índice INVALID: o if_not_exists dava-o como criado
+        if op.get_bind().execute(sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass('ix_screentime_timestamp_id')")).scalar():
+            op.drop_index('ix_screentime_timestamp_id', table_name='screentime', postgresql_concurrently=concurrently())
+        op.create_index('ix_screentime_timestamp_id', 'screentime', ['timestamp', 'id'], unique=False, postgresql_concurrently=concurrently(), if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_screentime_timestamp_id', table_name='screentime', postgresql_concurrently=concurrently(), if_exists=True)
@@ -0,0 +1,31 @@
+"""add daily_snapshot to screentime
+
+Revision ID: d7e3f05a9c12
+Revises: b41c8e2f6d90
+Create Date: 2025-06-24 14:51:19.287554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7e3f05a9c12'
+down_revision: Union[str, None] = 'b41c8e2f6d90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('screentime', sa.Column('daily_snapshot', sa.Boolean(), nullable=False, server_default=sa.false()))
+    # Inclui o timestamp (coluna de partição), como exigido em tabelas particionadas e hypertables
+    op.create_index('ux_screentime_daily_snapshot', 'screentime', ['id_user', 'timestamp'], unique=True, postgresql_where=sa.text('daily_snapshot'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_screentime_daily_snapshot', table_name='screentime')
+    op.drop_column('screentime', 'daily_snapshot')
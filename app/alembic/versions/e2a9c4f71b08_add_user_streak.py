@@ -0,0 +1,58 @@
+"""add user_streak counters
+
+Revision ID: e2a9c4f71b08
+Revises: d7e3f05a9c12
+Create Date: 2025-06-27 10:12:44.918306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a9c4f71b08'
+down_revision: Union[str, None] = 'd7e3f05a9c12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_streak',
+    sa.Column('id_user', sa.Integer(), nullable=False),
+    sa.Column('current_streak', sa.Integer(), nullable=False),
+    sa.Column('longest_streak', sa.Integer(), nullable=False),
+    sa.Column('last_completed_date', sa.Date(), nullable=True),
+    sa.ForeignKeyConstraint(['id_user'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id_user')
+    )
+    # Contadores dos dados existentes, com a mesma consulta do streaks.rebuild_streaks (gaps and islands:
+    # dias consecutivos têm o mesmo day - row_number); sem eles o próximo toggle recomeçava o streak em 1
+    op.execute("""
+        WITH days AS (
+            SELECT DISTINCT id_user, date(completed_at) AS day
+            FROM task_status
+            WHERE done AND completed_at IS NOT NULL
+        ),
+        runs AS (
+            SELECT id_user, count(*) AS length, max(day) AS last_day
+            FROM (
+                SELECT id_user, day, day - CAST(row_number() OVER (PARTITION BY id_user ORDER BY day) AS int) AS island
+                FROM days
+            ) islands
+            GROUP BY id_user, island
+        ),
+        totals AS (
+            SELECT id_user, max(length) AS longest, max(last_day) AS last_day FROM runs GROUP BY id_user
+        )
+        INSERT INTO user_streak (id_user, current_streak, longest_streak, last_completed_date)
+        SELECT t.id_user, r.length, t.longest, t.last_day
+        FROM totals t JOIN runs r ON r.id_user = t.id_user AND r.last_day = t.last_day
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_streak')
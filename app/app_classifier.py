@@ -0,0 +1,34 @@
+import os
+import re
+from functools import lru_cache
+from typing import Optional
+
+# Palavras-chave (por categoria) de apps restritas para o troféu `diadedetox`.
+# A correspondência é por substring do nome da app em minúsculas.
+RESTRICTED_KEYWORDS = {
+    "social": ["instagram", "facebook", "messenger", "twitter", "x", "snapchat", "tiktok"],
+    "games": ["clash", "minecraft", "fortnite", "brawl", "candy"],
+    "shopping": ["amazon", "ebay", "aliexpress", "nike", "adidas", "shein", "temu"],
+    "gambling": ["bet", "casino", "poker"],
+}
+
+CLASSIFIER_CACHE_SIZE = int(os.getenv("APP_CLASSIFIER_CACHE_SIZE", 8192))
+
+# Uma única expressão regular com um grupo nomeado por categoria. A categoria devolvida é a da correspondência
+# mais à esquerda no nome, qualquer que seja a categoria; a ordem das palavras só decide entre palavras
+# que correspondem na mesma posição (as mais longas vêm primeiro).
+_restricted_pattern = re.compile("|".join(
+    f"(?P<{category}>{'|'.join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True))})"
+    for category, keywords in RESTRICTED_KEYWORDS.items()
+))
+
+# Devolve a categoria restrita da app (ex: 'social') ou None se não for restrita.
+# Os mesmos nomes de pacotes repetem-se constantemente, por isso o resultado fica em cache (LRU limitada).
+@lru_cache(maxsize=CLASSIFIER_CACHE_SIZE)
+def classify_app(app_name: str) -> Optional[str]:
+    match = _restricted_pattern.search(app_name.lower())
+    return match.lastgroup if match else None
+
+@lru_cache(maxsize=CLASSIFIER_CACHE_SIZE)
+def is_lumicheck_app(app_name: str) -> bool:
+    return "lumicheck" in app_name.lower()
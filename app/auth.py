@@ -1,11 +1,17 @@
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from dotenv import load_dotenv
 from models.userModel import User
 from config import get_db
-from sqlalchemy.orm import Session
+import cache_invalidation
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 security = HTTPBearer()
@@ -16,6 +22,15 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+# Cache dos utilizadores autenticados (LRU com TTL), para não ler a tabela "user" em cada pedido.
+# É invalidada explicitamente quando o utilizador é alterado ou eliminado (ver cache_invalidation).
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10000))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+# Confia no `sub` do token assinado: o utilizador só é lido quando o handler usa um campo além do `id`
+AUTH_TRUST_CLAIMS = os.getenv("AUTH_TRUST_CLAIMS", "false").lower() in ("1", "true", "yes")
+# Nome da cache dos utilizadores no canal de invalidação (chave = ID do utilizador)
+USER_PRINCIPAL = "user_principal"
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -28,6 +43,89 @@ def create_refresh_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+_principals: "OrderedDict[int, tuple]" = OrderedDict()
+_principals_version = 0
+_principals_lock = threading.Lock()
+
+def _cached_principal(user_id: int) -> Optional[dict]:
+    with _principals_lock:
+        cached = _principals.get(user_id)
+        if cached is None:
+            return None
+        expires_at, values = cached
+        if expires_at < time.monotonic():
+            del _principals[user_id]
+            return None
+        _principals.move_to_end(user_id)
+        return values
+
+def _store_principal(user_id: int, values: dict, version: int):
+    if AUTH_CACHE_TTL_SECONDS <= 0 or AUTH_CACHE_SIZE <= 0:
+        return
+    with _principals_lock:
+        # Se houve uma invalidação durante a leitura, estes dados podem já estar desatualizados
+        if version != _principals_version:
+            return
+        _principals[user_id] = (time.monotonic() + AUTH_CACHE_TTL_SECONDS, values)
+        _principals.move_to_end(user_id)
+        while len(_principals) > AUTH_CACHE_SIZE:
+            _principals.popitem(last=False)
+
+def invalidate_principal(key: Optional[str] = None):
+    global _principals_version
+    with _principals_lock:
+        _principals_version += 1
+        if key is None:
+            _principals.clear()
+        else:
+            _principals.pop(int(key), None)
+
+cache_invalidation.register(USER_PRINCIPAL, invalidate_principal)
+
+# Publica a invalidação do utilizador na transação atual (chamar antes do commit)
+def publish_user_change(db: Session, user_id: int):
+    cache_invalidation.publish(db, USER_PRINCIPAL, str(user_id))
+
+# Devolve o utilizador a partir da cache (ligado à sessão sem nova consulta) ou da base de dados
+def load_principal(db: Session, user_id: int) -> Optional[User]:
+    values = _cached_principal(user_id)
+    if values is not None:
+        user = User(**values)
+        # Marca o objeto como lido da base de dados, para o handler o poder usar e alterar normalmente
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    version = _principals_version
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is not None:
+        _store_principal(user_id, {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}, version)
+    return user
+
+
+# Utilizador autenticado sem consulta: só tem o `id` do token. O User completo é lido
+# (pela cache) no primeiro acesso a outro atributo; se já não existir, responde 401.
+class LazyUser:
+    def __init__(self, user_id: int, db: Session):
+        self.id = user_id
+        self._db = db
+        self._user = None
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._user is None:
+            self._user = load_principal(self._db, self.id)
+            if self._user is None:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciais inválidas")
+        return getattr(self._user, name)
+
+# ID do utilizador do token, sem consultar a base de dados; None se o token for inválido
+def token_user_id(token: str) -> Optional[int]:
+    try:
+        return int(jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])["sub"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        return None
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -40,10 +138,14 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-    except JWTError:
+        user_id = int(user_id)
+    except (JWTError, ValueError):
         raise credentials_exception
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    if AUTH_TRUST_CLAIMS:
+        return LazyUser(user_id, db)
+
+    user = load_principal(db, user_id)
     if user is None:
         raise credentials_exception
     return user
\ No newline at end of file
@@ -0,0 +1,79 @@
+from datetime import datetime
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from config import engine
+from models.screentimeModel import ScreenTime
+from models.screentimeDailyModel import ScreenTimeDaily
+from screentime_pipeline import total_minutes_column, LUMICHECK_BITMAP_DAYS
+
+CHUNK_SIZE = 50000
+
+# Preenche a tabela screentime_daily a partir das entradas em bruto, em blocos de IDs
+def backfill_daily_screentime(chunk_size: int = CHUNK_SIZE):
+    print(f"🕒 Backfill screentime_daily: {datetime.now()}")
+
+    with Session(engine) as session:
+        min_id, max_id = session.query(func.min(ScreenTime.id), func.max(ScreenTime.id)).one()
+        if min_id is None:
+            print("Não há entradas de tempo de ecrã.")
+            return
+
+        for start in range(min_id, max_id + 1, chunk_size):
+            end = start + chunk_size
+            day = func.date(ScreenTime.timestamp)
+            rows = (
+                select(ScreenTime.id_user, day, func.max(total_minutes_column()))
+                .where(
+                    ScreenTime.id >= start,
+                    ScreenTime.id < end,
+                    ScreenTime.usage_data.has_key("total_minutes")
+                )
+                .group_by(ScreenTime.id_user, day)
+            )
+            stmt = insert(ScreenTimeDaily).from_select(["id_user", "day", "total_minutes"], rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ScreenTimeDaily.id_user, ScreenTimeDaily.day],
+                set_={"total_minutes": func.greatest(ScreenTimeDaily.total_minutes, stmt.excluded.total_minutes)}
+            )
+            result = session.execute(stmt)
+            session.commit()
+            print(f"IDs {start}-{end - 1}: {result.rowcount} dias atualizados")
+
+    print("✅ Backfill completo.")
+
+# Reconstrói o bitmap de uso da LumiCheck dos últimos dias com uma única leitura por intervalo
+def backfill_lumicheck_usage():
+    print(f"🕒 Backfill lumicheck_usage: {datetime.now()}")
+
+    with Session(engine) as session:
+        result = session.execute(text("""
+            WITH days AS (
+                SELECT DISTINCT s.id_user, date(s.timestamp) AS day
+                FROM screentime s
+                WHERE s.timestamp >= current_date - :window
+                  AND jsonb_typeof(s.usage_data -> 'app_breakdown') = 'object'
+                  AND EXISTS (
+                      SELECT 1 FROM jsonb_object_keys(s.usage_data -> 'app_breakdown') AS app
+                      WHERE lower(app) LIKE '%lumicheck%'
+                  )
+            ),
+            last_days AS (
+                SELECT id_user, max(day) AS last_day FROM days GROUP BY id_user
+            )
+            INSERT INTO lumicheck_usage (id_user, last_day, days_bitmap)
+            SELECT d.id_user, l.last_day, bit_or(CAST(1 AS BIGINT) << (l.last_day - d.day))
+            FROM days d JOIN last_days l ON l.id_user = d.id_user
+            WHERE l.last_day - d.day < :window
+            GROUP BY d.id_user, l.last_day
+            ON CONFLICT (id_user) DO UPDATE
+            SET last_day = excluded.last_day, days_bitmap = excluded.days_bitmap
+        """), {"window": LUMICHECK_BITMAP_DAYS})
+        session.commit()
+        print(f"{result.rowcount} utilizadores atualizados")
+
+    print("✅ Backfill completo.")
+
+if __name__ == "__main__":
+    backfill_daily_screentime()
+    backfill_lumicheck_usage()
@@ -0,0 +1,70 @@
+# Micro-benchmark do classificador de apps usado em check_detox_status.
+# Compara a versão antiga (any() sobre a lista de palavras-chave) com a regex compilada + LRU,
+# sobre app_breakdowns realistas de 50 a 200 apps. Não precisa de base de dados.
+#
+# Executar a partir da pasta app/:
+#   python -m benchmarks.bench_app_classifier --breakdowns 20000
+import argparse
+import random
+import time
+from app_classifier import RESTRICTED_KEYWORDS, classify_app
+
+OLD_KEYWORDS = [keyword for keywords in RESTRICTED_KEYWORDS.values() for keyword in keywords]
+
+VENDORS = ["com.google.android", "com.samsung.android", "com.android", "com.facebook", "com.instagram",
+           "com.whatsapp", "com.spotify", "com.netflix", "com.supercell", "com.king", "com.amazon",
+           "com.zhiliaoapp", "pt.novobanco", "pt.cgd", "com.microsoft", "org.telegram", "com.lumicheck"]
+PRODUCTS = ["app", "music", "mediaclient", "android", "messenger", "clashroyale", "candycrushsaga",
+            "shopping", "musically", "calendar", "gm", "maps", "youtube", "camera", "gallery", "launcher",
+            "office.outlook", "teams", "messenger.lite", "keyboard", "clock", "weather", "notes", "banking"]
+PACKAGES = sorted({f"{vendor}.{product}" for vendor in VENDORS for product in PRODUCTS})
+
+def old_check(app_breakdown):
+    for app_name, minutes in app_breakdown.items():
+        lower_app = app_name.lower()
+        if any(keyword in lower_app for keyword in OLD_KEYWORDS):
+            if minutes > 10:
+                return False
+    return True
+
+def new_check(app_breakdown):
+    for app_name, minutes in app_breakdown.items():
+        if minutes > 10 and classify_app(app_name) is not None:
+            return False
+    return True
+
+def make_breakdowns(count):
+    rng = random.Random(42)
+    breakdowns = []
+    for _ in range(count):
+        apps = rng.sample(PACKAGES, rng.randint(50, 200))
+        # A maioria das apps tem poucos minutos, como nos dados reais
+        breakdowns.append({app: rng.choice([0, 0, 1, 2, 5, 8, 15, 40]) for app in apps})
+    return breakdowns
+
+def timed(check, breakdowns):
+    start = time.perf_counter()
+    results = [check(breakdown) for breakdown in breakdowns]
+    return time.perf_counter() - start, results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--breakdowns", type=int, default=20000)
+    args = parser.parse_args()
+
+    breakdowns = make_breakdowns(args.breakdowns)
+    apps = sum(len(breakdown) for breakdown in breakdowns)
+
+    old_time, old_results = timed(old_check, breakdowns)
+    classify_app.cache_clear()
+    cold_time, new_results = timed(new_check, breakdowns)
+    warm_time, _ = timed(new_check, breakdowns)
+    assert old_results == new_results
+
+    print(f"{args.breakdowns} breakdowns, {apps} apps, {len(PACKAGES)} pacotes distintos")
+    for label, elapsed in [("any() sobre a lista", old_time), ("regex + LRU (fria)", cold_time), ("regex + LRU (quente)", warm_time)]:
+        print(f"{label:22} {elapsed:8.3f}s  {apps / elapsed / 1e6:8.2f} M apps/s  {old_time / elapsed:6.1f}x")
+    print(classify_app.cache_info())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Compara o débito (linhas/s) do POST /screentime/ entrada a entrada com o POST /screentime/bulk.
+# Usa a base de dados configurada em DATABASE_URL; cria utilizadores temporários e apaga-os no fim.
+#
+# Executar a partir da pasta app/:
+#   python -m benchmarks.bench_screentime_ingest --rows 2000 --users 20
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from config import SessionLocal, AsyncSessionLocal, async_engine
+from models.userModel import User
+from models.screentimeModel import ScreenTime
+from routes.screentimeRoutes import ScreenTimeCreate, create_screentime, create_screentime_bulk
+
+APPS = ["com.instagram.android", "com.whatsapp", "com.google.android.youtube", "com.spotify.music",
+        "com.lumicheck.app", "com.android.chrome", "com.supercell.clashroyale", "com.google.android.gm"]
+
+def make_entries(user_ids, rows):
+    entries = []
+    for i in range(rows):
+        breakdown = {app: random.randint(0, 90) for app in random.sample(APPS, 5)}
+        entries.append(ScreenTimeCreate(
+            id_user=user_ids[i % len(user_ids)],
+            usage_data={"app_breakdown": breakdown, "total_minutes": sum(breakdown.values())}
+        ))
+    return entries
+
+def create_users(db, count):
+    users = []
+    for _ in range(count):
+        name = f"bench_{uuid.uuid4().hex[:12]}"
+        users.append(User(username=name, email=f"{name}@bench.local", password="-"))
+    db.add_all(users)
+    db.commit()
+    return users
+
+async def run_single(entries, current_user):
+    async with AsyncSessionLocal() as db:
+        start = time.perf_counter()
+        for entry in entries:
+            await create_screentime(entry, keep_snapshots=True, db=db, current_user=current_user)
+        return time.perf_counter() - start
+
+async def run_bulk(entries, current_user, batch_size):
+    async with AsyncSessionLocal() as db:
+        start = time.perf_counter()
+        for i in range(0, len(entries), batch_size):
+            await create_screentime_bulk(entries[i:i + batch_size], keep_snapshots=True, db=db, current_user=current_user)
+        return time.perf_counter() - start
+
+# As ligações asyncpg pertencem ao event loop: as duas medições correm no mesmo
+async def run_both(entries, current_user, batch_size):
+    try:
+        return await run_single(entries, current_user), await run_bulk(entries, current_user, batch_size)
+    finally:
+        await async_engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    users = create_users(db, args.users)
+    user_ids = [user.id for user in users]
+    try:
+        entries = make_entries(user_ids, args.rows)
+
+        single, bulk = asyncio.run(run_both(entries, users[0], args.batch_size))
+
+        print(f"Linhas: {args.rows}  Utilizadores: {args.users}  Lote: {args.batch_size}")
+        print(f"POST /screentime/      {single:8.2f}s  {args.rows / single:10.1f} linhas/s")
+        print(f"POST /screentime/bulk  {bulk:8.2f}s  {args.rows / bulk:10.1f} linhas/s")
+        print(f"Ganho: {single / bulk:.1f}x")
+    finally:
+        db.query(ScreenTime).filter(ScreenTime.id_user.in_(user_ids)).delete(synchronize_session=False)
+        db.query(User).filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Mede o arranque da aplicação por fases, cada repetição num processo Python novo (arranque a frio):
+# importação do config (engines) e da aplicação (rotas, modelos), primeira ligação à base de dados,
+# create_all e aquecimento do catálogo. Compara o tempo até aceitar pedidos e até estar pronto
+# (/health/ready) nos modos development e production.
+#
+# Executar a partir da pasta app/:
+#   python -m benchmarks.bench_startup --runs 5
+#   python -m benchmarks.bench_startup --importtime   # módulos mais lentos a importar
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+PHASES = ["import_config", "import_app", "db_connect", "create_all", "warmup"]
+
+# Corre no processo filho: uma medição completa, escrita em JSON no stdout
+def measure(mode: str):
+    timings = {}
+    start = time.perf_counter()
+    import config  # noqa: F401
+    timings["import_config"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    import main  # noqa: F401
+    import startup
+    timings["import_app"] = time.perf_counter() - start
+
+    startup.warmup(create_schema_first=mode == "development")
+    timings.update({phase: startup.timings[phase] for phase in ["db_connect", "create_all", "warmup"] if phase in startup.timings})
+    print(json.dumps(timings))
+
+def run_child(mode: str):
+    result = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child", mode], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"Arranque em {mode} falhou:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+# Em development o lifespan corre tudo antes de aceitar pedidos; em production só as importações
+def summary(mode: str, timings):
+    imports = timings["import_config"] + timings["import_app"]
+    total = imports + sum(timings.get(phase, 0.0) for phase in ["db_connect", "create_all", "warmup"])
+    return (total if mode == "development" else imports), total
+
+def print_import_times(limit: int = 15):
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(cumulative), name))
+    print("\n===== Importações mais lentas (cumulativo) =====")
+    for cumulative, name in sorted(rows, reverse=True)[:limit]:
+        print(f"{cumulative / 1000:9.1f} ms  {name}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="mostra os módulos mais lentos a importar")
+    parser.add_argument("--child", choices=["development", "production"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure(args.child)
+        return
+
+    for mode in ["development", "production"]:
+        runs = [run_child(mode) for _ in range(args.runs)]
+        print(f"\n===== {mode} ({args.runs} arranques, mediana) =====")
+        for phase in PHASES:
+            values = [run.get(phase) for run in runs if phase in run]
+            if values:
+                print(f"{phase:15} {statistics.median(values) * 1000:9.1f} ms")
+        accepting, ready = zip(*(summary(mode, run) for run in runs))
+        print(f"{'aceita pedidos':15} {statistics.median(accepting) * 1000:9.1f} ms")
+        print(f"{'pronto':15} {statistics.median(ready) * 1000:9.1f} ms")
+
+    if args.importtime:
+        print_import_times()
+
+if __name__ == "__main__":
+    main()
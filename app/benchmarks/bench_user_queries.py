@@ -0,0 +1,163 @@
+# Mede as consultas por utilizador mais frequentes (dailystatus, completed, last7days e streak)
+# sem e com os índices compostos da migração 7a3f9d2b6e18, e mostra o EXPLAIN de cada uma.
+# "Sem índices" corre dentro de uma transação que apaga os índices e faz rollback no fim:
+# a tabela fica bloqueada durante a medição, por isso usar apenas numa base de dados de desenvolvimento.
+# Cria utilizadores e tarefas temporários (com tarefas e tempo de ecrã) e apaga-os no fim.
+#
+# Executar a partir da pasta app/:
+#   python -m benchmarks.bench_user_queries --users 2000 --days 90 --samples 50
+import argparse
+import random
+import statistics
+import time
+import uuid
+from datetime import date, datetime, time as dtime, timedelta
+from sqlalchemy import select, and_, func, text
+from sqlalchemy.dialects import postgresql
+from config import engine
+from models.taskModel import Task
+from models.taskStatusModel import UserTaskStatus
+from models.screentimeModel import ScreenTime
+from models.screentimeDailyModel import ScreenTimeDaily
+
+INDEXES = ["ix_task_status_user_completed_at", "ix_task_status_user_done", "ix_screentime_user_timestamp"]
+
+def queries(user_id: int, today: date):
+    start_of_day = datetime.combine(today, dtime.min)
+    end_of_day = datetime.combine(today, dtime.max)
+    return {
+        # GET /task/{user_id}/dailystatus
+        "dailystatus": select(Task.id, Task.description, UserTaskStatus.done).join(UserTaskStatus, and_(
+            UserTaskStatus.id_task == Task.id,
+            UserTaskStatus.id_user == user_id,
+            UserTaskStatus.completed_at >= start_of_day,
+            UserTaskStatus.completed_at <= end_of_day
+        )),
+        # GET /task/{user_id}/completed
+        "completed": select(Task, UserTaskStatus).join(UserTaskStatus, UserTaskStatus.id_task == Task.id).where(
+            UserTaskStatus.id_user == user_id,
+            UserTaskStatus.done == True,
+            UserTaskStatus.completed_at < start_of_day
+        ),
+        # GET /screentime/last7days/{user_id}
+        "last7days": select(ScreenTimeDaily.day, ScreenTimeDaily.total_minutes).where(
+            ScreenTimeDaily.id_user == user_id,
+            ScreenTimeDaily.day >= today - timedelta(days=7)
+        ).order_by(ScreenTimeDaily.day),
+        # GET /screentime/analytics/{user_id}?bucket=hour (registos em bruto de um dia)
+        "screentime_raw": select(ScreenTime.timestamp, ScreenTime.usage_data).where(
+            ScreenTime.id_user == user_id,
+            ScreenTime.timestamp >= start_of_day,
+            ScreenTime.timestamp < start_of_day + timedelta(days=1),
+            ~ScreenTime.daily_snapshot
+        ),
+        # streaks.other_done_today (toggle para "por concluir")
+        "streak_done_today": select(UserTaskStatus.id).where(
+            UserTaskStatus.id_user == user_id,
+            UserTaskStatus.done == True,
+            UserTaskStatus.completed_at >= today,
+            UserTaskStatus.completed_at < today + timedelta(days=1)
+        ).limit(1),
+        # Datas com tarefas concluídas (o antigo get_streak_count, a base de rebuild_streaks)
+        "streak_history": select(func.date(UserTaskStatus.completed_at)).where(
+            UserTaskStatus.id_user == user_id,
+            UserTaskStatus.done == True
+        ).distinct().order_by(func.date(UserTaskStatus.completed_at).desc()),
+    }
+
+def seed(connection, users: int, days: int, snapshots: int):
+    run = uuid.uuid4().hex[:8]
+    user_ids = connection.execute(text("""
+        INSERT INTO "user" (username, email, password, onboarding, is_monitoring)
+        SELECT 'bench_' || :run || '_' || g, 'bench_' || :run || '_' || g || '@bench.local', '-', false, false
+        FROM generate_series(1, :users) g
+        RETURNING id
+    """), {"run": run, "users": users}).scalars().all()
+    task_ids = connection.execute(text("""
+        INSERT INTO task (description) SELECT 'bench_' || :run || '_' || g FROM generate_series(1, 20) g RETURNING id
+    """), {"run": run}).scalars().all()
+
+    # Duas tarefas por utilizador e dia, ~60% concluídas
+    connection.execute(text("""
+        INSERT INTO task_status (id_user, id_task, done, completed_at)
+        SELECT u.id, (CAST(:task_ids AS int[]))[1 + (u.id + d + k) % cardinality(CAST(:task_ids AS int[]))],
+               random() < 0.6, (current_date - d) + time '08:00' + random() * interval '12 hours'
+        FROM unnest(CAST(:user_ids AS int[])) AS u(id), generate_series(0, :days - 1) d, generate_series(0, 1) k
+    """), {"task_ids": task_ids, "user_ids": user_ids, "days": days})
+    connection.execute(text("""
+        INSERT INTO screentime (id_user, "timestamp", usage_data)
+        SELECT u.id, (current_date - d) + time '08:00' + s * interval '3 hours',
+               jsonb_build_object('total_minutes', 30 * (s + 1) + floor(random() * 30))
+        FROM unnest(CAST(:user_ids AS int[])) AS u(id), generate_series(0, :days - 1) d, generate_series(0, :snapshots - 1) s
+    """), {"user_ids": user_ids, "days": days, "snapshots": snapshots})
+    connection.execute(text("""
+        INSERT INTO screentime_daily (id_user, day, total_minutes)
+        SELECT u.id, current_date - d, floor(random() * 400)
+        FROM unnest(CAST(:user_ids AS int[])) AS u(id), generate_series(0, :days - 1) d
+        ON CONFLICT DO NOTHING
+    """), {"user_ids": user_ids, "days": days})
+    for table in ["task_status", "screentime", "screentime_daily"]:
+        connection.execute(text(f"ANALYZE {table}"))
+    return user_ids, task_ids
+
+def measure(connection, sample_ids, today):
+    results = {}
+    for name in queries(sample_ids[0], today):
+        timings = []
+        for user_id in sample_ids:
+            stmt = queries(user_id, today)[name]
+            start = time.perf_counter()
+            connection.execute(stmt).all()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        sql = str(queries(sample_ids[0], today)[name].compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+        plan = connection.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}")).scalars().all()
+        results[name] = (statistics.median(timings), statistics.quantiles(timings, n=20)[-1], plan)
+    return results
+
+def print_results(title, results):
+    print(f"\n===== {title} =====")
+    for name, (median, p95, plan) in results.items():
+        print(f"\n--- {name}: mediana {median:.2f} ms, p95 {p95:.2f} ms")
+        print("\n".join(plan))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--snapshots", type=int, default=4, help="registos de tempo de ecrã por utilizador e dia")
+    parser.add_argument("--samples", type=int, default=50, help="utilizadores medidos por consulta")
+    args = parser.parse_args()
+
+    with engine.begin() as connection:
+        start = time.perf_counter()
+        user_ids, task_ids = seed(connection, args.users, args.days, args.snapshots)
+        print(f"Dados criados em {time.perf_counter() - start:.1f}s: {args.users} utilizadores, {args.days} dias")
+
+    today = datetime.now().date()
+    sample_ids = random.sample(user_ids, min(args.samples, len(user_ids)))
+    try:
+        # Sem índices: DROP INDEX numa transação que é revertida no fim
+        with engine.connect() as connection:
+            transaction = connection.begin()
+            for index in INDEXES:
+                connection.execute(text(f"DROP INDEX IF EXISTS {index}"))
+            before = measure(connection, sample_ids, today)
+            transaction.rollback()
+
+        with engine.connect() as connection:
+            after = measure(connection, sample_ids, today)
+
+        print_results("Sem índices compostos", before)
+        print_results("Com índices compostos", after)
+
+        print("\n===== Resumo (mediana) =====")
+        for name in after:
+            print(f"{name:20} {before[name][0]:9.2f} ms -> {after[name][0]:9.2f} ms  ({before[name][0] / after[name][0]:.1f}x)")
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text('DELETE FROM "user" WHERE id = ANY(CAST(:ids AS int[]))'), {"ids": user_ids})
+            connection.execute(text("DELETE FROM task WHERE id = ANY(CAST(:ids AS int[]))"), {"ids": task_ids})
+
+if __name__ == "__main__":
+    main()
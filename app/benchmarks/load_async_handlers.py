@@ -0,0 +1,140 @@
+# Teste de carga dos handlers `async def` (POST /screentime/ e POST /question/answer) contra um servidor a correr.
+# Enquanto `--concurrency` clientes enviam pedidos, uma sonda chama GET /user/protected: se os handlers
+# bloquearem o event loop à espera da base de dados, a latência da sonda sobe com a dos pedidos.
+# Cria um utilizador temporário (registo + login) e elimina-o no fim.
+#
+# Para comparar antes/depois, correr contra o servidor de cada versão e guardar os resultados:
+#   python -m benchmarks.load_async_handlers --url http://localhost:8080 --output before.json
+#   python -m benchmarks.load_async_handlers --url http://localhost:8080 --output after.json
+#   python -m benchmarks.load_async_handlers --compare before.json after.json
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+def request(base_url, method, path, body=None, token=None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base_url + path, data=data, headers=headers, method=method)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            payload = json.loads(response.read() or "null")
+            status = response.status
+    except urllib.error.HTTPError as error:
+        payload, status = None, error.code
+    return status, payload, (time.perf_counter() - start) * 1000
+
+def percentiles(timings):
+    if len(timings) < 2:
+        return {"count": len(timings), "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    cuts = statistics.quantiles(timings, n=100)
+    return {"count": len(timings), "p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+def screentime_body(user_id):
+    breakdown = {app: random.randint(0, 90) for app in ["com.whatsapp", "com.instagram.android", "com.lumicheck.app"]}
+    return {"id_user": user_id, "usage_data": {"app_breakdown": breakdown, "total_minutes": sum(breakdown.values())}}
+
+def run(base_url, concurrency, requests_per_client):
+    name = f"load_{uuid.uuid4().hex[:10]}"
+    password = uuid.uuid4().hex
+    status, payload, _ = request(base_url, "POST", "/user/register", {"username": name, "email": f"{name}@bench.local", "password": password})
+    if status != 200:
+        raise SystemExit(f"Registo falhou ({status})")
+    user_id = payload["user_id"]
+    token = request(base_url, "POST", "/user/login", {"username": name, "password": password})[1]["access_token"]
+    _, questions, _ = request(base_url, "GET", "/question/", token=token)
+    question_ids = [question["id"] for question in questions or []]
+
+    timings = {"POST /screentime/": [], "POST /question/answer": [], "GET /user/protected (sonda)": []}
+    errors = {key: 0 for key in timings}
+    done = threading.Event()
+
+    def client(index):
+        for i in range(requests_per_client):
+            if question_ids and (index + i) % 4 == 0:
+                key = "POST /question/answer"
+                body = [{"user_id": user_id, "question_id": random.choice(question_ids), "answer": random.randint(0, 5)}]
+                status, _, elapsed = request(base_url, "POST", "/question/answer", body, token)
+            else:
+                key = "POST /screentime/"
+                status, _, elapsed = request(base_url, "POST", "/screentime/?keep_snapshots=true", screentime_body(user_id), token)
+            timings[key].append(elapsed)
+            if status >= 400:
+                errors[key] += 1
+
+    def probe():
+        key = "GET /user/protected (sonda)"
+        while not done.is_set():
+            status, _, elapsed = request(base_url, "GET", "/user/protected", token=token)
+            timings[key].append(elapsed)
+            if status >= 400:
+                errors[key] += 1
+            time.sleep(0.01)
+
+    probe_thread = threading.Thread(target=probe, daemon=True)
+    start = time.perf_counter()
+    try:
+        probe_thread.start()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(client, range(concurrency)))
+        elapsed = time.perf_counter() - start
+    finally:
+        done.set()
+        probe_thread.join()
+        request(base_url, "DELETE", f"/user/{user_id}", {"password": password}, token)
+
+    total = len(timings["POST /screentime/"]) + len(timings["POST /question/answer"])
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "seconds": elapsed,
+        "throughput": total / elapsed,
+        "endpoints": {key: {**percentiles(values), "errors": errors[key]} for key, values in timings.items()},
+    }
+
+def print_results(title, results):
+    print(f"\n===== {title}: {results['requests']} pedidos, {results['concurrency']} clientes, {results['throughput']:.1f} pedidos/s =====")
+    for key, stats in results["endpoints"].items():
+        print(f"{key:30} n={stats['count']:6}  p50 {stats['p50']:8.1f} ms  p95 {stats['p95']:8.1f} ms  p99 {stats['p99']:8.1f} ms  erros {stats['errors']}")
+
+def compare(before_path, after_path):
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+    print_results("Antes", before)
+    print_results("Depois", after)
+    print("\n===== p99 =====")
+    for key in after["endpoints"]:
+        old, new = before["endpoints"].get(key, {}).get("p99", 0.0), after["endpoints"][key]["p99"]
+        ratio = f"({old / new:.1f}x)" if new else ""
+        print(f"{key:30} {old:9.1f} ms -> {new:9.1f} ms  {ratio}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=40, help="pedidos por cliente")
+    parser.add_argument("--output", help="guarda os resultados em JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DEPOIS"), help="compara dois ficheiros de resultados")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = run(args.url.rstrip("/"), args.concurrency, args.requests)
+    print_results(args.url, results)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+import select
+import threading
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from config import engine
+
+logger = logging.getLogger(__name__)
+
+# Invalidação de caches em memória entre processos, com LISTEN/NOTIFY do PostgreSQL.
+# Cada processo escuta o canal numa ligação própria; quem altera os dados publica o nome
+# da cache (e opcionalmente uma chave) na mesma transação, por isso o aviso só chega depois do commit.
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache_invalidation")
+# Segundos entre tentativas de voltar a ligar quando a ligação de escuta cai
+RECONNECT_DELAY = 5
+
+_handlers: Dict[str, List[Callable[[Optional[str]], None]]] = {}
+_thread = None
+_stopping = threading.Event()
+
+# Regista a função que limpa a cache `name`. Recebe a chave invalidada, ou None para limpar tudo.
+def register(name: str, handler: Callable[[Optional[str]], None]):
+    _handlers.setdefault(name, []).append(handler)
+
+def invalidate_local(name: str, key: Optional[str] = None):
+    for handler in _handlers.get(name, []):
+        handler(key)
+
+def invalidate_all_local():
+    for name in list(_handlers):
+        invalidate_local(name)
+
+# Publica a invalidação na transação atual. Este processo limpa a sua cache logo após o commit;
+# os outros recebem o NOTIFY (o PostgreSQL só o entrega se a transação for confirmada).
+def publish(db: Session, name: str, key: Optional[str] = None):
+    payload = json.dumps({"cache": name, "key": key})
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CACHE_INVALIDATION_CHANNEL, "payload": payload})
+    event.listen(db, "after_commit", lambda session: invalidate_local(name, key), once=True)
+
+# Publica fora de uma transação (ex: num middleware, sem sessão aberta), numa ligação própria.
+# Este processo trata o aviso de imediato.
+def notify(name: str, key: Optional[str] = None):
+    invalidate_local(name, key)
+    payload = json.dumps({"cache": name, "key": key})
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CACHE_INVALIDATION_CHANNEL, "payload": payload})
+
+def _dispatch(payload: str):
+    try:
+        message = json.loads(payload)
+        invalidate_local(message["cache"], message.get("key"))
+    except (ValueError, KeyError, TypeError):
+        logger.warning(f"Ignoring malformed cache invalidation: {payload!r}")
+
+def _listen():
+    while not _stopping.is_set():
+        connection = None
+        try:
+            # Ligação fora do pool, em autocommit, dedicada ao LISTEN
+            connection = engine.raw_connection()
+            connection.detach()
+            connection.driver_connection.autocommit = True
+            connection.cursor().execute(f'LISTEN "{CACHE_INVALIDATION_CHANNEL}"')
+            # Os avisos perdidos enquanto não havia ligação são desconhecidos; começa com as caches vazias
+            invalidate_all_local()
+
+            raw = connection.driver_connection
+            while not _stopping.is_set():
+                if select.select([raw], [], [], 1.0) == ([], [], []):
+                    continue
+                raw.poll()
+                while raw.notifies:
+                    _dispatch(raw.notifies.pop(0).payload)
+        except Exception:
+            logger.exception(f"Cache invalidation listener failed, reconnecting in {RECONNECT_DELAY}s")
+            _stopping.wait(RECONNECT_DELAY)
+        finally:
+            if connection is not None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+def start():
+    global _thread
+    _stopping.clear()
+    _thread = threading.Thread(target=_listen, name="cache-invalidation", daemon=True)
+    _thread.start()
+    print(f"✅ Cache invalidation listener started (channel {CACHE_INVALIDATION_CHANNEL}).")
+
+def stop():
+    _stopping.set()
+    if _thread is not None:
+        _thread.join(timeout=RECONNECT_DELAY)
+    print("🛑 Cache invalidation listener stopped.")
@@ -1,13 +1,36 @@
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from dotenv import load_dotenv
+from pool_metrics import TimedQueuePool, TimedAsyncAdaptedQueuePool, instrument
+import sql_instrumentation
 import os
 
 load_dotenv()
-print(os.getenv("DATABASE_URL"))
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
+
+# Pool de ligações de cada engine (sync e asyncpg têm pools separados, cada um com estes valores).
+# Os valores por omissão são os do SQLAlchemy; pool_recycle -1 = nunca reciclar.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", -1))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+
+def pool_options():
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+engine = create_engine(DATABASE_URL, poolclass=TimedQueuePool, **pool_options())
+instrument(engine, "sync")
+sql_instrumentation.instrument(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -16,4 +39,54 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Réplica de leitura opcional para os endpoints GET (ver read_routing). Sem réplica, as leituras vão para o primário.
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+if REPLICA_DATABASE_URL:
+    replica_engine = create_engine(REPLICA_DATABASE_URL, poolclass=TimedQueuePool, **pool_options())
+    instrument(replica_engine, "replica")
+    sql_instrumentation.instrument(replica_engine)
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+else:
+    replica_engine = None
+    ReplicaSessionLocal = SessionLocal
+
+# Sessões assíncronas (asyncpg) para os handlers `async def`, que assim não bloqueiam o event loop
+# à espera da base de dados. Por omissão usa a mesma base de dados do DATABASE_URL.
+# O asyncpg não aceita `sslmode` no URL: é passado como `ssl` (aceita os mesmos valores).
+def async_database_url(url: str):
+    url = make_url(url)
+    connect_args = {}
+    if "sslmode" in url.query:
+        connect_args["ssl"] = url.query["sslmode"]
+        url = url.difference_update_query(["sslmode"])
+    return url.set(drivername="postgresql+asyncpg"), connect_args
+
+ASYNC_DATABASE_URL, _async_connect_args = async_database_url(os.getenv("ASYNC_DATABASE_URL") or DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=_async_connect_args, poolclass=TimedAsyncAdaptedQueuePool, **pool_options())
+instrument(async_engine.sync_engine, "async")
+sql_instrumentation.instrument(async_engine.sync_engine)
+# expire_on_commit=False: depois do commit os objetos continuam legíveis sem nova consulta (não há lazy load em async)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Extensões instaladas na base de dados (ex: timescaledb), lidas uma vez por processo
+_extensions = None
+
+def has_extension(db, name: str) -> bool:
+    global _extensions
+    if _extensions is None:
+        _extensions = {extname for (extname,) in db.execute(text("SELECT extname FROM pg_extension")).all()}
+    return name in _extensions
+
+# Tabelas e vistas opcionais criadas pelas migrações (ex: screentime_hourly), verificadas uma vez por processo
+_relations = {}
+
+def has_relation(db, name: str) -> bool:
+    if name not in _relations:
+        _relations[name] = db.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+    return _relations[name]
@@ -1,55 +1,274 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import date, datetime
 from config import engine
-from models import userModel, taskModel, taskStatusModel
-import random
-from sqlalchemy import func
+from models import userModel, taskModel
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Optional
+from sqlalchemy import func, select, text
+from streaks import repair_streaks
+from timezones import DEFAULT_TIMEZONE
+from models.jobRunModel import JobRun
+from screentime_pipeline import SCREENTIME_RETENTION, retention_cutoff
 
-def assign_missing_tasks():
-    print(f"🕒 Verificar tarefas: {datetime.now()}")
+logger = logging.getLogger(__name__)
+
+SCREENTIME_PARTITION_MONTHS_AHEAD = 3
+
+# Número de tarefas atribuídas a cada utilizador por dia
+TASKS_PER_DAY = 2
+# Utilizadores (intervalo de IDs) processados em cada transação da atribuição diária
+TASK_ASSIGNMENT_CHUNK_SIZE = int(os.getenv("TASK_ASSIGNMENT_CHUNK_SIZE", 20000))
+
+# Atribui, num único INSERT ... SELECT, tarefas aleatórias aos utilizadores do intervalo [start, end)
+# que ainda não têm as TASKS_PER_DAY tarefas do seu dia local. O dia local de cada utilizador é
+# calculado na própria consulta a partir da sua timezone (`today` fixa-o, ex: no registo); com `since`,
+# só entram os utilizadores cujo dia local mudou desde esse instante (passagem de dia). Uma timezone
+# desconhecida do PostgreSQL conta como a DEFAULT_TIMEZONE, em vez de fazer falhar o bloco inteiro.
+# As tarefas já atribuídas hoje não se repetem e um utilizador sem tarefas suficientes disponíveis
+# fica sem atribuição, como antes.
+ASSIGN_TASKS_SQL = text("""
+    WITH users AS (
+        SELECT id AS id_user, today
+        FROM (
+            SELECT u.id, coalesce(z.name, :default_timezone) AS timezone,
+                   coalesce(CAST(:today AS date), (now() AT TIME ZONE coalesce(z.name, :default_timezone))::date) AS today
+            FROM "user" u
+            LEFT JOIN pg_timezone_names z ON z.name = u.timezone
+            WHERE u.id >= :start AND u.id < :end
+        ) local_day
+        WHERE CAST(:since AS timestamptz) IS NULL OR (CAST(:since AS timestamptz) AT TIME ZONE timezone)::date < today
+    ),
+    assigned AS (
+        SELECT s.id_user, s.id_task
+        FROM task_status s
+        JOIN users u ON u.id_user = s.id_user
+        WHERE s.completed_at >= u.today AND s.completed_at < u.today + 1
+    ),
+    missing AS (
+        SELECT u.id_user, u.today, :per_day - count(a.id_task) AS missing
+        FROM users u
+        LEFT JOIN assigned a ON a.id_user = u.id_user
+        GROUP BY u.id_user, u.today
+        HAVING count(a.id_task) < :per_day
+    ),
+    candidates AS (
+        SELECT m.id_user, m.today, t.id AS id_task, m.missing,
+               row_number() OVER (PARTITION BY m.id_user ORDER BY random()) AS pick,
+               count(*) OVER (PARTITION BY m.id_user) AS available
+        FROM missing m
+        CROSS JOIN task t
+        WHERE NOT EXISTS (SELECT 1 FROM assigned a WHERE a.id_user = m.id_user AND a.id_task = t.id)
+    )
+    INSERT INTO task_status (id_user, id_task, done, completed_at)
+    SELECT id_user, id_task, false, today
+    FROM candidates
+    WHERE pick <= missing AND available >= missing
+""")
 
-    with Session(engine) as session:
-        today = datetime.now().date()
-        all_tasks = session.query(taskModel.Task).all()
+def assign_tasks_in_range(session: Session, start: int, end: int, today: Optional[date] = None, since: Optional[datetime] = None) -> int:
+    result = session.execute(ASSIGN_TASKS_SQL, {
+        "start": start,
+        "end": end,
+        "today": today,
+        "since": since,
+        "per_day": TASKS_PER_DAY,
+        "default_timezone": DEFAULT_TIMEZONE
+    })
+    return result.rowcount
+
+# Atribui as tarefas do dia local `today` a um único utilizador (ex: no registo), na transação de quem chama (sem commit)
+def assign_tasks_for_user(session: Session, user_id: int, today: date) -> int:
+    return assign_tasks_in_range(session, user_id, user_id + 1, today=today)
+
+# Instante (da base de dados) em que começou a última atribuição completa neste processo
+_last_assignment: Optional[datetime] = None
+# A recuperação ao assumir a liderança e a passagem de dia não podem atribuir ao mesmo tempo
+_assignment_lock = threading.Lock()
+
+# Atribuição das tarefas do dia local de cada utilizador, em blocos de IDs com um commit por bloco,
+# para que nenhuma transação fique com os locks durante o job inteiro. Com `since`, só os utilizadores
+# cujo dia local mudou desde esse instante. Devolve o número de tarefas atribuídas.
+def assign_missing_tasks(chunk_size: int = TASK_ASSIGNMENT_CHUNK_SIZE, since: Optional[datetime] = None) -> int:
+    global _last_assignment
+    print(f"🕒 Verificar tarefas: {datetime.now()}")
 
-        if len(all_tasks) < 2:
+    with _assignment_lock, Session(engine) as session:
+        started_at = session.execute(select(func.now())).scalar()
+        if session.query(taskModel.Task).count() < TASKS_PER_DAY:
             print("Não há tarefas suficientes para atribuir.")
+            return 0
+
+        min_id, max_id = session.query(func.min(userModel.User.id), func.max(userModel.User.id)).one()
+        if min_id is None:
+            return 0
+
+        total = 0
+        for start in range(min_id, max_id + 1, chunk_size):
+            started = time.perf_counter()
+            assigned = assign_tasks_in_range(session, start, start + chunk_size, since=since)
+            session.commit()
+            total += assigned
+            print(f"IDs {start}-{start + chunk_size - 1}: {assigned} tarefas atribuídas em {time.perf_counter() - started:.2f}s")
+        _last_assignment = started_at
+
+        print(f"✅ Atribuições completas ({total} tarefas).")
+        return total
+
+# Passagem de dia escalonada: corre a cada ROLLOVER_INTERVAL_MINUTES e só atribui aos utilizadores
+# em que já passou a meia-noite local desde a atribuição anterior. A carga fica distribuída pelas 24 horas.
+ROLLOVER_INTERVAL_MINUTES = 15
+
+def rollover_due_users() -> int:
+    # Sem atribuição anterior neste processo, processa todos os utilizadores
+    return assign_missing_tasks(since=_last_assignment)
+
+def _next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+# Quando o screentime usa partições nativas (sem TimescaleDB), cria as partições dos próximos meses
+# e apaga as que já passaram do período de retenção. Com TimescaleDB as políticas tratam disto.
+# Devolve o número de partições apagadas.
+def maintain_screentime_partitions() -> int:
+    with engine.begin() as connection:
+        relkind = connection.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('screentime')")).scalar()
+        if relkind != 'p':
+            return 0
+
+        month = date.today().replace(day=1)
+        for _ in range(SCREENTIME_PARTITION_MONTHS_AHEAD + 1):
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS screentime_{month:%Y_%m} PARTITION OF screentime "
+                f"FOR VALUES FROM ('{month}') TO ('{_next_month(month)}')"
+            ))
+            month = _next_month(month)
+
+        if not SCREENTIME_RETENTION:
+            return 0
+
+        cutoff = retention_cutoff(connection)
+        partitions = connection.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = 'screentime' AND child.relname ~ '^screentime_[0-9]{4}_[0-9]{2}$'"
+        )).scalars().all()
+        dropped = 0
+        for partition in partitions:
+            month = datetime.strptime(partition, "screentime_%Y_%m").date()
+            # Só se apaga a partição quando todo o mês já passou do limite de retenção
+            if _next_month(month) <= cutoff:
+                connection.execute(text(f"DROP TABLE {partition}"))
+                dropped += 1
+                print(f"🗑️ Partição {partition} removida (retenção {SCREENTIME_RETENTION}).")
+        return dropped
+
+# Eleição do líder: todos os processos (workers do uvicorn, dynos) arrancam o scheduler, mas só
+# o que tem o advisory lock SCHEDULER_LOCK_ID executa os jobs. O lock fica preso a uma ligação
+# dedicada; se o processo morrer, o PostgreSQL liberta-o e outro processo assume no heartbeat seguinte.
+SCHEDULER_LOCK_ID = int(os.getenv("SCHEDULER_LOCK_ID", 72311))
+SCHEDULER_HEARTBEAT_SECONDS = int(os.getenv("SCHEDULER_HEARTBEAT_SECONDS", 30))
+NODE_NAME = f"{socket.gethostname()}:{os.getpid()}"
+
+_leader_connection = None
+
+def is_leader() -> bool:
+    return _leader_connection is not None
+
+def _release_leadership():
+    global _leader_connection
+    connection, _leader_connection = _leader_connection, None
+    if connection is not None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+# Confirma que ainda é líder ou tenta tornar-se líder. Ao assumir, agenda a recuperação
+# da atribuição de tarefas (pode ter sido perdida se o líder anterior caiu à meia-noite).
+def leader_heartbeat(scheduler):
+    global _leader_connection
+    if _leader_connection is not None:
+        try:
+            _leader_connection.execute(text("SELECT 1"))
             return
+        except Exception:
+            logger.warning(f"Scheduler leadership lost on {NODE_NAME}")
+            _release_leadership()
+
+    connection = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+    # Fora do pool: ao fechar, a ligação termina mesmo e o lock é libertado
+    connection.detach()
+    try:
+        acquired = connection.execute(text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": SCHEDULER_LOCK_ID}).scalar()
+    except Exception:
+        connection.close()
+        raise
+    if not acquired:
+        connection.close()
+        return
 
-        users = session.query(userModel.User).all()
-
-        for user in users:
-            existing_task_ids = set(
-                task_id for (task_id,) in session.query(taskStatusModel.UserTaskStatus.id_task).filter(
-                    taskStatusModel.UserTaskStatus.id_user == user.id,
-                    taskStatusModel.UserTaskStatus.completed_at == today
-                ).all()
-            )
-
-            missing_count = 2 - len(existing_task_ids)
-            if missing_count <= 0:
-                continue 
-
-            available_tasks = [t for t in all_tasks if t.id not in existing_task_ids]
-            if len(available_tasks) < missing_count:
-                print(f"User {user.id} não tem tarefas disponiveis para atribuir.")
-                continue
-
-            new_tasks = random.sample(available_tasks, missing_count)
-            for task in new_tasks:
-                session.add(taskStatusModel.UserTaskStatus(
-                    id_user=user.id,
-                    id_task=task.id,
-                    done=False,
-                    completed_at=today
-                ))
-
-        session.commit()
-        print("✅ Atribuições completas.")
+    _leader_connection = connection
+    print(f"👑 Scheduler leader: {NODE_NAME}")
+    scheduler.add_job(run_assign_missing_tasks, 'date', id="assign_missing_tasks_catch_up", replace_existing=True)
 
+# Corre o job (só no líder) e guarda a execução em job_run, com a duração e as linhas afetadas
+def run_job(name: str, job):
+    if not is_leader():
+        return
+
+    started_at = datetime.now().astimezone()
+    started = time.perf_counter()
+    rows_affected, status, error = None, "success", None
+    try:
+        result = job()
+        rows_affected = result if isinstance(result, int) else None
+    except Exception as e:
+        status, error = "failed", str(e)[:2000]
+        logger.exception(f"Scheduled job {name} failed")
+
+    try:
+        with Session(engine) as session:
+            session.add(JobRun(
+                job_name=name,
+                node=NODE_NAME,
+                started_at=started_at,
+                duration_seconds=time.perf_counter() - started,
+                rows_affected=rows_affected,
+                status=status,
+                error=error
+            ))
+            session.commit()
+    except Exception:
+        logger.exception(f"Could not record run of {name}")
+
+def run_assign_missing_tasks():
+    run_job("assign_missing_tasks", assign_missing_tasks)
+
+def run_rollover_due_users():
+    run_job("rollover_due_users", rollover_due_users)
+
+def run_maintain_screentime_partitions():
+    run_job("maintain_screentime_partitions", maintain_screentime_partitions)
+
+def run_repair_streaks():
+    run_job("repair_streaks", repair_streaks)
+
+# O heartbeat corre logo no arranque, em segundo plano: a recuperação da atribuição de tarefas
+# já não bloqueia o lifespan.
 def start_scheduler():
     scheduler = BackgroundScheduler()
-    scheduler.add_job(assign_missing_tasks, 'cron', hour=0, minute=0)
+    scheduler.add_job(leader_heartbeat, 'interval', seconds=SCHEDULER_HEARTBEAT_SECONDS, args=[scheduler], next_run_time=datetime.now())
+    scheduler.add_job(run_rollover_due_users, 'cron', minute=f"*/{ROLLOVER_INTERVAL_MINUTES}")
+    scheduler.add_job(run_maintain_screentime_partitions, 'cron', hour=3, minute=0)
+    scheduler.add_job(run_repair_streaks, 'cron', hour=3, minute=30)
     scheduler.start()
     return scheduler
+
+def stop_scheduler(scheduler):
+    scheduler.shutdown()
+    _release_leadership()
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.concurrency import run_in_threadpool
+from sockets_events import sio
+
+logger = logging.getLogger(__name__)
+
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 1000))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 4))
+INGEST_DRAIN_TIMEOUT = float(os.getenv("INGEST_DRAIN_TIMEOUT", 30))
+
+_queue = None
+_executor = None
+_workers = []
+_accepting = False
+# Lugares da fila reservados por pedidos que ainda não submeteram o trabalho
+_reserved = 0
+
+metrics = {
+    "enqueued": 0,
+    "processed": 0,
+    "failed": 0,
+    "rejected": 0,
+    "max_depth": 0,
+    "processing_seconds": 0.0,
+}
+
+def get_metrics():
+    return {
+        **metrics,
+        "depth": _queue.qsize() if _queue else 0,
+        "reserved": _reserved,
+        "capacity": INGEST_QUEUE_SIZE,
+        "workers": len(_workers),
+        "accepting": _accepting,
+    }
+
+# Reserva um lugar na fila antes de o pedido fazer trabalho que não se pode desfazer (ex: commit),
+# para que o submit() seguinte não falhe. Devolve False (conta como rejeitado) se a fila estiver
+# cheia ou o worker parado. Cada reserva acaba num submit() ou num release().
+def reserve() -> bool:
+    global _reserved
+    if _queue is None or not _accepting or _queue.qsize() + _reserved >= INGEST_QUEUE_SIZE:
+        metrics["rejected"] += 1
+        return False
+    _reserved += 1
+    return True
+
+def release():
+    global _reserved
+    _reserved -= 1
+
+# Coloca um trabalho no lugar reservado com reserve(). `job` é uma função síncrona (corre numa thread)
+# que devolve a lista de notificações a enviar por socket, como tuplos (evento, dados, sala).
+# Se o worker parou entretanto (a terminar), o trabalho corre já, dentro do pedido.
+async def submit(job, *args):
+    release()
+    if _queue is None or not _accepting:
+        logger.warning(f"Ingest worker is not running, processing {job.__name__} inline")
+        await _process(job, args, run_in_threadpool)
+        return
+
+    _queue.put_nowait((job, args))
+    metrics["enqueued"] += 1
+    metrics["max_depth"] = max(metrics["max_depth"], _queue.qsize())
+
+async def _process(job, args, run):
+    start = time.perf_counter()
+    try:
+        notifications = await run(job, *args)
+        for event, data, room in notifications or []:
+            await sio.emit(event, data, room=room)
+        metrics["processed"] += 1
+    except Exception:
+        metrics["failed"] += 1
+        logger.exception(f"Ingest worker failed to process {job.__name__}")
+    finally:
+        metrics["processing_seconds"] += time.perf_counter() - start
+
+def _run_in_executor(job, *args):
+    return asyncio.get_running_loop().run_in_executor(_executor, job, *args)
+
+async def _worker():
+    while True:
+        job, args = await _queue.get()
+        try:
+            await _process(job, args, _run_in_executor)
+        finally:
+            _queue.task_done()
+
+async def start():
+    global _queue, _executor, _accepting
+    _queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+    # Threads próprias, para não competir com o threadpool dos endpoints síncronos
+    _executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+    _workers.extend(asyncio.create_task(_worker()) for _ in range(INGEST_WORKERS))
+    _accepting = True
+    print(f"✅ Ingest worker started ({INGEST_WORKERS} workers, queue {INGEST_QUEUE_SIZE}).")
+
+# Deixa de aceitar trabalhos e espera que a fila esvazie (até INGEST_DRAIN_TIMEOUT segundos)
+async def stop():
+    global _accepting
+    if _queue is None:
+        return
+
+    _accepting = False
+    try:
+        await asyncio.wait_for(_queue.join(), timeout=INGEST_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Ingest queue not drained in time, {_queue.qsize()} job(s) dropped")
+
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    # Espera pelas threads numa thread à parte, sem bloquear o event loop
+    await asyncio.to_thread(_executor.shutdown, wait=True)
+    print("🛑 Ingest worker stopped.")
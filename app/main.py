@@ -1,34 +1,58 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from config import engine
-from models.userModel import Base
 from routes.userRoutes import router as user_router
 from routes.taskRoutes import router as task_router
 from routes.digitalHabitRoutes import router as digital_habit_router
 from routes.achievementRoutes import router as achievement_router
 from routes.questionRoutes import router as question_router
 from routes.screentimeRoutes import router as screen_time_router
+from routes.internalRoutes import router as internal_router
+from routes.healthRoutes import router as health_router
 
 from sockets_events import sio
 import socketio
 from sockets_events import register_socket_events 
 
 
-from cronjob import start_scheduler, assign_missing_tasks
+from cronjob import start_scheduler, stop_scheduler
+import ingest_worker
+import password_hasher
+import cache_invalidation
+import read_routing
+import sql_instrumentation
+from config import async_engine
+import startup
 scheduler = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global scheduler
-    Base.metadata.create_all(bind=engine)
+    warmup_task = None
+    if startup.IS_PRODUCTION:
+        # Esquema aplicado pelo Alembic na fase de release; a ligação e o catálogo aquecem em segundo plano
+        warmup_task = asyncio.create_task(startup.warmup_in_background())
+    else:
+        startup.warmup(create_schema_first=True)
 
-    assign_missing_tasks()
+    # Escuta das invalidações das caches em memória feitas por outros processos
+    cache_invalidation.start()
 
+    # A atribuição de tarefas em atraso corre em segundo plano, no processo eleito líder
     scheduler = start_scheduler()
     print("✅ Scheduler started.")
+    await ingest_worker.start()
+    password_hasher.start()
     yield
-    scheduler.shutdown()
+    startup.mark_stopping()
+    if warmup_task is not None:
+        warmup_task.cancel()
+    await ingest_worker.stop()
+    await password_hasher.stop()
+    await async_engine.dispose()
+    cache_invalidation.stop()
+    stop_scheduler(scheduler)
     print("🛑 Scheduler stopped.")
 
 app = FastAPI(lifespan=lifespan)
@@ -39,6 +63,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Número e tempo das consultas SQL de cada pedido (Server-Timing e log), com deteção de N+1
+app.middleware("http")(sql_instrumentation.track_queries)
+# Leituras do utilizador no primário logo depois de uma escrita (ver read_routing)
+app.middleware("http")(read_routing.track_writes)
 register_socket_events(sio) 
 sio_app = socketio.ASGIApp(sio, other_asgi_app=app)
 
@@ -49,6 +77,8 @@ app.include_router(digital_habit_router, prefix="/digital-habits", tags=["Digita
 app.include_router(achievement_router, prefix="/achievement", tags=["Achievement"])
 app.include_router(question_router, prefix="/question", tags=["Question"])
 app.include_router(screen_time_router, prefix="/screentime", tags=["Screen Time"])
+app.include_router(internal_router, prefix="/internal", tags=["Internal"])
+app.include_router(health_router, prefix="/health", tags=["Health"])
 
 if __name__ == "__main__":
     import uvicorn
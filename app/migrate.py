@@ -0,0 +1,45 @@
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from config import engine, Base, DATABASE_URL
+import models  # regista todas as tabelas em Base.metadata
+
+# Fase de release: aplica as migrações do Alembic. A migração base (cee8d027893c) não cria as tabelas
+# iniciais, por isso uma base de dados vazia recebe o esquema atual com o create_all e é marcada como head.
+# Uma base de dados com tabelas mas sem histórico do Alembic foi criada pelo create_all no arranque da versão
+# anterior (esquema de BASELINE_REVISION): é marcada com essa revisão e as migrações seguintes correm normalmente.
+BASELINE_REVISION = "fcedf6f2f446"
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+def alembic_config() -> Config:
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "alembic"))
+    # A mesma base de dados da aplicação (o ConfigParser exige '%' escapado)
+    config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
+    return config
+
+def migrate():
+    config = alembic_config()
+    inspector = inspect(engine)
+    if not inspector.has_table("alembic_version"):
+        if not inspector.has_table("user"):
+            print("🕒 Base de dados vazia: criar o esquema atual e marcar como head")
+            Base.metadata.create_all(bind=engine)
+            command.stamp(config, "head")
+            print("✅ Esquema criado.")
+            return
+        # Tabelas de migrações posteriores à base: o esquema veio de um create_all mais recente
+        # (modo development) e não se sabe que migrações já estão aplicadas
+        if inspector.has_table("screentime_daily"):
+            raise SystemExit(
+                "Base de dados sem histórico do Alembic e com um esquema mais recente do que "
+                f"{BASELINE_REVISION}: marcar a revisão correspondente com `alembic stamp <revisão>` e correr de novo"
+            )
+        print(f"🕒 Esquema sem histórico do Alembic: marcar como {BASELINE_REVISION}")
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, "head")
+    print("✅ Esquema atualizado.")
+
+if __name__ == "__main__":
+    migrate()
@@ -8,3 +8,9 @@ from models.achievementModel import Achievement
 from models.achievementStatusModel import UserAchievementStatus
 from models.questionModel import Question
 from models.questionStatusModel import UserQuestionAnswer
+from models.screentimeDailyModel import ScreenTimeDaily
+from models.lumicheckUsageModel import LumicheckUsage
+from models.appNameModel import AppName
+from models.appUsageDailyModel import AppUsageDaily
+from models.userStreakModel import UserStreak
+from models.jobRunModel import JobRun
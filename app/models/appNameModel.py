@@ -0,0 +1,8 @@
+from sqlalchemy import Column, Integer, String
+from config import Base
+
+class AppName(Base):
+    __tablename__ = "app_name"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, unique=True, nullable=False)
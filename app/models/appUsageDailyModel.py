@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, ForeignKey, Date, Index
+from config import Base
+
+class AppUsageDaily(Base):
+    __tablename__ = "app_usage_daily"
+
+    id_user = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    id_app = Column(Integer, ForeignKey("app_name.id", ondelete="CASCADE"), primary_key=True)
+    minutes = Column(Integer, nullable=False, default=0)
+
+    # Permite responder a "minutos na app X no intervalo" só com o índice (index-only scan)
+    __table_args__ = (
+        Index("ix_app_usage_daily_user_app_day", "id_user", "id_app", "day", postgresql_include=["minutes"]),
+    )
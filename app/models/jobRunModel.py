@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, Float, TIMESTAMP
+from config import Base
+
+class JobRun(Base):
+    __tablename__ = "job_run"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_name = Column(String, nullable=False, index=True)
+    # Processo que executou o job (host:pid), útil com vários workers ou nós
+    node = Column(String, nullable=False)
+    started_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    duration_seconds = Column(Float, nullable=False)
+    rows_affected = Column(Integer, nullable=True)
+    # 'success' ou 'failed'
+    status = Column(String, nullable=False)
+    error = Column(String, nullable=True)
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, ForeignKey, Date, BigInteger
+from config import Base
+
+class LumicheckUsage(Base):
+    __tablename__ = "lumicheck_usage"
+
+    id_user = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    last_day = Column(Date, nullable=False)
+    # Bit i a 1 = usou a app LumiCheck no dia (last_day - i), até 63 dias
+    days_bitmap = Column(BigInteger, nullable=False, default=1)
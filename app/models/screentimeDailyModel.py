@@ -0,0 +1,9 @@
+from sqlalchemy import Column, Integer, ForeignKey, Date
+from config import Base
+
+class ScreenTimeDaily(Base):
+    __tablename__ = "screentime_daily"
+
+    id_user = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    total_minutes = Column(Integer, nullable=False, default=0)
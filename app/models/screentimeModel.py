@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, TIMESTAMP
+from sqlalchemy import Column, Integer, ForeignKey, TIMESTAMP, Index, Boolean, false, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from config import Base
@@ -11,5 +11,14 @@ class ScreenTime(Base):
     id_user = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
     timestamp = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
     usage_data = Column(JSONB, nullable=False)
+    # True quando a linha é o snapshot único do dia local do utilizador (modo upsert); o timestamp é então a meia-noite local,
+    # porque a chave única de uma hypertable tem de incluir a coluna de partição. Fica fora das agregações por hora.
+    daily_snapshot = Column(Boolean, nullable=False, default=False, server_default=false())
 
     user = relationship("User", back_populates="screentimes")  # Aqui, usar "User" como string
+
+    __table_args__ = (
+        Index("ix_screentime_user_timestamp", "id_user", "timestamp"),
+        Index("ix_screentime_timestamp_id", "timestamp", "id"),
+        Index("ux_screentime_daily_snapshot", "id_user", "timestamp", unique=True, postgresql_where=text("daily_snapshot")),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Boolean, ForeignKey, DateTime, Index
 from config import Base
 
 class UserTaskStatus(Base):
@@ -7,4 +7,9 @@ class UserTaskStatus(Base):
     id_task = Column(Integer, ForeignKey("task.id", ondelete="CASCADE"))
     done = Column(Boolean, default=False)
     completed_at = Column(DateTime, nullable=True)
-    id = Column(Integer, primary_key=True, index=True)
\ No newline at end of file
+    id = Column(Integer, primary_key=True, index=True)
+
+    __table_args__ = (
+        Index("ix_task_status_user_completed_at", "id_user", "completed_at"),
+        Index("ix_task_status_user_done", "id_user", "done"),
+    )
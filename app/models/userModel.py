@@ -12,6 +12,8 @@ class User(Base):
     onboarding = Column(Boolean, default=False)
     firebase_token = Column(String, nullable=True)
     is_monitoring = Column(Boolean, default=False)
+    # Nome IANA (ex: 'Europe/Lisbon'); None = DEFAULT_TIMEZONE. Define o dia local das tarefas.
+    timezone = Column(String, nullable=True, index=True)
 
     screentimes = relationship("ScreenTime", back_populates="user")  # Aqui, usar "ScreenTime" como string
     digital_habits = relationship("UserDigitalHabitStatus", back_populates="user")
\ No newline at end of file
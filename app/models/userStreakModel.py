@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, ForeignKey, Date
+from config import Base
+
+class UserStreak(Base):
+    __tablename__ = "user_streak"
+
+    id_user = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    # Dias consecutivos com pelo menos uma tarefa concluída, terminando em last_completed_date
+    current_streak = Column(Integer, nullable=False, default=0)
+    longest_streak = Column(Integer, nullable=False, default=0)
+    last_completed_date = Column(Date, nullable=True)
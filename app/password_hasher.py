@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+import password_worker
+import utils
+
+logger = logging.getLogger(__name__)
+
+# O bcrypt demora centenas de ms de CPU por chamada. Corre num pool de processos próprio (usa
+# vários cores e não ocupa o event loop nem o threadpool dos endpoints) e com um limite de pedidos em curso:
+# acima do limite o pedido espera (sem ocupar uma thread) por uma vaga até PASSWORD_HASH_QUEUE_TIMEOUT e depois responde 503.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+PASSWORD_HASH_MAX_CONCURRENCY = int(os.getenv("PASSWORD_HASH_MAX_CONCURRENCY", max(PASSWORD_HASH_WORKERS, 1) * 4))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", 5))
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = asyncio.Semaphore(PASSWORD_HASH_MAX_CONCURRENCY)
+_metrics_lock = threading.Lock()
+
+metrics = {
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "rejected": 0,
+    "rehashed": 0,
+    "waiting": 0,
+    "in_flight": 0,
+    "max_in_flight": 0,
+    "wait_seconds": 0.0,
+    "max_wait_seconds": 0.0,
+    "hash_seconds": 0.0,
+    "pool_restarts": 0,
+}
+
+def get_metrics():
+    with _metrics_lock:
+        return {
+            **metrics,
+            "workers": PASSWORD_HASH_WORKERS,
+            "max_concurrency": PASSWORD_HASH_MAX_CONCURRENCY,
+            "bcrypt_rounds": utils.BCRYPT_ROUNDS,
+        }
+
+def _count(**changes):
+    with _metrics_lock:
+        for name, value in changes.items():
+            metrics[name] += value
+        metrics["max_in_flight"] = max(metrics["max_in_flight"], metrics["in_flight"])
+
+# O spawn carrega o __main__ do processo pai em cada processo filho; com `python main.py` isso seria a
+# aplicação inteira (rotas, engines, scheduler). Os processos são todos criados aqui, de uma vez, com o
+# __main__ a apontar para o password_worker; depois de cheio, o pool não cria mais processos.
+def _start_workers(executor: ProcessPoolExecutor):
+    main_module = sys.modules["__main__"]
+    sys.modules["__main__"] = password_worker
+    try:
+        # Cada submit sem processo livre cria um novo processo, até PASSWORD_HASH_WORKERS
+        futures = [executor.submit(password_worker.ping) for _ in range(PASSWORD_HASH_WORKERS)]
+    finally:
+        sys.modules["__main__"] = main_module
+    for future in futures:
+        future.result()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: os processos filhos não herdam as threads nem as ligações à base de dados deste processo
+            executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            _start_workers(executor)
+            _executor = executor
+        return _executor
+
+# Um processo que morra (ex: OOM) deixa o pool partido para sempre (BrokenProcessPool): é descartado
+# e o pedido seguinte cria um novo
+def _discard_executor(executor: ProcessPoolExecutor):
+    global _executor
+    with _executor_lock:
+        if _executor is not executor:
+            return
+        _executor = None
+    _count(pool_restarts=1)
+    logger.warning("Password hashing pool is broken, recreating it")
+    executor.shutdown(wait=False, cancel_futures=True)
+
+async def _run_in_pool(function, *args):
+    # Criar o pool espera pelo arranque dos processos: fora do event loop
+    executor = _executor or await run_in_threadpool(_get_executor)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        # Uma nova tentativa, já num pool novo
+        executor = await run_in_threadpool(_get_executor)
+        return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+
+# Executa `function` (de password_worker) no pool; o pedido espera sem bloquear o event loop
+async def _run(function, *args):
+    _count(submitted=1, waiting=1)
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(_slots.acquire(), timeout=PASSWORD_HASH_QUEUE_TIMEOUT)
+        acquired = True
+    except asyncio.TimeoutError:
+        acquired = False
+    waited = time.perf_counter() - start
+    with _metrics_lock:
+        metrics["waiting"] -= 1
+        metrics["wait_seconds"] += waited
+        metrics["max_wait_seconds"] = max(metrics["max_wait_seconds"], waited)
+    if not acquired:
+        _count(rejected=1)
+        raise HTTPException(status_code=503, detail="Password hashing is overloaded", headers={"Retry-After": "5"})
+
+    _count(in_flight=1)
+    start = time.perf_counter()
+    try:
+        if PASSWORD_HASH_WORKERS <= 0:
+            result = await run_in_threadpool(function, *args)
+        else:
+            result = await _run_in_pool(function, *args)
+        _count(completed=1)
+        return result
+    except Exception:
+        _count(failed=1)
+        raise
+    finally:
+        _count(in_flight=-1, hash_seconds=time.perf_counter() - start)
+        _slots.release()
+
+async def hash_password(password: str) -> str:
+    return await _run(password_worker.hash_password, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run(password_worker.verify_password, plain_password, hashed_password)
+
+# Como utils.verify_and_update: devolve (válida, novo hash se o custo configurado mudou)
+async def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    valid, new_hash = await _run(password_worker.verify_and_update, plain_password, hashed_password)
+    if new_hash:
+        _count(rehashed=1)
+    return valid, new_hash
+
+def start():
+    if PASSWORD_HASH_WORKERS > 0:
+        _get_executor()
+    print(f"✅ Password hasher started ({PASSWORD_HASH_WORKERS} processes, {PASSWORD_HASH_MAX_CONCURRENCY} concurrent).")
+
+async def stop():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        # Espera pelos hashes em curso numa thread, sem bloquear o event loop
+        await asyncio.to_thread(executor.shutdown, wait=True)
+    print("🛑 Password hasher stopped.")
@@ -0,0 +1,7 @@
+# Código dos processos do pool de hashing (ver password_hasher). Só depende do passlib (via utils):
+# é este o módulo que cada processo carrega como __main__, em vez do main.py com a aplicação e os engines.
+from utils import hash_password, verify_password, verify_and_update
+
+# Tarefa vazia usada para arrancar os processos do pool
+def ping() -> bool:
+    return True
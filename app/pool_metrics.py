@@ -0,0 +1,102 @@
+import bisect
+import threading
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Métricas dos pools de ligações (sync e asyncpg), a partir dos eventos do pool do SQLAlchemy
+# (connect, checkout, checkin, invalidate) e do tempo que cada pedido espera por uma ligação.
+
+# Limites (ms) dos intervalos do histograma de espera; o último intervalo é "acima de 10000 ms"
+WAIT_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+_lock = threading.Lock()
+_engines = {}
+_stats = {}
+
+def _new_stats():
+    return {
+        "connects": 0,
+        "checkouts": 0,
+        "checkins": 0,
+        "invalidations": 0,
+        "timeouts": 0,
+        "wait_seconds": 0.0,
+        "max_wait_seconds": 0.0,
+        "wait_histogram": [0] * (len(WAIT_BUCKETS_MS) + 1),
+    }
+
+def _record_wait(pool, seconds: float, timed_out: bool = False):
+    with _lock:
+        stats = _stats.get(pool.metrics_name)
+        if stats is None:
+            return
+        stats["wait_seconds"] += seconds
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], seconds)
+        stats["wait_histogram"][bisect.bisect_left(WAIT_BUCKETS_MS, seconds * 1000)] += 1
+        if timed_out:
+            stats["timeouts"] += 1
+
+# O SQLAlchemy não tem evento para a espera por uma ligação livre: é medida à volta do _do_get,
+# que inclui a espera na fila do pool e a abertura de uma nova ligação (overflow).
+class _TimedCheckout:
+    metrics_name = None
+
+    # O dispose() do engine substitui o pool por um novo, que continua a contar sob o mesmo nome
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            _record_wait(self, time.perf_counter() - start, timed_out=True)
+            raise
+        _record_wait(self, time.perf_counter() - start)
+        return connection
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+def _count(name: str, counter: str):
+    with _lock:
+        _stats[name][counter] += 1
+
+# Regista os eventos do pool do `engine` (para um AsyncEngine, passar o `sync_engine`) sob `name`
+def instrument(engine, name: str):
+    engine.pool.metrics_name = name
+    with _lock:
+        _engines[name] = engine
+        _stats[name] = _new_stats()
+
+    # Eventos registados no engine: passam para o novo pool depois de um dispose()
+    event.listen(engine, "connect", lambda dbapi_connection, record: _count(name, "connects"))
+    event.listen(engine, "checkout", lambda dbapi_connection, record, proxy: _count(name, "checkouts"))
+    event.listen(engine, "checkin", lambda dbapi_connection, record: _count(name, "checkins"))
+    event.listen(engine, "invalidate", lambda dbapi_connection, record, exception: _count(name, "invalidations"))
+
+def get_metrics():
+    metrics = {}
+    with _lock:
+        for name, stats in _stats.items():
+            pool = _engines[name].pool
+            histogram = {f"<={bound}ms": count for bound, count in zip(WAIT_BUCKETS_MS, stats["wait_histogram"])}
+            histogram[f">{WAIT_BUCKETS_MS[-1]}ms"] = stats["wait_histogram"][-1]
+            metrics[name] = {
+                # Estado atual do pool
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "timeout": pool.timeout(),
+                # Contadores desde o arranque do processo
+                **{key: value for key, value in stats.items() if key != "wait_histogram"},
+                "wait_histogram": histogram,
+            }
+    return metrics
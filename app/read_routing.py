@@ -0,0 +1,83 @@
+import logging
+import os
+import threading
+import time
+from typing import Optional
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from config import SessionLocal, ReplicaSessionLocal, replica_engine
+from auth import token_user_id
+import cache_invalidation
+
+logger = logging.getLogger(__name__)
+
+# Encaminhamento das leituras para a réplica (REPLICA_DATABASE_URL). Depois de um pedido de escrita
+# bem-sucedido, as leituras desse utilizador continuam no primário durante READ_YOUR_WRITES_SECONDS,
+# para que veja logo o que alterou apesar do atraso da replicação. O aviso chega aos outros processos
+# pelo canal de invalidação.
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+# Nome do aviso no canal de invalidação (chave = ID do utilizador)
+RECENT_WRITE = "recent_write"
+# Acima deste número de utilizadores registados, os que já saíram da janela são removidos
+_PRUNE_THRESHOLD = 10000
+
+_recent_writes = {}
+_all_primary_until = 0.0
+_lock = threading.Lock()
+
+def mark_write(user_id: int):
+    now = time.monotonic()
+    with _lock:
+        _recent_writes[user_id] = now + READ_YOUR_WRITES_SECONDS
+        if len(_recent_writes) > _PRUNE_THRESHOLD:
+            for expired in [uid for uid, until in _recent_writes.items() if until < now]:
+                del _recent_writes[expired]
+
+def _on_recent_write(key: Optional[str] = None):
+    global _all_primary_until
+    if key is not None:
+        mark_write(int(key))
+        return
+    # Avisos possivelmente perdidos (ex: a escuta voltou a ligar): todos leem do primário durante a janela
+    with _lock:
+        _all_primary_until = time.monotonic() + READ_YOUR_WRITES_SECONDS
+
+cache_invalidation.register(RECENT_WRITE, _on_recent_write)
+
+def reads_from_primary(user_id: Optional[int]) -> bool:
+    now = time.monotonic()
+    with _lock:
+        if _all_primary_until > now:
+            return True
+        return user_id is not None and _recent_writes.get(user_id, 0) > now
+
+def request_user_id(request: Request) -> Optional[int]:
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token_user_id(token)
+
+# Sessão para endpoints só de leitura: réplica, exceto logo depois de o utilizador escrever
+def get_read_db(request: Request):
+    use_replica = replica_engine is not None and not reads_from_primary(request_user_id(request))
+    db = ReplicaSessionLocal() if use_replica else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Middleware: regista os pedidos de escrita bem-sucedidos de cada utilizador autenticado
+async def track_writes(request: Request, call_next):
+    response = await call_next(request)
+    if replica_engine is None or request.method in ("GET", "HEAD", "OPTIONS") or response.status_code >= 400:
+        return response
+
+    user_id = request_user_id(request)
+    if user_id is not None:
+        try:
+            await run_in_threadpool(cache_invalidation.notify, RECENT_WRITE, str(user_id))
+        except Exception:
+            # Sem o aviso, pelo menos este processo lê do primário
+            mark_write(user_id)
+            logger.exception(f"Failed to publish recent write for user {user_id}")
+    return response
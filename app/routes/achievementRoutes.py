@@ -1,19 +1,20 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.taskModel import Task
 from models.digitalHabitModel import DigitalHabit
-from models.taskStatusModel import UserTaskStatus
 from models.userDigitalHabitModel import UserDigitalHabitStatus
 from models.achievementModel import Achievement
 from models.achievementStatusModel import UserAchievementStatus
-from config import get_db
+from config import get_db, get_async_db
+from read_routing import get_read_db
 from pydantic import BaseModel
 from typing import Optional
 from socketio import AsyncServer
-from sockets_events import sio
-from datetime import datetime, timedelta
-from sqlalchemy import and_, func
-from models.taskStatusModel import UserTaskStatus
+from achievements import get_catalog, trophy_notifications, emit_notifications, ACHIEVEMENT_CATALOG
+import cache_invalidation
+from streaks import current_streak
+from sqlalchemy import select
 from fastapi import Query, Path, Body
 
 router = APIRouter()
@@ -39,8 +40,10 @@ def list_achievements(db: Session = Depends(get_db), current_user: User = Depend
     - `description`: Descrição do objetivo ou significado do troféu
     - `tag`: Etiqueta interna de referência (ex: 'modozen')
     - `image`: URL opcional da imagem associada ao troféu
+
+    A lista vem do catálogo em memória, sem consultar a base de dados.
     """
-    return db.query(Achievement).all()
+    return [achievement._asdict() for achievement in get_catalog(db).achievements]
 
 # Cria um novo trofeu
 @router.post("/create")
@@ -57,6 +60,7 @@ def create_achievement(achievement_data: AchievementCreate, db: Session = Depend
     """
     new_achievement = Achievement(name=achievement_data.name, description=achievement_data.description, tag=achievement_data.tag, image=achievement_data.image)
     db.add(new_achievement)
+    cache_invalidation.publish(db, ACHIEVEMENT_CATALOG)
     db.commit()
     db.refresh(new_achievement)
     return {"message": "Achievement successfully created", "achievement": new_achievement}
@@ -90,6 +94,7 @@ def update_achievement(achievement_id: int, name: str = None, description: str =
     if image:
         achievement.image = image
 
+    cache_invalidation.publish(db, ACHIEVEMENT_CATALOG)
     db.commit()
     db.refresh(achievement)
     return {"message": "Achievement successfully updated", "achievement": achievement}
@@ -108,12 +113,13 @@ def delete_achievement(achievement_id: int, db: Session = Depends(get_db), curre
         raise HTTPException(status_code=404, detail="Achievement not found")
 
     db.delete(achievement)
+    cache_invalidation.publish(db, ACHIEVEMENT_CATALOG)
     db.commit()
     return {"message": "Achievement successfully deleted"}
 
 # Associa um trofeu a um utilizador
 @router.post("/{user_id}/{achievement_id}/unlock")
-async def unlock_achievement(user_id: int, achievement_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def unlock_achievement(user_id: int, achievement_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     """
     Marca um troféu como desbloqueado para um determinado utilizador e aciona um evento via WebSocket para notificar a interface.
 
@@ -122,17 +128,18 @@ async def unlock_achievement(user_id: int, achievement_id: int, db: Session = De
     - `achievement_id`: ID do troféu a desbloquear
     """
     #Verifica se o troféu existe
-    achievement = db.query(Achievement).filter_by(id=achievement_id).first()
+    achievement = (await db.run_sync(get_catalog)).by_id.get(achievement_id)
     if not achievement:
         raise HTTPException(status_code=404, detail="Troféu não encontrado")
     
     # Verifica se já tem o troféu
-    existing_achievement = db.query(UserAchievementStatus).join(Achievement).filter(
+    existing_achievement = (await db.execute(select(UserAchievementStatus).where(
         UserAchievementStatus.id_user == user_id,
-        Achievement.id == achievement_id
-    ).first()
+        UserAchievementStatus.id_achievement == achievement_id
+    ))).scalars().first()
 
     # 3. Atualiza ou cria o registro do troféu
+    notifications = []
     if not existing_achievement:
         user_achievement = UserAchievementStatus(
             id_user=user_id,
@@ -141,22 +148,15 @@ async def unlock_achievement(user_id: int, achievement_id: int, db: Session = De
             # achieved_at=datetime.now() 
         )
         db.add(user_achievement)
-        await sio.emit(
-            'trophy_unlocked',
-            {
-                "title": achievement.name,
-                "description": achievement.description,
-                "image": achievement.image
-            },
-            room=f"user_{user_id}"
-        )
+        notifications = trophy_notifications([(user_id, achievement)])
 
-    db.commit()
+    await db.commit()
+    await emit_notifications(notifications)
     return {"message": "Achievement marked as unlocked"}
 
 #Lista os trofeus desbloqueados por um utilizador
 @router.get("/{user_id}/unlocked")
-def list_unlocked_achievements(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_unlocked_achievements(user_id: int, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     """
     Retorna os troféus que o utilizador já conquistou, com os respetivos detalhes.
 
@@ -173,7 +173,7 @@ def list_unlocked_achievements(user_id: int, db: Session = Depends(get_db), curr
 
 #Lista os trofeus bloqueados de um utilizador
 @router.get("/{user_id}/locked")
-def list_unlocked_achievements(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_unlocked_achievements(user_id: int, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     """
     Retorna os troféus que o utilizador ainda não desbloqueou.
 
@@ -195,39 +195,6 @@ def list_unlocked_achievements(user_id: int, db: Session = Depends(get_db), curr
     return [{"id": achievement.id, "name": achievement.name, "description": achievement.description, "tag": achievement.tag, "image": achievement.image} for achievement in achievements]
 
 
-def get_streak_count(db: Session, user_id: int) -> int:
-    # ÚNICA CONSULTA que busca todas as datas com tarefas concluídas
-    dates = db.query(
-        func.date(UserTaskStatus.completed_at).label('task_date')
-    ).filter(
-        UserTaskStatus.id_user == user_id,
-        UserTaskStatus.done == True
-    ).distinct().order_by(
-        func.date(UserTaskStatus.completed_at).desc()
-    ).all()
-    
-    if not dates:
-        return 0
-    
-    # Processamento em memória
-    dates = [d[0] for d in dates]  # Converte para objetos date
-    today = datetime.now().date()
-    
-    # Se não há tarefa concluída hoje, streak = 0
-    if dates[0] != today:
-        return 0
-    
-    streak = 1
-    # Verifica dias consecutivos
-    for i in range(1, len(dates)):
-        if dates[i] == (dates[i-1] - timedelta(days=1)):
-            streak += 1
-        else:
-            break
-    
-    return streak
-
-
 # Função auxiliar para obter o número de tarefas concluídas consecutivas
 @router.get("/{user_id}/checkModoZen")
 def check_modo_zen_progress(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -240,13 +207,15 @@ def check_modo_zen_progress(user_id: int, db: Session = Depends(get_db), current
     Parâmetros:
     - `user_id`: ID do utilizador
     """
-    existing_achievement = db.query(UserAchievementStatus).join(Achievement).filter(
+    achievement = get_catalog(db).by_tag.get('modozen')
+    if not achievement:
+        raise HTTPException(status_code=404, detail="Achievement not found")
+
+    existing_achievement = db.query(UserAchievementStatus).filter(
         UserAchievementStatus.id_user == user_id,
-        Achievement.tag == 'modozen'
+        UserAchievementStatus.id_achievement == achievement.id
     ).first()
 
-    achievement = db.query(Achievement).filter_by(tag='modozen').first()
-
     if existing_achievement and existing_achievement.done:
         return {
             "unlocked": True,
@@ -261,7 +230,7 @@ def check_modo_zen_progress(user_id: int, db: Session = Depends(get_db), current
             }
         }
     else:
-        streak_count = get_streak_count(db, user_id)
+        streak_count = current_streak(db, user_id)
         return {
             "unlocked": False,
             "progress": streak_count,
@@ -277,7 +246,7 @@ def check_modo_zen_progress(user_id: int, db: Session = Depends(get_db), current
 
 # Lista todos os trofeus (conquistados ou não) de um utilizador
 @router.get("/{user_id}/status")
-def list_achievements_with_status(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_achievements_with_status(user_id: int, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     """
     Lista todos os troféus com o respetivo estado (desbloqueado ou não) para um utilizador.
 
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from models.digitalHabitModel import DigitalHabit
 from models.userDigitalHabitModel import UserDigitalHabitStatus
 from config import get_db
+from read_routing import get_read_db
 from pydantic import BaseModel
 from typing import List
 
@@ -31,7 +32,7 @@ def create_digital_habit(body: DigitalHabitCreate, db: Session = Depends(get_db)
 
 # Lista todos os hábitos digitais
 @router.get("/")
-def list_digital_habits(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_digital_habits(db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     """
     Lista todos os hábitos digitais existentes na app, independentemente de estarem associados ou não a algum utilizador.
     """
@@ -94,7 +95,7 @@ def remove_digital_habit(user_id: int, habit_id: int, db: Session = Depends(get_
 
 # Lista os hábitos digitais associados a um utilizador
 @router.get("/{user_id}")
-def list_associated_digital_habits(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_associated_digital_habits(user_id: int, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     """
     Retorna uma lista com os hábitos atualmente associados ao utilizador especificado.
 
@@ -0,0 +1,28 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+import startup
+
+router = APIRouter()
+
+@router.get("/live")
+def liveness():
+    """
+    Verifica se o processo está vivo. Não consulta a base de dados: responde 200 mesmo durante o arranque.
+    """
+    return {"status": "ok"}
+
+@router.get("/ready")
+def readiness():
+    """
+    Verifica se o processo pode receber tráfego: o aquecimento terminou e a base de dados responde.
+
+    Responde 503 durante o arranque, quando a base de dados não está disponível e ao terminar.
+    Inclui a duração (s) de cada fase do arranque (`timings`).
+    """
+    if not startup.is_ready():
+        return JSONResponse(status_code=503, content={"status": "starting", "mode": startup.STARTUP_MODE, "timings": startup.timings})
+    try:
+        startup.check_database()
+    except Exception:
+        return JSONResponse(status_code=503, content={"status": "database unavailable", "mode": startup.STARTUP_MODE, "timings": startup.timings})
+    return {"status": "ready", "mode": startup.STARTUP_MODE, "timings": startup.timings}
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+import pool_metrics
+
+router = APIRouter()
+
+from auth import get_current_user
+from models.userModel import User
+
+@router.get("/pool")
+def get_pool_metrics(current_user: User = Depends(get_current_user)):
+    """
+    Estado dos pools de ligações à base de dados deste processo (`sync` e `async`).
+
+    Para cada pool:
+    - `size`, `checked_out`, `idle`, `overflow`: ligações configuradas, em uso, livres e extra (acima de `size`)
+    - `connects`, `checkouts`, `checkins`, `invalidations`: contadores dos eventos do pool desde o arranque
+    - `timeouts`: pedidos que desistiram por não haver ligação livre em `DB_POOL_TIMEOUT` segundos
+    - `wait_seconds`, `max_wait_seconds`, `wait_histogram`: tempo de espera por uma ligação (total, máximo e por intervalo)
+    """
+    return pool_metrics.get_metrics()
@@ -1,14 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends, Body
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.questionModel import Question
 from models.questionStatusModel import UserQuestionAnswer
-from models.achievementModel import Achievement
-from models.achievementStatusModel import UserAchievementStatus
-from config import get_db
+from config import get_db, get_async_db
+from read_routing import get_read_db
 from pydantic import BaseModel
 from typing import List
 from socketio import AsyncServer
-from sockets_events import sio
+from achievements import achievement_rule, evaluate_achievements, trophy_notifications, emit_notifications, RuleContext, QUESTIONS_ANSWERED
 import random
 
 router = APIRouter()
@@ -42,18 +42,23 @@ def create_question(body: QuestionCreate, db: Session = Depends(get_db),
 
 # Lista todas as perguntas
 @router.get("/")
-def list_questions(db: Session = Depends(get_db),
+def list_questions(db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)):
     """
     Retorna uma lista com todas as perguntas, independentemente de estarem respondidas ou não.
     """
     return db.query(Question).all()
 
+# Troféu pela primeira resposta: basta responder a uma pergunta
+@achievement_rule('primeiropasso', QUESTIONS_ANSWERED)
+def primeiropasso(ctx: RuleContext, user_id: int, answers: List[QuestionAnswer]) -> bool:
+    return True
+
 # Atribui a resposta de um utilizador a uma pergunta
 @router.post("/answer")
 async def add_question_answer(
     body: List[QuestionAnswer] = Body(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -85,34 +90,11 @@ async def add_question_answer(
 
     user_id = body[0].user_id
 
-    # Verifica se já tem o troféu
-    existing_achievement = db.query(UserAchievementStatus).join(Achievement).filter(
-        UserAchievementStatus.id_user == user_id,
-        Achievement.tag == 'primeiropasso'
-    ).first()   
-
-    # Se o utilizador completar os requisitos e não tiver o troféu, atribui-o
-    if not existing_achievement:
-        achievement = db.query(Achievement).filter_by(tag='primeiropasso').first()
-        if achievement:
-            user_achievement = UserAchievementStatus(
-                id_user=user_id,
-                id_achievement=achievement.id,
-                done=True,
-                #achieved_at=datetime.now()
-            )
-            db.add(user_achievement)
-            await sio.emit(
-                'trophy_unlocked',
-                {
-                    "title": achievement.name,
-                    "description": achievement.description,
-                    "image": achievement.image
-                },
-                room=f"user_{user_id}"
-            )
+    # Atribui o troféu se o utilizador ainda não o tiver
+    notifications = trophy_notifications(await db.run_sync(evaluate_achievements, QUESTIONS_ANSWERED, {user_id: body}))
 
-    db.commit()
+    await db.commit()
+    await emit_notifications(notifications)
     return {"message": f"{len(body)} answer(s) successfully added"}
 
 
@@ -142,7 +124,7 @@ def update_question_answer(body: QuestionAnswer, db: Session = Depends(get_db),
 
 # Lista as respostas de um utilizador
 @router.get("/{user_id}/answers")
-def list_user_answers(user_id: int, db: Session = Depends(get_db),
+def list_user_answers(user_id: int, db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)):
     """
     Lista todas as respostas dadas por um utilizador.
@@ -165,7 +147,7 @@ def list_user_answers(user_id: int, db: Session = Depends(get_db),
 
 # Dá uma pergunta que o utilizador ainda não respondeu
 @router.get("/{user_id}/random_unanswered")
-def random_unanswered_question(user_id: int, db: Session = Depends(get_db),
+def random_unanswered_question(user_id: int, db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)):
     """
     Retorna uma pergunta aleatória que o utilizador ainda não respondeu.
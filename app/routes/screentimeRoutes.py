@@ -1,15 +1,35 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import func
+from sqlalchemy import insert, cast, literal_column, table, column, tuple_, DateTime
 from models.screentimeModel import ScreenTime
-from datetime import datetime, timedelta
+from models.screentimeDailyModel import ScreenTimeDaily
+from models.appNameModel import AppName
+from models.appUsageDailyModel import AppUsageDaily
+from datetime import date, datetime, time, timedelta
 from collections import defaultdict
-from config import get_db
+from config import get_db, get_async_db, SessionLocal, has_extension, has_relation
+from read_routing import get_read_db
 from pydantic import BaseModel
-from typing import Dict
-from models.achievementModel import Achievement
-from models.achievementStatusModel import UserAchievementStatus
-from sockets_events import sio
+from typing import Dict, List, Optional
+import base64
+import json
+import ingest_worker
+from achievements import (
+    achievement_rule, evaluate_achievements, trophy_notifications, emit_notifications,
+    RuleContext, SCREENTIME_RECORDED
+)
+from app_classifier import classify_app
+from screentime_pipeline import (
+    record_daily_total, record_daily_totals, refresh_daily_total, total_minutes_of,
+    used_lumicheck, record_lumicheck_usage, lumicheck_streak_users,
+    record_app_usage, refresh_app_usage, total_minutes_column,
+    upsert_daily_snapshots, snapshot_of_day, day_start, retention_cutoff
+)
 
 router = APIRouter()
 
@@ -21,62 +41,97 @@ class ScreenTimeCreate(BaseModel):
     usage_data: Dict 
 
 def check_detox_status(usage_data: Dict) -> bool:
-    restricted_keywords = [
-        # Social media
-        "instagram", "facebook", "messenger", "twitter", "x", "snapchat", "tiktok", 
-        # Games
-        "clash", "minecraft", "fortnite", "brawl", "candy"
-        # Shopping
-        "amazon", "ebay", "aliexpress", "nike", "adidas", "shein", "temu", 
-        # Gambling/Casinos
-        "bet", "casino", "poker"
-    ]
-    
     app_breakdown = usage_data.get("app_breakdown", {})
     
     for app_name, minutes in app_breakdown.items():
-        lower_app = app_name.lower()
-    
-        if any(keyword in lower_app for keyword in restricted_keywords):
-            if minutes > 10:
-                return False
-    return True
-
-def lumicheck_7_days(db: Session, user_id: int, current_usage: Dict) -> bool:
-    # Verifica se usou lumicheck hoje
-    app_breakdown = current_usage.get("app_breakdown", {})
-    used_today = any("lumicheck" in app.lower() for app in app_breakdown.keys())
-    
-    if not used_today:
-        return False
-    
-    # Verifica os últimos 6 dias
-    today = datetime.now().date()
-    for day_offset in range(1, 7): 
-        target_date = today - timedelta(days=day_offset)
-    
-        day_usage = db.query(ScreenTime).filter(
-            ScreenTime.id_user == user_id,
-            func.date(ScreenTime.timestamp) == target_date
-        ).first()
-        
-        if not day_usage:
+        if minutes > 10 and classify_app(app_name) is not None:
             return False
-            
-        day_apps = day_usage.usage_data.get("app_breakdown", {})
-        used_on_day = any("lumicheck" in app.lower() for app in day_apps.keys())
-        
-        if not used_on_day:
-            return False
-    
     return True
 
+# Número de dias consecutivos de uso da LumiCheck para o troféu `autoconsciente`
+LUMICHECK_STREAK_DAYS = 7
+
 def less_than_4_hours(usage_data: Dict) -> bool:
     total_minutes = usage_data.get("total_minutes", 0)
     return total_minutes < 240
 
+MAX_BULK_ENTRIES = 5000
+
+# Troféus de tempo de ecrã. Os dados do evento são a lista de entradas do utilizador
+# (uma no registo simples, várias no /bulk); basta uma cumprir o critério.
+@achievement_rule('diadedetox', SCREENTIME_RECORDED)
+def diadedetox(ctx: RuleContext, user_id: int, usages: List[Dict]) -> bool:
+    return any(check_detox_status(usage) for usage in usages)
+
+@achievement_rule('autoconsciente', SCREENTIME_RECORDED)
+def autoconsciente(ctx: RuleContext, user_id: int, usages: List[Dict]) -> bool:
+    # O uso de hoje já está no bitmap; uma só leitura para todos os utilizadores do lote que usaram a LumiCheck
+    streak_users = ctx.cached('lumicheck_streak_users', lambda: lumicheck_streak_users(ctx.db, [
+        uid for uid, payload in ctx.payloads.items() if any(map(used_lumicheck, payload))
+    ], LUMICHECK_STREAK_DAYS))
+    return user_id in streak_users
+
+@achievement_rule('horaderecolher', SCREENTIME_RECORDED)
+def horaderecolher(ctx: RuleContext, user_id: int, usages: List[Dict]) -> bool:
+    return any(less_than_4_hours(usage) for usage in usages)
+
+# Avaliação dos troféus fora do pedido, usada pelo worker de ingestão (corre numa thread com sessão própria)
+def evaluate_screentime_achievements(user_id: int, usage_data: Dict):
+    db = SessionLocal()
+    try:
+        notifications = trophy_notifications(evaluate_achievements(db, SCREENTIME_RECORDED, {user_id: [usage_data]}))
+        db.commit()
+        return notifications
+    finally:
+        db.close()
+
+# Valida o utilizador, guarda a entrada e atualiza os agregados do dia (sem commit).
+# Por omissão acrescenta sempre uma linha; sem `keep_snapshots` guarda um único snapshot por dia local (upsert).
+# Devolve a entrada e se os dados do dia mudaram (se não mudaram, não há nada a reavaliar).
+def add_screentime_entry(db: Session, entry: ScreenTimeCreate, keep_snapshots: bool = True):
+    # Check if the user exists
+    user = db.query(User).filter(User.id == entry.id_user).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if keep_snapshots:
+        # Create a new ScreenTime entry
+        new_entry = ScreenTime(
+            id_user=entry.id_user,
+            usage_data=entry.usage_data,
+            timestamp=func.now()
+        )
+        db.add(new_entry)
+    else:
+        changed = user.id in upsert_daily_snapshots(db, {user.id: entry.usage_data}, {user.id: user.timezone})
+        new_entry = db.query(ScreenTime).populate_existing().filter(
+            ScreenTime.id_user == user.id,
+            ScreenTime.daily_snapshot,
+            ScreenTime.timestamp == day_start(user.timezone)
+        ).one()
+        if not changed:
+            return new_entry, False
+
+    # Atualiza o total agregado do dia, o uso por app e o bitmap de uso da LumiCheck
+    record_daily_total(db, user.id, func.current_date(), entry.usage_data)
+    record_app_usage(db, func.current_date(), {user.id: [entry.usage_data]})
+    if used_lumicheck(entry.usage_data):
+        record_lumicheck_usage(db, func.current_date(), [user.id])
+
+    return new_entry, True
+
+# Guarda a entrada e avalia os troféus (sem commit). Devolve a entrada, se mudou e as notificações a enviar.
+def record_screentime(db: Session, entry: ScreenTimeCreate, keep_snapshots: bool = True):
+    new_entry, changed = add_screentime_entry(db, entry, keep_snapshots)
+    if not changed:
+        return new_entry, False, []
+
+    # Verifica e atribui os troféus que o utilizador ainda não tem
+    notifications = trophy_notifications(evaluate_achievements(db, SCREENTIME_RECORDED, {entry.id_user: [entry.usage_data]}))
+    return new_entry, True, notifications
+
 @router.post("/")
-async def create_screentime(entry: ScreenTimeCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_screentime(entry: ScreenTimeCreate, keep_snapshots: bool = Query(True), db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     """
     Regista uma nova entrada de tempo de ecrã para um utilizador.
 
@@ -84,136 +139,229 @@ async def create_screentime(entry: ScreenTimeCreate, db: Session = Depends(get_d
     - `id_user`: ID do utilizador
     - `usage_data`: Dicionário com os dados dp tempo de ecrã, incluindo `app_breakdown` e `total_minutes`
 
+    Parâmetros:
+    - `keep_snapshots`: (opcional, por omissão `true`) Guarda cada envio como uma nova entrada. Com `false`, o
+      cliente envia o uso acumulado do dia e é guardado um único registo por utilizador e dia local (na
+      `timezone` do utilizador), atualizado apenas quando os dados mudam (mantém o de maior `total_minutes`).
+      Esse registo tem o timestamp da meia-noite local e fica fora de `GET /screentime/analytics` com `bucket=hour`
+
     Este endpoint:
     - Guarda a entrada atual
     - Verifica se o utilizador cumpre critérios para desbloquear troféus:
         - `diadedetox`: Evitou apps restritos por mais de 10 minutos
         - `autoconsciente`: Usou o app LumiCheck durante 7 dias consecutivos
         - `horaderecolher`: Usou o telemóvel menos de 4 horas no dia
+    - Se os dados do dia não mudaram desde o último envio, não volta a verificar os troféus (`changed` a `false`)
     """
-    # Check if the user exists
-    user = db.query(User).filter(User.id == entry.id_user).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    # O código síncrono corre sobre a ligação asyncpg (run_sync): as esperas pela base de dados não bloqueiam o event loop
+    new_entry, changed, notifications = await db.run_sync(record_screentime, entry, keep_snapshots)
+    if not changed:
+        return {"message": "Screen time entry unchanged", "entry": new_entry, "changed": False}
 
-    # Create a new ScreenTime entry
-    new_entry = ScreenTime(
-        id_user=entry.id_user,
-        usage_data=entry.usage_data,
-        timestamp=func.now()
-    )
-    db.add(new_entry)
-
-    user_id = user.id
-
-    # Verifica se já tem o troféu
-    existing_achievement = db.query(UserAchievementStatus).join(Achievement).filter(
-        UserAchievementStatus.id_user == user_id,
-        Achievement.tag == 'diadedetox'
-    ).first()   
-
-    # Se o utilizador completar os requisitos e não tiver o troféu, atribui-o
-    if not existing_achievement and check_detox_status(entry.usage_data):
-        achievement = db.query(Achievement).filter_by(tag='diadedetox').first()
-        if achievement:
-            user_achievement = UserAchievementStatus(
-                id_user=user_id,
-                id_achievement=achievement.id,
-                done=True,
-                #achieved_at=datetime.now()
-            )
-            db.add(user_achievement)
-            await sio.emit(
-                'trophy_unlocked',
-                {
-                    "title": achievement.name,
-                    "description": achievement.description,
-                    "image": achievement.image
-                },
-                room=f"user_{user_id}"
-            )
-
-    # Verifica se já tem o troféu
-    existing_achievement = db.query(UserAchievementStatus).join(Achievement).filter(
-        UserAchievementStatus.id_user == user_id,
-        Achievement.tag == 'autoconsciente'
-    ).first()   
-
-    # Se o utilizador completar os requisitos e não tiver o troféu, atribui-o
-    if not existing_achievement and lumicheck_7_days(db, user_id, entry.usage_data):
-        achievement = db.query(Achievement).filter_by(tag='autoconsciente').first()
-        if achievement:
-            user_achievement = UserAchievementStatus(
-                id_user=user_id,
-                id_achievement=achievement.id,
-                done=True,
-                #achieved_at=datetime.now()
-            )
-            db.add(user_achievement)
-            await sio.emit(
-                'trophy_unlocked',
-                {
-                    "title": achievement.name,
-                    "description": achievement.description,
-                    "image": achievement.image
-                },
-                room=f"user_{user_id}"
-            )
-
-    # Verifica se já tem o troféu
-    existing_achievement = db.query(UserAchievementStatus).join(Achievement).filter(
-        UserAchievementStatus.id_user == user_id,
-        Achievement.tag == 'horaderecolher'
-    ).first()   
-
-    # Se o utilizador completar os requisitos e não tiver o troféu, atribui-o
-    if not existing_achievement and less_than_4_hours(entry.usage_data):
-        achievement = db.query(Achievement).filter_by(tag='horaderecolher').first()
-        if achievement:
-            user_achievement = UserAchievementStatus(
-                id_user=user_id,
-                id_achievement=achievement.id,
-                done=True,
-                #achieved_at=datetime.now()
-            )
-            db.add(user_achievement)
-            await sio.emit(
-                'trophy_unlocked',
-                {
-                    "title": achievement.name,
-                    "description": achievement.description,
-                    "image": achievement.image
-                },
-                room=f"user_{user_id}"
-            )
+    await db.commit()
+    await db.refresh(new_entry)
+    await emit_notifications(notifications)
 
-    db.commit()
-    db.refresh(new_entry)
+    return {"message": "Screen time entry created successfully", "entry": new_entry, "changed": True}
+
+@router.post("/async", status_code=202)
+async def create_screentime_async(entry: ScreenTimeCreate, keep_snapshots: bool = Query(True), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """
+    Regista uma entrada de tempo de ecrã e responde de imediato com 202 (Accepted).
+
+    Corpo da requisição (JSON) e `keep_snapshots`: iguais a `POST /screentime/`.
+
+    A entrada e os agregados do dia são guardados antes da resposta. A verificação dos troféus
+    (`diadedetox`, `autoconsciente`, `horaderecolher`) e a notificação por socket são feitas
+    em segundo plano pelo worker de ingestão. Se a fila estiver cheia, responde 503 com `Retry-After`.
+    """
+    # O lugar na fila é reservado antes do commit: depois de guardada, a entrada tem sempre o seu trabalho
+    if not ingest_worker.reserve():
+        raise HTTPException(status_code=503, detail="Ingest queue is full", headers={"Retry-After": "5"})
+
+    def persist():
+        new_entry, changed = add_screentime_entry(db, entry, keep_snapshots)
+        db.commit()
+        return new_entry.id, changed
+
+    try:
+        entry_id, changed = await run_in_threadpool(persist)
+    except BaseException:
+        ingest_worker.release()
+        raise
+    if changed:
+        await ingest_worker.submit(evaluate_screentime_achievements, entry.id_user, entry.usage_data)
+    else:
+        ingest_worker.release()
+
+    return {"message": "Screen time entry accepted", "entry_id": entry_id, "changed": changed}
+
+@router.get("/ingest/metrics")
+def get_ingest_metrics(current_user: User = Depends(get_current_user)):
+    """
+    Estado do worker de ingestão em segundo plano: profundidade atual e máxima da fila,
+    trabalhos processados, falhados e rejeitados (fila cheia) e tempo total de processamento.
+    """
+    return ingest_worker.get_metrics()
 
-    return {"message": "Screen time entry created successfully", "entry": new_entry}
+# Guarda um lote de entradas (de um ou mais utilizadores) e avalia os troféus de cada utilizador (sem commit).
+# Devolve o número de utilizadores, o número de utilizadores cujos dados mudaram e as notificações a enviar.
+def record_screentime_bulk(db: Session, entries: List[ScreenTimeCreate], keep_snapshots: bool = True):
+    usage_by_user = defaultdict(list)
+    for entry in entries:
+        usage_by_user[entry.id_user].append(entry.usage_data)
+
+    # Verifica se os utilizadores existem, numa só consulta
+    timezones = dict(db.query(User.id, User.timezone).filter(User.id.in_(usage_by_user.keys())).all())
+    existing_ids = set(timezones)
+    missing_ids = sorted(set(usage_by_user.keys()) - existing_ids)
+    if missing_ids:
+        raise HTTPException(status_code=404, detail=f"User not found: {missing_ids}")
+
+    if keep_snapshots:
+        db.execute(insert(ScreenTime), [
+            {"id_user": entry.id_user, "usage_data": entry.usage_data}
+            for entry in entries
+        ])
+    else:
+        # Um snapshot por utilizador; os que não mudaram ficam de fora dos agregados e dos troféus
+        changed_ids = upsert_daily_snapshots(db, {
+            user_id: snapshot_of_day(usages) for user_id, usages in usage_by_user.items()
+        }, timezones)
+        usage_by_user = {user_id: usages for user_id, usages in usage_by_user.items() if user_id in changed_ids}
+
+    # Atualiza os totais agregados do dia (um valor por utilizador)
+    daily_totals = {}
+    for user_id, usages in usage_by_user.items():
+        totals = [total for total in map(total_minutes_of, usages) if total is not None]
+        if totals:
+            daily_totals[user_id] = max(totals)
+    record_daily_totals(db, func.current_date(), daily_totals)
+    record_app_usage(db, func.current_date(), usage_by_user)
+    record_lumicheck_usage(db, func.current_date(), [
+        user_id for user_id, usages in usage_by_user.items() if any(map(used_lumicheck, usages))
+    ])
+
+    notifications = trophy_notifications(evaluate_achievements(db, SCREENTIME_RECORDED, usage_by_user))
+    return len(existing_ids), len(usage_by_user), notifications
+
+@router.post("/bulk")
+async def create_screentime_bulk(entries: List[ScreenTimeCreate], keep_snapshots: bool = Query(True), db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    """
+    Regista várias entradas de tempo de ecrã de uma só vez (ex: dados guardados offline pelo cliente).
+
+    Corpo da requisição (JSON): lista de objetos com
+    - `id_user`: ID do utilizador
+    - `usage_data`: Dicionário com os dados do tempo de ecrã, incluindo `app_breakdown` e `total_minutes`
+
+    As entradas podem pertencer a vários utilizadores. São inseridas num único INSERT com várias linhas
+    e os troféus `diadedetox`, `autoconsciente` e `horaderecolher` são avaliados uma vez por utilizador.
+
+    Parâmetros:
+    - `keep_snapshots`: (opcional, por omissão `true`) Guarda todas as entradas. Com `false` guarda apenas o snapshot
+      do dia local com maior `total_minutes` de cada utilizador, e só os utilizadores cujos dados mudaram são reavaliados.
+    """
+    if not entries:
+        raise HTTPException(status_code=400, detail="No entries provided")
+    if len(entries) > MAX_BULK_ENTRIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_ENTRIES} entries per request")
+
+    users, changed_users, notifications = await db.run_sync(record_screentime_bulk, entries, keep_snapshots)
+
+    await db.commit()
+    await emit_notifications(notifications)
+
+    return {"message": f"{len(entries)} screen time entries created successfully", "users": users, "changed_users": changed_users}
+
+MAX_PAGE_SIZE = 1000
+# Linhas lidas de cada vez do cursor do servidor no modo NDJSON
+STREAM_BATCH_SIZE = 1000
+
+# O cursor é opaco para o cliente: (timestamp, id) da última linha devolvida, em JSON e base64
+def encode_cursor(entry: ScreenTime) -> str:
+    return base64.urlsafe_b64encode(json.dumps([entry.timestamp.isoformat(), entry.id]).encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        timestamp, entry_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(timestamp), int(entry_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Uma página ordenada por (timestamp, id); o filtro por tuplo usa o índice e não depende de OFFSET
+def screentime_page(query, limit: int, cursor: Optional[str]):
+    if cursor:
+        query = query.filter(tuple_(ScreenTime.timestamp, ScreenTime.id) > decode_cursor(cursor))
+    entries = query.order_by(ScreenTime.timestamp, ScreenTime.id).limit(limit + 1).all()
+
+    next_cursor = encode_cursor(entries[limit - 1]) if len(entries) > limit else None
+    return {"items": entries[:limit], "next_cursor": next_cursor}
+
+# Devolve as linhas uma a uma como NDJSON, lidas em blocos de um cursor do servidor (memória constante).
+# Usa uma sessão própria (no mesmo engine do pedido: primário ou réplica), que vive enquanto a resposta está a ser enviada.
+def stream_screentime(bind, *filters):
+    db = SessionLocal(bind=bind)
+    try:
+        query = db.query(ScreenTime).filter(*filters).order_by(ScreenTime.timestamp, ScreenTime.id)
+        for entry in query.yield_per(STREAM_BATCH_SIZE):
+            yield json.dumps(jsonable_encoder(entry)) + "\n"
+            db.expunge(entry)
+    finally:
+        db.close()
 
 @router.get("/")
-def list_screentime_entries(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_screentime_entries(
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    stream: bool = False,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
     """
     Retorna todas as entradas de tempo de ecrã registadas no sistema.
+
+    Parâmetros (opcionais):
+    - `limit`: Devolve uma página com no máximo `limit` entradas (1 a 1000), ordenadas por `timestamp` e `id`,
+      no formato `{"items": [...], "next_cursor": ...}`
+    - `cursor`: Valor de `next_cursor` da página anterior; `next_cursor` vem a `null` na última página
+    - `stream`: Se `true`, devolve todas as entradas em NDJSON (uma entrada JSON por linha), enviadas à medida que são lidas
+
+    Sem `limit`, `cursor` nem `stream` devolve a lista completa (para tabelas grandes, usar a paginação ou o NDJSON).
     """
+    if stream:
+        return StreamingResponse(stream_screentime(db.get_bind()), media_type="application/x-ndjson")
+    if limit or cursor:
+        return screentime_page(db.query(ScreenTime), limit or MAX_PAGE_SIZE, cursor)
+
     return db.query(ScreenTime).all()
 
 @router.get("/{user_id}")
-def get_user_screentime(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_user_screentime(
+    user_id: int,
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    stream: bool = False,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
     """
     Retorna todas as entradas de tempo de ecrã associadas a um determinado utilizador.
 
     Parâmetros:
     - `user_id`: ID do utilizador
+    - `limit`, `cursor`, `stream`: (opcionais) Paginação e NDJSON, como em `GET /screentime/`
 
     Retorna uma lista com os registos de tempo de ecrã. Se o utilizador não tiver registos, retorna erro 404.
     """
-    screentime_entries = db.query(ScreenTime).filter(ScreenTime.id_user == user_id).all()
-    if not screentime_entries:
+    if not cursor and not db.query(ScreenTime.id).filter(ScreenTime.id_user == user_id).first():
         raise HTTPException(status_code=404, detail="No screen time data found for this user")
-    
-    return screentime_entries
+
+    if stream:
+        return StreamingResponse(stream_screentime(db.get_bind(), ScreenTime.id_user == user_id), media_type="application/x-ndjson")
+    if limit or cursor:
+        return screentime_page(db.query(ScreenTime).filter(ScreenTime.id_user == user_id), limit or MAX_PAGE_SIZE, cursor)
+
+    return db.query(ScreenTime).filter(ScreenTime.id_user == user_id).all()
 
 @router.delete("/{entry_id}")
 def delete_screentime_entry(entry_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -222,60 +370,234 @@ def delete_screentime_entry(entry_id: int, db: Session = Depends(get_db), curren
 
     Parâmetros:
     - `entry_id`: ID da entrada a apagar
+
+    Os totais do dia (diário e por app) são recalculados sem a entrada, exceto nos dias já abrangidos
+    pela retenção (`SCREENTIME_RETENTION`), em que os registos em bruto estão incompletos.
     """
     entry = db.query(ScreenTime).filter(ScreenTime.id == entry_id).first()
     if not entry:
         raise HTTPException(status_code=404, detail="Screen time entry not found")
     
+    user_id = entry.id_user
+    day = entry.timestamp.date()
     db.delete(entry)
+    db.flush()
+
+    # Recalcula os agregados do dia da entrada apagada, se os registos em bruto desse dia estiverem completos
+    cutoff = retention_cutoff(db)
+    if cutoff is None or day > cutoff:
+        refresh_daily_total(db, user_id, day)
+        refresh_app_usage(db, user_id, day)
     db.commit()
     return {"message": f"Screen time entry with ID {entry_id} has been deleted"}
 
+def get_daily_totals(db: Session, user_id: int, days: int):
+    # Verificar se o usuário existe
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    start_day = (datetime.now() - timedelta(days=days)).date()
+
+    # Uma única leitura por intervalo na chave primária (id_user, day)
+    entries = db.query(ScreenTimeDaily.day, ScreenTimeDaily.total_minutes).filter(
+        ScreenTimeDaily.id_user == user_id,
+        ScreenTimeDaily.day >= start_day
+    ).order_by(ScreenTimeDaily.day).all()
+
+    return [
+        {
+            "date": entry.day.strftime("%d/%m"),
+            "total_minutes": entry.total_minutes
+        }
+        for entry in entries
+    ]
+
 @router.get("/last7days/{user_id}")
-def get_last_7days_screentime(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_last_7days_screentime(user_id: int, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     """
     Obtém os dados do tempo de ecrã dos últimos 7 dias de um utilizador.
 
     Parâmetros:
     - `user_id`: ID do utilizador
 
-    Retorna uma lista com objetos que contêm:
+    Retorna uma lista com objetos que contêm (um por dia):
     - `date`: Data no formato `dd/mm`
     - `total_minutes`: Tempo total de ecrã nesse dia
 
     Útil para construir gráficos de evolução do tempo de ecrã na interface da aplicação.
     """
-    # Verificar se o usuário existe
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    result = get_daily_totals(db, user_id, 7)
+    if not result:
+        raise HTTPException(status_code=404, detail="No screen time data found for this user in the last 7 days")
 
-    # Calcular a data de 7 dias atrás a partir de agora
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    
-    # Consultar os registros dos últimos 7 dias para o usuário
-    entries = db.query(ScreenTime).filter(
-        ScreenTime.id_user == user_id,
-        ScreenTime.timestamp >= seven_days_ago
-    ).order_by(ScreenTime.timestamp).all()
+    return result
 
-    if not entries:
-        raise HTTPException(status_code=404, detail="No screen time data found for this user in the last 7 days")
+@router.get("/daily/{user_id}")
+def get_daily_screentime(user_id: int, days: int = Query(30, ge=1, le=366), db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    """
+    Obtém o tempo de ecrã total por dia de um utilizador num intervalo maior (por omissão 30 dias).
 
-    # Formatando a resposta com data no formato dd/mm e os dados de uso
-    result = []
-    for entry in entries:
-        # Converter o timestamp para o formato dd/mm
-        date_str = entry.timestamp.strftime("%d/%m")
-        
-        # Extrair o total_minutes do usage_data
-        total_minutes = entry.usage_data.get('total_minutes')
-        
-        # Se não existir total_minutes, pode definir um valor padrão ou pular
-        if total_minutes is not None:
-            result.append({
-                "date": date_str,
-                "total_minutes": total_minutes
-            })
-
-    return result
\ No newline at end of file
+    Parâmetros:
+    - `user_id`: ID do utilizador
+    - `days`: Número de dias a incluir (1 a 366)
+
+    Retorna uma lista com `date` (`dd/mm`) e `total_minutes`, um elemento por dia com dados.
+    """
+    return get_daily_totals(db, user_id, days)
+
+@router.get("/apps/{user_id}")
+def get_app_usage(user_id: int, days: int = Query(30, ge=1, le=366), app: str = None, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    """
+    Obtém o tempo de utilização por app de um utilizador num intervalo de dias (por omissão 30).
+
+    Parâmetros:
+    - `user_id`: ID do utilizador
+    - `days`: Número de dias a incluir (1 a 366)
+    - `app`: (opcional) Filtra pelas apps cujo nome contém este texto (ex: `instagram`)
+
+    Retorna uma lista ordenada por minutos, com `app` (nome do pacote) e `minutes` (total no intervalo).
+    Os dados vêm da tabela normalizada `app_usage_daily`, sem ler o JSONB das entradas.
+    """
+    start_day = (datetime.now() - timedelta(days=days)).date()
+
+    query = db.query(
+        AppName.name,
+        func.sum(AppUsageDaily.minutes).label("minutes")
+    ).join(AppName, AppName.id == AppUsageDaily.id_app).filter(
+        AppUsageDaily.id_user == user_id,
+        AppUsageDaily.day >= start_day
+    )
+    if app:
+        query = query.filter(AppName.name.ilike(f"%{app}%"))
+
+    rows = query.group_by(AppName.name).order_by(func.sum(AppUsageDaily.minutes).desc()).all()
+    return [{"app": row.name, "minutes": row.minutes} for row in rows]
+
+# Intervalo máximo (em dias) por tipo de agregação, para limitar o número de grupos devolvidos
+ANALYTICS_MAX_DAYS = {"hour": 31, "day": 366, "week": 366 * 3, "month": 366 * 20}
+ANALYTICS_MAX_DAYS_HOURLY_AGGREGATE = 366
+
+# Agregação contínua por hora (só existe quando o screentime é uma hypertable do TimescaleDB)
+screentime_hourly = table(
+    "screentime_hourly",
+    column("id_user"), column("bucket"), column("max_minutes"), column("avg_minutes"), column("samples")
+)
+
+def bucket_expression(db: Session, bucket: str, column):
+    # Usa o time_bucket do TimescaleDB quando a extensão existe, senão o date_trunc do PostgreSQL.
+    # O `bucket` já foi validado; vai como literal para a expressão ser igual no SELECT e no GROUP BY.
+    if has_extension(db, "timescaledb"):
+        return func.time_bucket(literal_column(f"INTERVAL '1 {bucket}'"), column)
+    return func.date_trunc(literal_column(f"'{bucket}'"), column)
+
+@router.get("/analytics/{user_id}")
+def get_screentime_analytics(
+    user_id: int,
+    bucket: str = Query("day", pattern="^(hour|day|week|month)$"),
+    start: date = None,
+    end: date = None,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Estatísticas do tempo de ecrã de um utilizador agrupadas por hora, dia, semana ou mês.
+
+    Parâmetros:
+    - `user_id`: ID do utilizador
+    - `bucket`: `hour`, `day`, `week` ou `month` (por omissão `day`)
+    - `start`: (opcional) Primeiro dia do intervalo, `YYYY-MM-DD` (por omissão 30 dias antes de `end`)
+    - `end`: (opcional) Último dia do intervalo, `YYYY-MM-DD` (por omissão hoje)
+
+    Cada elemento da resposta contém:
+    - `bucket`: Início do período
+    - `total_minutes`: Total de minutos no período
+    - `average_minutes`, `p50_minutes`, `p90_minutes`, `p95_minutes`: Média e percentis dos valores do período
+    - `samples`: Número de valores considerados
+
+    Para `day`, `week` e `month` os valores são os totais diários (tabela `screentime_daily`).
+    Para `hour` são os registos em bruto dessa hora; como o uso é acumulado no dia, o total é o maior registo.
+    Os snapshots diários (entradas enviadas com `keep_snapshots=false`) ficam de fora: têm o timestamp
+    da meia-noite local e não dizem a que hora o uso foi registado.
+    Com TimescaleDB, `hour` lê a agregação contínua `screentime_hourly` (até 366 dias) e os percentis vêm a `null`.
+    """
+    end = end or datetime.now().date()
+    start = start or end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    use_hourly_aggregate = bucket == "hour" and has_relation(db, "screentime_hourly")
+    max_days = ANALYTICS_MAX_DAYS_HOURLY_AGGREGATE if use_hourly_aggregate else ANALYTICS_MAX_DAYS[bucket]
+    if (end - start).days > max_days:
+        raise HTTPException(status_code=400, detail=f"At most {max_days} days for bucket '{bucket}'")
+
+    if use_hourly_aggregate:
+        # Uma linha por hora já agregada; os percentis dentro da hora não são guardados
+        rows = db.query(
+            screentime_hourly.c.bucket,
+            screentime_hourly.c.max_minutes,
+            screentime_hourly.c.avg_minutes,
+            screentime_hourly.c.samples
+        ).filter(
+            screentime_hourly.c.id_user == user_id,
+            screentime_hourly.c.bucket >= datetime.combine(start, time.min),
+            screentime_hourly.c.bucket < datetime.combine(end + timedelta(days=1), time.min),
+            screentime_hourly.c.samples > 0
+        ).order_by(screentime_hourly.c.bucket).all()
+
+        return [
+            {
+                "bucket": row.bucket,
+                "total_minutes": row.max_minutes,
+                "average_minutes": round(float(row.avg_minutes), 1),
+                "p50_minutes": None,
+                "p90_minutes": None,
+                "p95_minutes": None,
+                "samples": row.samples
+            }
+            for row in rows
+        ]
+
+    if bucket == "hour":
+        value = total_minutes_column()
+        period = bucket_expression(db, bucket, ScreenTime.timestamp).label("bucket")
+        total = func.max(value)
+        filters = [
+            ScreenTime.id_user == user_id,
+            ScreenTime.timestamp >= datetime.combine(start, time.min),
+            ScreenTime.timestamp < datetime.combine(end + timedelta(days=1), time.min),
+            ScreenTime.usage_data.has_key("total_minutes"),
+            ~ScreenTime.daily_snapshot
+        ]
+    else:
+        value = ScreenTimeDaily.total_minutes
+        period = bucket_expression(db, bucket, cast(ScreenTimeDaily.day, DateTime)).label("bucket")
+        total = func.sum(value)
+        filters = [
+            ScreenTimeDaily.id_user == user_id,
+            ScreenTimeDaily.day >= start,
+            ScreenTimeDaily.day <= end
+        ]
+
+    rows = db.query(
+        period,
+        total.label("total_minutes"),
+        func.avg(value).label("average_minutes"),
+        func.percentile_cont(0.5).within_group(value).label("p50_minutes"),
+        func.percentile_cont(0.9).within_group(value).label("p90_minutes"),
+        func.percentile_cont(0.95).within_group(value).label("p95_minutes"),
+        func.count().label("samples")
+    ).filter(*filters).group_by(period).order_by(period).all()
+
+    return [
+        {
+            "bucket": row.bucket,
+            "total_minutes": row.total_minutes,
+            "average_minutes": round(float(row.average_minutes), 1),
+            "p50_minutes": row.p50_minutes,
+            "p90_minutes": row.p90_minutes,
+            "p95_minutes": row.p95_minutes,
+            "samples": row.samples
+        }
+        for row in rows
+    ]
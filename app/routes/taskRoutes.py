@@ -1,15 +1,19 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.taskModel import Task
 from models.taskStatusModel import UserTaskStatus
-from models.achievementModel import Achievement
-from models.achievementStatusModel import UserAchievementStatus
-from config import get_db
+from config import get_db, get_async_db
+from read_routing import get_read_db
 from pydantic import BaseModel
-from datetime import date, datetime, time, timedelta
-from sqlalchemy import and_, func
+from typing import NamedTuple
+from datetime import date, datetime, time
+from sqlalchemy import and_
 from socketio import AsyncServer
-from sockets_events import sio
+from models.userStreakModel import UserStreak
+from streaks import record_task_toggle, active_streak
+from timezones import local_now, local_today, user_timezone
+from achievements import achievement_rule, evaluate_achievements, trophy_notifications, emit_notifications, RuleContext, TASK_TOGGLED
 
 router = APIRouter()
 
@@ -55,64 +59,47 @@ def delete_task(task_id: int, db: Session = Depends(get_db), current_user: User
 
 # Lista todas as tarefas
 @router.get("/")
-def list_tasks(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_tasks(db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     """
     Lista todas as tarefas existentes na app.
     """
     return db.query(Task).all()
 
-def get_streak_count(db: Session, user_id: int) -> int:
-    # ÚNICA CONSULTA que busca todas as datas com tarefas concluídas
-    dates = db.query(
-        func.date(UserTaskStatus.completed_at).label('task_date')
-    ).filter(
+# Dados do evento TASK_TOGGLED: os contadores de streak já atualizados pelo toggle e o dia local do utilizador
+class TaskToggle(NamedTuple):
+    streak: UserStreak
+    today: date
+
+# Troféus de tarefas
+@achievement_rule('marcodos20', TASK_TOGGLED)
+def marcodos20(ctx: RuleContext, user_id: int, toggle: TaskToggle) -> bool:
+    # Recontar tarefas completas
+    completed_tasks_count = ctx.db.query(UserTaskStatus).filter(
         UserTaskStatus.id_user == user_id,
         UserTaskStatus.done == True
-    ).distinct().order_by(
-        func.date(UserTaskStatus.completed_at).desc()
-    ).all()
-    
-    if not dates:
-        return 0
-    
-    # Processamento em memória
-    dates = [d[0] for d in dates]  # Converte para objetos date
-    today = datetime.now().date()
-    
-    # Se não há tarefa concluída hoje, streak = 0
-    if dates[0] != today:
-        return 0
-    
-    streak = 1
-    # Verifica dias consecutivos
-    for i in range(1, len(dates)):
-        if dates[i] == (dates[i-1] - timedelta(days=1)):
-            streak += 1
-        else:
-            break
-    
-    return streak
-
-@router.post("/{task_id}/{user_id}/toggle")
-async def toggle_task_completion(task_id: int, user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    """
-    Altera o estado de conclusão de uma tarefa diária de um utilizador.
-
-    Parâmetros:
-    - `task_id`: ID da tarefa
-    - `user_id`: ID do utilizador
-
-    Além de atualizar o estado da tarefa, este endpoint também verifica e atribui os seguintes troféus:
-    - `marcodos20`: 20 tarefas concluídas no total
-    - `dedicado`: 7 dias consecutivos com pelo menos uma tarefa concluída
-    - `perfecionista`: 14 dias consecutivos com tarefas concluídas
-    - `modozen`: 30 dias consecutivos com tarefas concluídas
-    """
+    ).count()
+    return completed_tasks_count >= 20
+
+def streak_rule(tag: str, days: int):
+    @achievement_rule(tag, TASK_TOGGLED)
+    def predicate(ctx: RuleContext, user_id: int, toggle: TaskToggle) -> bool:
+        return active_streak(toggle.streak, toggle.today) >= days
+    return predicate
+
+streak_rule('dedicado', 7)
+streak_rule('perfecionista', 14)
+streak_rule('modozen', 30)
+
+# Alterna o estado da tarefa de hoje, atualiza o streak e avalia os troféus (sem commit).
+# Devolve o novo estado e as notificações a enviar.
+def toggle_task(db: Session, task_id: int, user_id: int):
     task = db.query(Task).filter_by(id=task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    today = date.today()
+    # O dia e a hora de conclusão seguem a timezone do utilizador
+    timezone = user_timezone(db, user_id)
+    today = local_today(timezone)
     start_of_day = datetime.combine(today, time.min)
     end_of_day = datetime.combine(today, time.max)
 
@@ -127,146 +114,49 @@ async def toggle_task_completion(task_id: int, user_id: int, db: Session = Depen
         raise HTTPException(status_code=400, detail="Task is not assigned for today")
 
     status.done = not status.done
-    status.completed_at = datetime.now()
+    status.completed_at = local_now(timezone)
 
-    # Verifica se já tem o troféu "marcodos20"
-    existing_achievement = db.query(UserAchievementStatus).join(Achievement).filter(
-        UserAchievementStatus.id_user == user_id,
-        Achievement.tag == 'marcodos20'
-    ).first()
+    # Atualiza o streak e verifica os troféus que o utilizador ainda não tem.
+    # A sessão não faz autoflush, por isso o novo estado é enviado antes de as regras contarem as tarefas.
+    db.flush()
+    streak = record_task_toggle(db, user_id, status.done, today)
+    notifications = trophy_notifications(evaluate_achievements(db, TASK_TOGGLED, {user_id: TaskToggle(streak, today)}))
 
-    # Se o utilizador completar 20 tarefas e não tiver o troféu, atribui-o
-    if not existing_achievement:
-        # Recontar tarefas completas
-        completed_tasks_count = db.query(UserTaskStatus).filter(
-            UserTaskStatus.id_user == user_id,
-            UserTaskStatus.done == True
-        ).count()
-        if completed_tasks_count >= 20:
-            achievement = db.query(Achievement).filter_by(tag='marcodos20').first()
-            if achievement:
-                user_achievement = UserAchievementStatus(
-                    id_user=user_id,
-                    id_achievement=achievement.id,
-                    done=True,
-                    #achieved_at=datetime.now()
-                )
-                db.add(user_achievement)
-                await sio.emit(
-                    'trophy_unlocked',
-                    {
-                        "title": achievement.name,
-                        "description": achievement.description,
-                        "image": achievement.image
-                    },
-                    room=f"user_{user_id}"
-                )
-
-    # Verifica se já tem o troféu
-    existing_achievement2 = db.query(UserAchievementStatus).join(Achievement).filter(
-        UserAchievementStatus.id_user == user_id,
-        Achievement.tag == 'dedicado'
-    ).first()
+    return status.done, notifications
 
-    # Se o utilizador completar os requisitos e não tiver o troféu, atribui-o
-    if not existing_achievement2 :
-        # Ver streak de tarefas concluídas
-        streak_tasks_count = get_streak_count(db, user_id)
-        if streak_tasks_count >= 7:
-            achievement = db.query(Achievement).filter_by(tag='dedicado').first()
-            if achievement:
-                user_achievement = UserAchievementStatus(
-                    id_user=user_id,
-                    id_achievement=achievement.id,
-                    done=True,
-                    #achieved_at=datetime.now()
-                )
-                db.add(user_achievement)
-                await sio.emit(
-                    'trophy_unlocked',
-                    {
-                        "title": achievement.name,
-                        "description": achievement.description,
-                        "image": achievement.image
-                    },
-                    room=f"user_{user_id}"
-                )
-
-    # Verifica se já tem o troféu
-    existing_achievement3 = db.query(UserAchievementStatus).join(Achievement).filter(
-        UserAchievementStatus.id_user == user_id,
-        Achievement.tag == 'perfecionista'
-    ).first()
+@router.post("/{task_id}/{user_id}/toggle")
+async def toggle_task_completion(task_id: int, user_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    """
+    Altera o estado de conclusão de uma tarefa diária de um utilizador.
 
-    # Se o utilizador completar os requisitos e não tiver o troféu, atribui-o
-    if not existing_achievement3 :
-        # Ver streak de tarefas concluídas
-        streak_tasks_count = get_streak_count(db, user_id)
-        if streak_tasks_count >= 14:
-            achievement = db.query(Achievement).filter_by(tag='perfecionista').first()
-            if achievement:
-                user_achievement = UserAchievementStatus(
-                    id_user=user_id,
-                    id_achievement=achievement.id,
-                    done=True,
-                    #achieved_at=datetime.now()
-                )
-                db.add(user_achievement)
-                await sio.emit(
-                    'trophy_unlocked',
-                    {
-                        "title": achievement.name,
-                        "description": achievement.description,
-                        "image": achievement.image
-                    },
-                    room=f"user_{user_id}"
-                )
-
-                # Verifica se já tem o troféu
-    existing_achievement4 = db.query(UserAchievementStatus).join(Achievement).filter(
-        UserAchievementStatus.id_user == user_id,
-        Achievement.tag == 'modozen'
-    ).first()
+    Parâmetros:
+    - `task_id`: ID da tarefa
+    - `user_id`: ID do utilizador
 
-    # Se o utilizador completar os requisitos e não tiver o troféu, atribui-o
-    if not existing_achievement4 :
-        # Ver streak de tarefas concluídas
-        streak_tasks_count = get_streak_count(db, user_id)
-        if streak_tasks_count >= 30:
-            achievement = db.query(Achievement).filter_by(tag='modozen').first()
-            if achievement:
-                user_achievement = UserAchievementStatus(
-                    id_user=user_id,
-                    id_achievement=achievement.id,
-                    done=True,
-                    #achieved_at=datetime.now()
-                )
-                db.add(user_achievement)
-                await sio.emit(
-                    'trophy_unlocked',
-                    {
-                        "title": achievement.name,
-                        "description": achievement.description,
-                        "image": achievement.image
-                    },
-                    room=f"user_{user_id}"
-                )
+    Além de atualizar o estado da tarefa, este endpoint também verifica e atribui os seguintes troféus:
+    - `marcodos20`: 20 tarefas concluídas no total
+    - `dedicado`: 7 dias consecutivos com pelo menos uma tarefa concluída
+    - `perfecionista`: 14 dias consecutivos com tarefas concluídas
+    - `modozen`: 30 dias consecutivos com tarefas concluídas
+    """
+    done, notifications = await db.run_sync(toggle_task, task_id, user_id)
 
-    db.commit()
-    return {"message": f"Task toggled to {status.done}"}
+    await db.commit()
+    await emit_notifications(notifications)
+    return {"message": f"Task toggled to {done}"}
 
 # Mostra as tarefas concluidas por um utilizador (excluindo as do dia atual)
 @router.get("/{user_id}/completed")
-def list_completed_tasks(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_completed_tasks(user_id: int, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     """
     Lista todas as tarefas concluídas por um utilizador, excluindo as realizadas no dia.
 
     Parâmetro:
     - `user_id`: ID do utilizador
 
-    Retorna uma lista com as tarefas finalizadas antes de hoje, incluindo a data de conclusão.
+    Retorna uma lista com as tarefas finalizadas antes de hoje (dia local do utilizador), incluindo a data de conclusão.
     """
-    today = date.today()
+    today = local_today(user_timezone(db, user_id))
     start_of_day = datetime.combine(today, time.min)
     
     completed_tasks = (
@@ -291,7 +181,7 @@ def list_completed_tasks(user_id: int, db: Session = Depends(get_db), current_us
 
 # Mostra as tarefas diárias (de hoje) atribuídas a um utilizador
 @router.get("/{user_id}/dailystatus")
-def list_today_tasks_with_status(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_today_tasks_with_status(user_id: int, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     """
     Lista todas as tarefas atribuídas ao utilizador no dia atual, incluindo o seu estado.
 
@@ -302,8 +192,10 @@ def list_today_tasks_with_status(user_id: int, db: Session = Depends(get_db), cu
     - `id`: ID da tarefa
     - `description`: Texto da tarefa
     - `done`: Booleano indicando se foi concluída
+
+    O dia atual é o dia local do utilizador (campo `timezone`).
     """
-    today = date.today()
+    today = local_today(user_timezone(db, user_id))
     start_of_day = datetime.combine(today, time.min)
     end_of_day = datetime.combine(today, time.max)
 
@@ -333,7 +225,7 @@ def list_today_tasks_with_status(user_id: int, db: Session = Depends(get_db), cu
 
 # Mostra as tarefas não concluídas de um utilizador
 @router.get("/{user_id}/not_completed")
-def list_not_completed_tasks(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_not_completed_tasks(user_id: int, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     """
     Lista todas as tarefas atribuídas a um utilizador que ainda não foram concluídas.
 
@@ -1,21 +1,27 @@
 from fastapi import APIRouter, HTTPException, Depends, Request, status
+from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.userModel import User
 from models.achievementStatusModel import UserAchievementStatus
 from models.questionStatusModel import UserQuestionAnswer
 from models.screentimeModel import ScreenTime
 from models.taskStatusModel import UserTaskStatus
 from models.userDigitalHabitModel import UserDigitalHabitStatus
-from utils import hash_password, verify_password
-from auth import create_access_token, get_current_user, create_refresh_token
-from config import get_db
+import password_hasher
+from password_hasher import hash_password, verify_password, verify_and_update
+from auth import create_access_token, get_current_user, create_refresh_token, publish_user_change
+from config import get_async_db
+from read_routing import get_read_db
 from pydantic import BaseModel
 from jose import jwt, JWTError
 from fastapi import status
 from auth import SECRET_KEY, ALGORITHM
-from cronjob import assign_missing_tasks
+from cronjob import assign_tasks_for_user
+from timezones import is_supported_timezone, local_today
 import logging
+from typing import Optional
 from fastapi.security import OAuth2PasswordRequestForm
 
 logger = logging.getLogger(__name__)
@@ -33,6 +39,7 @@ class UserUpdate(BaseModel):
     onboarding: bool = None
     firebase_token: str = None
     is_monitoring: bool = None
+    timezone: Optional[str] = None
 
 class RequestUser(BaseModel):
     username: str
@@ -43,11 +50,12 @@ class RegisterUser(BaseModel):
     email: str
     password: str
     onboarding: bool = False
+    timezone: str = None
 
 @router.post("/register")
-def register(
+async def register(
     user_data: RegisterUser,  # Agora espera um JSON
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Regista um novo utilizador no sistema.
@@ -57,24 +65,23 @@ def register(
     - `email`: Endereço de email (único)
     - `password`: Palavra-passe
     - `onboarding`: (opcional) Flag para estado inicial da onboarding
+    - `timezone`: (opcional) Timezone IANA do utilizador (ex: `Europe/Lisbon`), usada para o dia das tarefas
 
     Verifica se o `email` e `username` já existem antes de criar o utilizador. Atribui tarefas iniciais automaticamente.
     """
     # Verifica se o email já existe
-    existing_email = db.query(User).filter(
-        (User.email == user_data.email)
-    ).first()
+    existing_email = (await db.execute(select(User).where(User.email == user_data.email))).scalars().first()
 
-    existing_username = db.query(User).filter(
-        (User.username == user_data.username)
-    ).first()
+    existing_username = (await db.execute(select(User).where(User.username == user_data.username))).scalars().first()
     
     if existing_email:
         raise HTTPException(status_code=400, detail="Este email já está em registado")
     if existing_username:
         raise HTTPException(status_code=400, detail="Este username já está em registado")
+    if user_data.timezone and not await db.run_sync(is_supported_timezone, user_data.timezone):
+        raise HTTPException(status_code=400, detail="Timezone inválida")
 
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password(user_data.password)
 
     # Cria o novo usuário
     user = User(
@@ -82,18 +89,20 @@ def register(
         email=user_data.email,
         password=hashed_password,
         onboarding=user_data.onboarding,
+        timezone=user_data.timezone,
         )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.flush()
 
-    assign_missing_tasks()
+    # Só as tarefas do novo utilizador, na mesma transação (a atribuição global fica para o scheduler)
+    await db.run_sync(assign_tasks_for_user, user.id, local_today(user.timezone))
+    await db.commit()
 
     return {"message": "User registered successfully", "user_id": user.id}
 
 @router.post("/login")
-def login(requestUser: RequestUser, db: Session = Depends(get_db)):
+async def login(requestUser: RequestUser, db: AsyncSession = Depends(get_async_db)):
     """
     Realiza o login de um utilizador com base no nome de utilizador e palavra-passe.
 
@@ -102,11 +111,22 @@ def login(requestUser: RequestUser, db: Session = Depends(get_db)):
     - `password`
 
     Retorna um token de acesso (`access_token`), um token de renovação (`refresh_token`) e os dados do utilizador.
+    Se o hash guardado usar outro custo de bcrypt, é refeito com o custo configurado.
     """
-    user = db.query(User).filter(User.username == requestUser.username).first()
-    if not user or not verify_password(requestUser.password, user.password):
+    user = (await db.execute(select(User).where(User.username == requestUser.username))).scalars().first()
+    if not user:
+        raise HTTPException(status_code=401, detail="Username ou password incorretos")
+    valid, new_hash = await verify_and_update(requestUser.password, user.password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Username ou password incorretos")
 
+    # O custo do bcrypt (BCRYPT_ROUNDS) mudou: guarda o hash refeito com a palavra-passe em claro
+    if new_hash:
+        user.password = new_hash
+        await db.run_sync(publish_user_change, user.id)
+        await db.commit()
+        await db.refresh(user)
+
     user_id = str(user.id)
     access_token = create_access_token(data={"sub": user_id})
     refresh_token = create_refresh_token(data={"sub": user_id})
@@ -143,7 +163,7 @@ async def refresh_token(request: Request):
 
 
 @router.get("/")
-def list_users(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_users(db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     """
     Lista todos os utilizadores registados.
     """
@@ -153,10 +173,10 @@ class DeleteUserRequest(BaseModel):
     password: str
 
 @router.delete("/{user_id}")
-def delete_user(
+async def delete_user(
     user_id: int,
     delete_request: DeleteUserRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -180,11 +200,11 @@ def delete_user(
 
     try:
         # Verificar usuário e senha primeiro
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        if not verify_password(delete_request.password, user.password):
+        if not await verify_password(delete_request.password, user.password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect password"
@@ -192,14 +212,12 @@ def delete_user(
 
         logger.info(f"Starting deletion process for user {user_id}")
         
-        db.query(UserAchievementStatus).filter(UserAchievementStatus.id_user == user_id).delete()
-        db.query(UserQuestionAnswer).filter(UserQuestionAnswer.id_user == user_id).delete()
-        db.query(ScreenTime).filter(ScreenTime.id_user == user_id).delete()
-        db.query(UserTaskStatus).filter(UserTaskStatus.id_user == user_id).delete()
-        db.query(UserDigitalHabitStatus).filter(UserDigitalHabitStatus.id_user == user_id).delete()
+        for model in (UserAchievementStatus, UserQuestionAnswer, ScreenTime, UserTaskStatus, UserDigitalHabitStatus):
+            await db.execute(delete(model).where(model.id_user == user_id))
         
-        db.delete(user)
-        db.commit() 
+        await db.delete(user)
+        await db.run_sync(publish_user_change, user_id)
+        await db.commit() 
         
         logger.info(f"User {user_id} deleted successfully")
         return {"message": f"User with ID {user_id} has been deleted", "success": True}
@@ -208,7 +226,7 @@ def delete_user(
         raise
         
     except SQLAlchemyError as sae:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error during user deletion: {str(sae)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -216,13 +234,21 @@ def delete_user(
         )
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Unexpected error during user deletion: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred"
         )
 
+@router.get("/password-hash/metrics")
+def get_password_hash_metrics(current_user: User = Depends(get_current_user)):
+    """
+    Estado do pool de hashing de palavras-passe: pedidos submetidos, concluídos, rejeitados (503),
+    à espera de vaga e em curso, tempo total e máximo de espera e hashes refeitos no login.
+    """
+    return password_hasher.get_metrics()
+
 @router.get("/protected")
 def protected_route(current_user: User = Depends(get_current_user)):
     """
@@ -233,7 +259,7 @@ def protected_route(current_user: User = Depends(get_current_user)):
     return {"message": f"Hello, {current_user.id}!"}
 
 @router.put("/{user_id}")
-def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def update_user(user_id: int, user_update: UserUpdate, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     """
     Atualiza os dados do perfil de um utilizador.
 
@@ -242,8 +268,10 @@ def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get
 
     Corpo da requisição pode conter:
     - `username`, `email`, `password`, `onboarding`, `firebase_token`, `is_monitoring`
+    - `timezone`: Timezone IANA (ex: `America/Sao_Paulo`); as tarefas passam a seguir o dia local.
+      `null` ou `""` remove a timezone (volta a valer a timezone por omissão)
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -253,25 +281,31 @@ def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get
     if user_update.email:
         user.email = user_update.email
     if user_update.password:
-        user.password = hash_password(user_update.password)
+        user.password = await hash_password(user_update.password)
     if user_update.onboarding is not None:
         user.onboarding = user_update.onboarding
     if user_update.firebase_token:
         user.firebase_token = user_update.firebase_token
     if user_update.is_monitoring is not None:
         user.is_monitoring = user_update.is_monitoring
+    # `null` ou "" limpa a timezone (o utilizador volta a seguir a DEFAULT_TIMEZONE)
+    if "timezone" in user_update.model_fields_set:
+        if user_update.timezone and not await db.run_sync(is_supported_timezone, user_update.timezone):
+            raise HTTPException(status_code=400, detail="Invalid timezone")
+        user.timezone = user_update.timezone or None
 
-    db.commit()
-    db.refresh(user)
+    await db.run_sync(publish_user_change, user_id)
+    await db.commit()
+    await db.refresh(user)
 
     return {"message": f"User with ID {user_id} has been updated", "user": user}
 
 
 @router.put("/{user_id}/updatecredentials")
-def update_user_credentials(
+async def update_user_credentials(
     user_id: int,
     credentials_update: UserCredentialsUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -287,12 +321,12 @@ def update_user_credentials(
 
     Valida se os novos valores já estão em uso antes de atualizar.
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Verificar senha
-    if not verify_password(credentials_update.current_password, user.password):
+    if not await verify_password(credentials_update.current_password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect password"
@@ -303,7 +337,7 @@ def update_user_credentials(
     # Atualizar username se fornecido
     if credentials_update.new_username:
         # Verificar se username já existe
-        existing_user = db.query(User).filter(User.username == credentials_update.new_username).first()
+        existing_user = (await db.execute(select(User).where(User.username == credentials_update.new_username))).scalars().first()
         if existing_user and existing_user.id != user_id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -315,7 +349,7 @@ def update_user_credentials(
     # Atualizar email se fornecido
     if credentials_update.new_email:
         # Verificar se email já existe
-        existing_email = db.query(User).filter(User.email == credentials_update.new_email).first()
+        existing_email = (await db.execute(select(User).where(User.email == credentials_update.new_email))).scalars().first()
         if existing_email and existing_email.id != user_id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -324,8 +358,9 @@ def update_user_credentials(
         user.email = credentials_update.new_email
         updated_fields["email"] = credentials_update.new_email
     
-    db.commit()
-    db.refresh(user)
+    await db.run_sync(publish_user_change, user_id)
+    await db.commit()
+    await db.refresh(user)
     
     return {
         "success": True,
@@ -0,0 +1,245 @@
+import os
+from datetime import date, datetime, time
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy import event, func, case, cast, literal, select, text, and_, Integer, BigInteger, Numeric
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from models.screentimeModel import ScreenTime
+from models.screentimeDailyModel import ScreenTimeDaily
+from models.lumicheckUsageModel import LumicheckUsage
+from models.appNameModel import AppName
+from models.appUsageDailyModel import AppUsageDaily
+from app_classifier import is_lumicheck_app
+from timezones import get_zone, local_today
+
+# Retenção dos dados em bruto do tempo de ecrã (intervalo do PostgreSQL, ex: '400 days'); vazio = sem retenção
+SCREENTIME_RETENTION = os.getenv("SCREENTIME_RETENTION", "")
+
+# Número máximo de dias guardados no bitmap de uso da LumiCheck (BIGINT sem o bit de sinal)
+LUMICHECK_BITMAP_DAYS = 63
+LUMICHECK_BITMAP_MASK = (1 << LUMICHECK_BITMAP_DAYS) - 1
+
+# Dicionário em memória nome da app -> id em app_name (os IDs nunca mudam depois de criados)
+APP_ID_CACHE_SIZE = 100000
+_app_ids: Dict[str, int] = {}
+
+
+def total_minutes_of(usage_data: Dict):
+    total_minutes = usage_data.get("total_minutes")
+    if total_minutes is None:
+        return None
+    return int(round(total_minutes))
+
+# Atualiza o total diário agregado do utilizador.
+# O cliente envia o uso acumulado do dia, por isso guardamos o maior valor recebido.
+def record_daily_total(db: Session, user_id: int, day: date, usage_data: Dict):
+    total_minutes = total_minutes_of(usage_data)
+    if total_minutes is None:
+        return
+
+    record_daily_totals(db, day, {user_id: total_minutes})
+
+# Versão para vários utilizadores num único INSERT (um total por utilizador)
+def record_daily_totals(db: Session, day: date, totals: Dict[int, int]):
+    if not totals:
+        return
+
+    stmt = insert(ScreenTimeDaily).values([
+        {"id_user": user_id, "day": day, "total_minutes": total_minutes}
+        for user_id, total_minutes in totals.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ScreenTimeDaily.id_user, ScreenTimeDaily.day],
+        set_={"total_minutes": func.greatest(ScreenTimeDaily.total_minutes, stmt.excluded.total_minutes)}
+    )
+    db.execute(stmt)
+
+# Expressão SQL que extrai o total_minutes do JSONB como inteiro
+def total_minutes_column():
+    return func.round(ScreenTime.usage_data["total_minutes"].astext.cast(Numeric)).cast(Integer)
+
+# Recalcula o total de um dia a partir das entradas em bruto (ex: depois de apagar uma entrada)
+def refresh_daily_total(db: Session, user_id: int, day: date):
+    total_minutes = db.query(func.max(total_minutes_column())).filter(
+        ScreenTime.id_user == user_id,
+        func.date(ScreenTime.timestamp) == day,
+        ScreenTime.usage_data.has_key("total_minutes")
+    ).scalar()
+
+    if total_minutes is None:
+        db.query(ScreenTimeDaily).filter_by(id_user=user_id, day=day).delete()
+        return
+
+    stmt = insert(ScreenTimeDaily).values(id_user=user_id, day=day, total_minutes=total_minutes)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ScreenTimeDaily.id_user, ScreenTimeDaily.day],
+        set_={"total_minutes": stmt.excluded.total_minutes}
+    )
+    db.execute(stmt)
+
+def used_lumicheck(usage_data: Dict) -> bool:
+    app_breakdown = usage_data.get("app_breakdown", {})
+    return any(is_lumicheck_app(app) for app in app_breakdown.keys())
+
+# Marca o dia como "usou LumiCheck" no bitmap de cada utilizador, num único INSERT.
+# Se o dia for posterior ao último registado, o bitmap é deslocado; senão só se acende o bit do dia.
+def record_lumicheck_usage(db: Session, day: date, user_ids: Iterable[int]):
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    stmt = insert(LumicheckUsage).values([
+        {"id_user": user_id, "last_day": day, "days_bitmap": 1}
+        for user_id in user_ids
+    ])
+    days_ahead = stmt.excluded.last_day - LumicheckUsage.last_day
+    days_behind = LumicheckUsage.last_day - stmt.excluded.last_day
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LumicheckUsage.id_user],
+        set_={
+            "days_bitmap": case(
+                (days_ahead >= LUMICHECK_BITMAP_DAYS, 1),
+                (days_ahead > 0, LumicheckUsage.days_bitmap.op("<<")(days_ahead).op("|")(1).op("&")(LUMICHECK_BITMAP_MASK)),
+                (days_behind < LUMICHECK_BITMAP_DAYS, LumicheckUsage.days_bitmap.op("|")(cast(literal(1), BigInteger).op("<<")(days_behind))),
+                else_=LumicheckUsage.days_bitmap
+            ),
+            "last_day": func.greatest(LumicheckUsage.last_day, stmt.excluded.last_day)
+        }
+    )
+    db.execute(stmt)
+
+# Devolve os utilizadores que usaram a LumiCheck em cada um dos últimos `days` dias (incluindo hoje).
+# É uma leitura por chave primária e uma operação de bits, independentemente do histórico.
+def lumicheck_streak_users(db: Session, user_ids: Iterable[int], days: int = 7) -> Set[int]:
+    if not 1 <= days <= LUMICHECK_BITMAP_DAYS:
+        raise ValueError(f"days must be between 1 and {LUMICHECK_BITMAP_DAYS}")
+
+    window_mask = (1 << days) - 1
+    return {
+        user_id for (user_id,) in db.query(LumicheckUsage.id_user).filter(
+            LumicheckUsage.id_user.in_(list(user_ids)),
+            LumicheckUsage.last_day == func.current_date(),
+            LumicheckUsage.days_bitmap.op("&")(window_mask) == window_mask
+        ).all()
+    }
+
+# IDs criados na transação atual da sessão, à espera do commit
+def _pending_app_ids(db: Session) -> Dict[str, int]:
+    if "new_app_ids" not in db.info:
+        db.info["new_app_ids"] = {}
+        event.listen(db, "after_commit", _cache_app_ids)
+        event.listen(db, "after_rollback", lambda session: session.info["new_app_ids"].clear())
+    return db.info["new_app_ids"]
+
+def _cache_app_ids(db: Session):
+    app_ids = db.info["new_app_ids"]
+    if len(_app_ids) + len(app_ids) > APP_ID_CACHE_SIZE:
+        _app_ids.clear()
+    _app_ids.update(app_ids)
+    app_ids.clear()
+
+# Devolve o id de cada nome de app, criando os que ainda não existem em app_name.
+# Os nomes novos são criados na transação do pedido (sem ocupar outra ligação do pool) e só
+# entram no dicionário em memória depois do commit: IDs de uma transação revertida nunca ficam lá.
+def intern_app_names(db: Session, names: Iterable[str]) -> Dict[str, int]:
+    names = set(names)
+    app_ids = {name: _app_ids[name] for name in names if name in _app_ids}
+    # Ordenados: dois pedidos com nomes novos em comum bloqueiam o índice único pela mesma ordem (sem deadlock)
+    missing = sorted(name for name in names if name not in app_ids)
+
+    if missing:
+        db.execute(insert(AppName).values([{"name": name} for name in missing]).on_conflict_do_nothing(index_elements=[AppName.name]))
+        created = dict(db.execute(select(AppName.name, AppName.id).where(AppName.name.in_(missing))).all())
+        _pending_app_ids(db).update(created)
+        app_ids.update(created)
+
+    return app_ids
+
+# Decompõe o app_breakdown em linhas (id_user, day, id_app, minutes), num único INSERT.
+# Tal como o total diário, os minutos são acumulados no dia, por isso guarda-se o maior valor.
+def record_app_usage(db: Session, day: date, usage_by_user: Dict[int, List[Dict]]):
+    minutes_by_key = {}
+    for user_id, usages in usage_by_user.items():
+        for usage_data in usages:
+            app_breakdown = usage_data.get("app_breakdown", {})
+            if not isinstance(app_breakdown, dict):
+                continue
+            for app_name, minutes in app_breakdown.items():
+                if not isinstance(minutes, (int, float)):
+                    continue
+                key = (user_id, app_name)
+                minutes_by_key[key] = max(minutes_by_key.get(key, 0), int(round(minutes)))
+
+    if not minutes_by_key:
+        return
+
+    app_ids = intern_app_names(db, (app_name for _, app_name in minutes_by_key))
+
+    stmt = insert(AppUsageDaily).values([
+        {"id_user": user_id, "day": day, "id_app": app_ids[app_name], "minutes": minutes}
+        for (user_id, app_name), minutes in minutes_by_key.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AppUsageDaily.id_user, AppUsageDaily.day, AppUsageDaily.id_app],
+        set_={"minutes": func.greatest(AppUsageDaily.minutes, stmt.excluded.minutes)}
+    )
+    db.execute(stmt)
+
+# Último dia cujos registos em bruto a retenção pode já ter apagado (None sem retenção). Os agregados
+# desses dias têm de sobreviver à retenção, por isso não podem ser recalculados só com o que resta.
+def retention_cutoff(db: Session) -> Optional[date]:
+    if not SCREENTIME_RETENTION:
+        return None
+    return db.execute(text("SELECT (now() - CAST(:retention AS interval))::date"), {"retention": SCREENTIME_RETENTION}).scalar()
+
+# Recalcula o uso por app de um dia a partir das entradas em bruto (ex: depois de apagar uma entrada)
+def refresh_app_usage(db: Session, user_id: int, day: date):
+    db.query(AppUsageDaily).filter_by(id_user=user_id, day=day).delete()
+    db.execute(text("""
+        INSERT INTO app_usage_daily (id_user, day, id_app, minutes)
+        SELECT s.id_user, date(s.timestamp), a.id, max(round((app.value #>> '{}')::numeric))::int
+        FROM screentime s
+        CROSS JOIN LATERAL jsonb_each(
+            CASE WHEN jsonb_typeof(s.usage_data -> 'app_breakdown') = 'object'
+                 THEN s.usage_data -> 'app_breakdown' ELSE '{}'::jsonb END
+        ) AS app
+        JOIN app_name a ON a.name = app.key
+        WHERE s.id_user = :user_id AND date(s.timestamp) = :day
+          AND jsonb_typeof(app.value) = 'number'
+        GROUP BY s.id_user, date(s.timestamp), a.id
+    """), {"user_id": user_id, "day": day})
+
+# Meia-noite do dia local do utilizador (na sua timezone), usada como timestamp dos snapshots diários:
+# identifica o (utilizador, dia local) na chave única
+def day_start(timezone: Optional[str]) -> datetime:
+    return datetime.combine(local_today(timezone), time.min, tzinfo=get_zone(timezone))
+
+# Guarda um único snapshot por (utilizador, dia local) com INSERT ... ON CONFLICT, num único statement.
+# `timezones` tem a timezone de cada utilizador (None = DEFAULT_TIMEZONE).
+# Mantém o snapshot com o maior total (o uso é acumulado no dia) e só escreve quando os dados mudam.
+# Devolve {user_id: id da linha} dos utilizadores cujo snapshot foi criado ou alterado.
+def upsert_daily_snapshots(db: Session, snapshots: Dict[int, Dict], timezones: Dict[int, Optional[str]]) -> Dict[int, int]:
+    if not snapshots:
+        return {}
+
+    stmt = insert(ScreenTime).values([
+        {"id_user": user_id, "usage_data": usage_data, "timestamp": day_start(timezones.get(user_id)), "daily_snapshot": True}
+        for user_id, usage_data in snapshots.items()
+    ])
+    new_total = func.coalesce(stmt.excluded.usage_data["total_minutes"].astext.cast(Numeric), 0)
+    current_total = func.coalesce(ScreenTime.usage_data["total_minutes"].astext.cast(Numeric), 0)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ScreenTime.id_user, ScreenTime.timestamp],
+        index_where=ScreenTime.daily_snapshot,
+        set_={"usage_data": stmt.excluded.usage_data},
+        where=and_(
+            new_total >= current_total,
+            ScreenTime.usage_data.is_distinct_from(stmt.excluded.usage_data)
+        )
+    ).returning(ScreenTime.id_user, ScreenTime.id)
+
+    return dict(db.execute(stmt).all())
+
+# Entre vários envios do mesmo dia fica o de maior total (o último em caso de empate)
+def snapshot_of_day(usages: List[Dict]) -> Dict:
+    return max(reversed(usages), key=lambda usage: total_minutes_of(usage) or 0)
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from fastapi import Request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Contagem das consultas SQL de cada pedido (número, tempo total na base de dados e consultas repetidas),
+# a partir dos eventos before/after_cursor_execute dos engines. Os totais vão no cabeçalho Server-Timing
+# e num log JSON por pedido; uma consulta repetida SQL_REPEAT_THRESHOLD vezes ou mais é assinalada como
+# provável N+1 (ex: uma consulta por elemento de uma lista).
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "true").lower() in ("1", "true", "yes")
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", 5))
+# Nível do log por pedido: INFO regista todos os pedidos, WARNING só os prováveis N+1
+SQL_LOG_LEVEL = os.getenv("SQL_LOG_LEVEL", "INFO").upper()
+
+# Handler próprio: a aplicação não configura o logging, e sem ele o INFO não aparecia
+logger.setLevel(SQL_LOG_LEVEL)
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(levelname)s %(name)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+# Parâmetros (psycopg2 e asyncpg), números e strings literais, e listas de IN com vários valores
+_PARAMETER = re.compile(r"%\(\w+\)s|%s|\$\d+|\b\d+(\.\d+)?\b|'(?:[^']|'')*'")
+_IN_LIST = re.compile(r"\(\s*\?(\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+class RequestQueries:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+        self.statements = {}
+
+    def record(self, statement: str, seconds: float):
+        key, normalized = fingerprint(statement)
+        self.count += 1
+        self.seconds += seconds
+        self.fingerprints[key] += 1
+        self.statements.setdefault(key, normalized)
+
+    # Consultas repetidas acima do limite, como (fingerprint, vezes, SQL normalizado)
+    def repeated(self):
+        return [
+            (key, count, self.statements[key])
+            for key, count in self.fingerprints.most_common()
+            if count >= SQL_REPEAT_THRESHOLD
+        ]
+
+
+# Consultas do pedido atual; None fora de um pedido (ex: scheduler, worker de ingestão)
+_current: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+# Consultas com a mesma forma têm a mesma fingerprint, independentemente dos valores
+def fingerprint(statement: str):
+    normalized = _SPACES.sub(" ", _IN_LIST.sub("(?)", _PARAMETER.sub("?", statement))).strip()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12], normalized
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._query_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = _current.get()
+    start = getattr(context, "_query_start", None)
+    if queries is not None and start is not None:
+        queries.record(statement, time.perf_counter() - start)
+
+# Regista os eventos no `engine` (para um AsyncEngine, passar o `sync_engine`)
+def instrument(engine):
+    if not SQL_INSTRUMENTATION:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def _log(request: Request, status: int, queries: RequestQueries):
+    repeated = queries.repeated()
+    record = {
+        "method": request.method,
+        "path": request.url.path,
+        "status": status,
+        "queries": queries.count,
+        "db_ms": round(queries.seconds * 1000, 2),
+        "repeated": [{"fingerprint": key, "count": count, "statement": statement} for key, count, statement in repeated],
+    }
+    if repeated:
+        logger.warning(f"Possible N+1 queries: {json.dumps(record)}")
+    else:
+        logger.info(json.dumps(record))
+
+# Middleware: junta as consultas feitas durante o pedido e publica-as no Server-Timing e no log.
+# O corpo da resposta é gerado depois dos cabeçalhos (ex: NDJSON com StreamingResponse): o Server-Timing
+# só conta as consultas feitas até aos cabeçalhos, o log é escrito no fim do corpo e conta todas.
+async def track_queries(request: Request, call_next):
+    if not SQL_INSTRUMENTATION:
+        return await call_next(request)
+
+    queries = RequestQueries()
+    token = _current.set(queries)
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+
+    timings = [f'db;dur={queries.seconds * 1000:.2f};desc="{queries.count} queries"']
+    timings.extend(f'db-repeat;desc="{count}x {key}"' for key, count, _ in queries.repeated())
+    response.headers.append("Server-Timing", ", ".join(timings))
+
+    # O endpoint continua a registar em `queries` enquanto gera o corpo
+    body_iterator = response.body_iterator
+
+    async def body_then_log():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            _log(request, response.status_code, queries)
+
+    response.body_iterator = body_then_log()
+    return response
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from config import engine, SessionLocal, Base
+from achievements import load_catalog
+import models  # regista todas as tabelas em Base.metadata
+
+logger = logging.getLogger(__name__)
+
+# Modo de arranque. Em "production" o esquema vem do migrate.py (fase de release: Alembic) em vez
+# do create_all, e o aquecimento (ligação à base de dados e catálogo em memória) corre em segundo plano:
+# o processo aceita pedidos logo, e /health/ready só responde 200 quando o aquecimento terminar.
+STARTUP_MODE = os.getenv("STARTUP_MODE", "development")
+IS_PRODUCTION = STARTUP_MODE == "production"
+# Segundos entre tentativas de aquecimento quando a base de dados ainda não está disponível
+WARMUP_RETRY_DELAY = 5
+
+_ready = threading.Event()
+# Duração (s) de cada fase do arranque deste processo
+timings = {}
+
+def _timed(phase: str, function):
+    start = time.perf_counter()
+    result = function()
+    timings[phase] = round(time.perf_counter() - start, 4)
+    return result
+
+def check_database():
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+def create_schema():
+    Base.metadata.create_all(bind=engine)
+
+def load_caches():
+    with SessionLocal() as db:
+        load_catalog(db)
+
+# `create_schema_first`: cria as tabelas em falta (só em development; em production o esquema vem do Alembic)
+def warmup(create_schema_first: bool = False):
+    _timed("db_connect", check_database)
+    if create_schema_first:
+        _timed("create_all", create_schema)
+    _timed("warmup", load_caches)
+    _ready.set()
+
+# Aquecimento em segundo plano (modo production): tenta até a base de dados responder
+async def warmup_in_background():
+    while not _ready.is_set():
+        try:
+            await run_in_threadpool(warmup)
+            print(f"✅ Warmup finished: {timings}")
+        except Exception:
+            logger.exception(f"Warmup failed, retrying in {WARMUP_RETRY_DELAY}s")
+            await asyncio.sleep(WARMUP_RETRY_DELAY)
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+# Ao terminar, deixa de estar pronto para que o balanceador pare de enviar pedidos
+def mark_stopping():
+    _ready.clear()
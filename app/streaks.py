@@ -0,0 +1,105 @@
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from config import engine
+from models.taskStatusModel import UserTaskStatus
+from models.userStreakModel import UserStreak
+from timezones import local_today, user_timezone
+
+# Contadores de streak de tarefas por utilizador (dias consecutivos com pelo menos uma tarefa concluída).
+# São atualizados em O(1) a cada toggle, em vez de se lerem todas as datas de conclusão do histórico.
+
+def _locked_streak(db: Session, user_id: int) -> UserStreak:
+    # Cria a linha se não existir e bloqueia-a, para que toggles simultâneos não se sobreponham
+    db.execute(insert(UserStreak).values(id_user=user_id, current_streak=0, longest_streak=0).on_conflict_do_nothing())
+    return db.query(UserStreak).filter(UserStreak.id_user == user_id).with_for_update().populate_existing().one()
+
+# Atualiza os contadores quando uma tarefa de `day` (dia local do utilizador) é marcada como concluída
+# ou por concluir (sem commit). Deve ser chamada depois de o novo estado da tarefa estar na sessão (flush).
+def record_task_toggle(db: Session, user_id: int, done: bool, day: date) -> UserStreak:
+    streak = _locked_streak(db, user_id)
+
+    if done:
+        if streak.last_completed_date == day:
+            return streak
+        if streak.last_completed_date == day - timedelta(days=1):
+            streak.current_streak += 1
+        else:
+            streak.current_streak = 1
+        streak.last_completed_date = day
+        streak.longest_streak = max(streak.longest_streak, streak.current_streak)
+        return streak
+
+    # Só perde o dia se não restar nenhuma outra tarefa concluída nesse dia
+    if streak.last_completed_date != day or other_done_today(db, user_id, day):
+        return streak
+    streak.current_streak -= 1
+    # Se o streak era só este dia, não há nenhum dia concluído imediatamente antes; o longest_streak não é revertido
+    streak.last_completed_date = day - timedelta(days=1) if streak.current_streak > 0 else None
+    return streak
+
+def other_done_today(db: Session, user_id: int, day: date) -> bool:
+    return db.query(UserTaskStatus.id).filter(
+        UserTaskStatus.id_user == user_id,
+        UserTaskStatus.done == True,
+        UserTaskStatus.completed_at >= day,
+        UserTaskStatus.completed_at < day + timedelta(days=1)
+    ).first() is not None
+
+# Streak atual, tal como o antigo get_streak_count: 0 se o utilizador não concluiu nenhuma tarefa hoje
+def active_streak(streak: Optional[UserStreak], today: date) -> int:
+    if not streak or streak.last_completed_date != today:
+        return 0
+    return streak.current_streak
+
+def current_streak(db: Session, user_id: int) -> int:
+    streak = db.query(UserStreak).filter(UserStreak.id_user == user_id).first()
+    return active_streak(streak, local_today(user_timezone(db, user_id)))
+
+# Reconstrói todos os contadores a partir de task_status (gaps and islands: dias consecutivos têm o mesmo
+# day - row_number). Corrige desvios, ex: o longest_streak depois de desfazer uma tarefa.
+def rebuild_streaks(db: Session) -> int:
+    result = db.execute(text("""
+        WITH days AS (
+            SELECT DISTINCT id_user, date(completed_at) AS day
+            FROM task_status
+            WHERE done AND completed_at IS NOT NULL
+        ),
+        runs AS (
+            SELECT id_user, count(*) AS length, max(day) AS last_day
+            FROM (
+                SELECT id_user, day, day - CAST(row_number() OVER (PARTITION BY id_user ORDER BY day) AS int) AS island
+                FROM days
+            ) islands
+            GROUP BY id_user, island
+        ),
+        totals AS (
+            SELECT id_user, max(length) AS longest, max(last_day) AS last_day FROM runs GROUP BY id_user
+        )
+        INSERT INTO user_streak (id_user, current_streak, longest_streak, last_completed_date)
+        SELECT t.id_user, r.length, t.longest, t.last_day
+        FROM totals t JOIN runs r ON r.id_user = t.id_user AND r.last_day = t.last_day
+        ON CONFLICT (id_user) DO UPDATE
+        SET current_streak = excluded.current_streak,
+            longest_streak = excluded.longest_streak,
+            last_completed_date = excluded.last_completed_date
+    """))
+    db.execute(text("""
+        DELETE FROM user_streak s
+        WHERE NOT EXISTS (SELECT 1 FROM task_status t WHERE t.id_user = s.id_user AND t.done AND t.completed_at IS NOT NULL)
+    """))
+    return result.rowcount
+
+# Job de reparação: reconstrói os contadores numa só transação
+def repair_streaks() -> int:
+    print(f"🕒 Reparar streaks: {datetime.now()}")
+    with Session(engine) as session:
+        rebuilt = rebuild_streaks(session)
+        session.commit()
+    print(f"✅ Streaks reconstruídos ({rebuilt} utilizadores).")
+    return rebuilt
+
+if __name__ == "__main__":
+    repair_streaks()
@@ -0,0 +1,229 @@
+# Testes das regras de troféus: cada regra desbloqueia nas mesmas condições que os antigos blocos
+# escritos à mão nas rotas. Não precisam de base de dados (as consultas das regras são substituídas).
+#
+# Executar a partir da pasta app/:
+#   python -m pytest tests
+from collections import defaultdict
+from datetime import date, timedelta
+import pytest
+from sqlalchemy.dialects import postgresql
+import achievements
+from achievements import (
+    AchievementInfo, Catalog, RuleContext, achievement_rule, evaluate_achievements, rules_for,
+    SCREENTIME_RECORDED, TASK_TOGGLED, QUESTIONS_ANSWERED
+)
+from models.userStreakModel import UserStreak
+from routes import screentimeRoutes, questionRoutes
+from routes.taskRoutes import TaskToggle
+
+TODAY = date(2025, 7, 15)
+
+# Versão antiga de check_detox_status. A lista tinha uma vírgula em falta ("candy" "amazon" davam
+# "candyamazon"); o classificador atual corrige-a, por isso a referência usa as duas palavras.
+OLD_RESTRICTED_KEYWORDS = [
+    "instagram", "facebook", "messenger", "twitter", "x", "snapchat", "tiktok",
+    "clash", "minecraft", "fortnite", "brawl", "candy",
+    "amazon", "ebay", "aliexpress", "nike", "adidas", "shein", "temu",
+    "bet", "casino", "poker"
+]
+
+def old_check_detox_status(usage_data):
+    for app_name, minutes in usage_data.get("app_breakdown", {}).items():
+        lower_app = app_name.lower()
+        if any(keyword in lower_app for keyword in OLD_RESTRICTED_KEYWORDS):
+            if minutes > 10:
+                return False
+    return True
+
+# Versão antiga de get_streak_count, sobre as datas com tarefas concluídas
+def old_streak_count(dates, today):
+    dates = sorted(set(dates), reverse=True)
+    if not dates or dates[0] != today:
+        return 0
+    streak = 1
+    for i in range(1, len(dates)):
+        if dates[i] == dates[i - 1] - timedelta(days=1):
+            streak += 1
+        else:
+            break
+    return streak
+
+def rule(event, tag):
+    return next(rule for rule in rules_for(event) if rule.tag == tag)
+
+def unlocks(event, tag, payload, db=None, user_id=1):
+    return rule(event, tag).predicate(RuleContext(db, {user_id: payload}), user_id, payload)
+
+
+def test_rules_registered_per_event():
+    assert [rule.tag for rule in rules_for(SCREENTIME_RECORDED)] == ['diadedetox', 'autoconsciente', 'horaderecolher']
+    assert [rule.tag for rule in rules_for(TASK_TOGGLED)] == ['marcodos20', 'dedicado', 'perfecionista', 'modozen']
+    assert [rule.tag for rule in rules_for(QUESTIONS_ANSWERED)] == ['primeiropasso']
+
+
+@pytest.mark.parametrize("app_breakdown", [
+    {},
+    {"com.instagram.android": 5},
+    {"com.instagram.android": 10},
+    {"com.instagram.android": 11},
+    {"Instagram": 30, "com.lumicheck": 60},
+    {"com.supercell.clashroyale": 45},
+    {"com.king.candycrushsaga": 12},
+    {"com.amazon.mShop": 20},
+    {"com.google.android.gm": 120, "com.spotify.music": 90},
+    {"com.netflix.mediaclient": 20},
+    {"pt.betclic": 11, "com.google.android.youtube": 200},
+    {"com.zhiliaoapp.musically": 3, "com.whatsapp": 50},
+])
+def test_diadedetox_matches_old_check(app_breakdown):
+    usage = {"total_minutes": sum(app_breakdown.values()), "app_breakdown": app_breakdown}
+    assert unlocks(SCREENTIME_RECORDED, 'diadedetox', [usage]) == old_check_detox_status(usage)
+
+
+@pytest.mark.parametrize("usage, expected", [
+    ({"total_minutes": 0}, True),
+    ({"total_minutes": 239}, True),
+    ({"total_minutes": 239.9}, True),
+    ({"total_minutes": 240}, False),
+    ({"total_minutes": 600}, False),
+    # Sem total, a versão antiga contava 0 minutos
+    ({"app_breakdown": {"com.whatsapp": 300}}, True),
+])
+def test_horaderecolher_under_4_hours(usage, expected):
+    assert unlocks(SCREENTIME_RECORDED, 'horaderecolher', [usage]) is expected
+
+
+def test_screentime_rules_unlock_if_any_bulk_entry_qualifies():
+    entries = [
+        {"total_minutes": 300, "app_breakdown": {"com.instagram.android": 60}},
+        {"total_minutes": 100, "app_breakdown": {"com.whatsapp": 100}},
+    ]
+    assert unlocks(SCREENTIME_RECORDED, 'diadedetox', entries)
+    assert unlocks(SCREENTIME_RECORDED, 'horaderecolher', entries)
+    assert not unlocks(SCREENTIME_RECORDED, 'diadedetox', entries[:1])
+    assert not unlocks(SCREENTIME_RECORDED, 'horaderecolher', entries[:1])
+
+
+def test_autoconsciente_only_checks_users_who_used_lumicheck(monkeypatch):
+    calls = []
+    def lumicheck_streak_users(db, user_ids, days):
+        calls.append((list(user_ids), days))
+        return {1}
+    monkeypatch.setattr(screentimeRoutes, "lumicheck_streak_users", lumicheck_streak_users)
+
+    payloads = {
+        1: [{"app_breakdown": {"com.LumiCheck.app": 5}}],
+        2: [{"app_breakdown": {"com.whatsapp": 5}}, {"app_breakdown": {"lumicheck": 1}}],
+        3: [{"app_breakdown": {"com.whatsapp": 5}}],
+    }
+    ctx = RuleContext(None, payloads)
+    predicate = rule(SCREENTIME_RECORDED, 'autoconsciente').predicate
+    assert [predicate(ctx, user_id, payload) for user_id, payload in payloads.items()] == [True, False, False]
+    # Uma só leitura para o lote: 7 dias seguidos (hoje e os 6 anteriores), só de quem usou a LumiCheck hoje
+    assert calls == [([1, 2], 7)]
+
+
+class CountQuery:
+    def __init__(self, count):
+        self._count = count
+
+    def query(self, *entities):
+        return self
+
+    def filter(self, *criteria):
+        return self
+
+    def count(self):
+        return self._count
+
+@pytest.mark.parametrize("completed, expected", [(0, False), (19, False), (20, True), (57, True)])
+def test_marcodos20_after_20_completed_tasks(completed, expected):
+    toggle = TaskToggle(UserStreak(current_streak=0, longest_streak=0, last_completed_date=None), TODAY)
+    assert unlocks(TASK_TOGGLED, 'marcodos20', toggle, db=CountQuery(completed)) is expected
+
+
+@pytest.mark.parametrize("tag, days", [('dedicado', 7), ('perfecionista', 14), ('modozen', 30)])
+@pytest.mark.parametrize("length", [0, 1, 6, 7, 13, 14, 29, 30, 45])
+@pytest.mark.parametrize("ends_today", [True, False])
+def test_streak_rules_match_old_streak_count(tag, days, length, ends_today):
+    last_day = TODAY if ends_today else TODAY - timedelta(days=1)
+    dates = [last_day - timedelta(days=offset) for offset in range(length)]
+    # Um dia concluído antes de uma falha não conta para o streak
+    dates.append(last_day - timedelta(days=length + 1))
+    streak = UserStreak(current_streak=length, longest_streak=length, last_completed_date=last_day if length else None)
+
+    expected = old_streak_count(dates, TODAY) >= days
+    assert unlocks(TASK_TOGGLED, tag, TaskToggle(streak, TODAY)) is expected
+
+
+def test_primeiropasso_on_any_answer():
+    answers = [questionRoutes.QuestionAnswer(user_id=1, question_id=1, answer=3)]
+    assert unlocks(QUESTIONS_ANSWERED, 'primeiropasso', answers) is True
+
+
+class FakeSession:
+    # Sessão mínima para evaluate_achievements: os troféus já desbloqueados e o INSERT ... RETURNING
+    def __init__(self, unlocked, conflicts=()):
+        self.unlocked = unlocked
+        self.conflicts = set(conflicts)
+        self.inserted = []
+
+    def query(self, *entities):
+        return self
+
+    def filter(self, *criteria):
+        return self
+
+    def all(self):
+        return list(self.unlocked)
+
+    def execute(self, stmt):
+        params = stmt.compile(dialect=postgresql.dialect()).params
+        rows = [(params[f"id_user_m{i}"], params[f"id_achievement_m{i}"]) for i in range(len(params) // 3)]
+        self.inserted.extend(rows)
+        return FakeResult([row for row in rows if row not in self.conflicts])
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+@pytest.fixture
+def test_rules(monkeypatch):
+    # Registo e catálogo próprios, para não depender das regras reais
+    monkeypatch.setattr(achievements, "_rules_by_event", defaultdict(list))
+    catalog = [AchievementInfo(10, "A", "", "a", None), AchievementInfo(11, "B", "", "b", None)]
+    monkeypatch.setattr(achievements, "get_catalog", lambda db: Catalog(
+        catalog, {info.id: info for info in catalog}, {info.tag: info for info in catalog}
+    ))
+    calls = []
+    def predicate(ctx, user_id, payload):
+        calls.append((ctx.cached("shared", object), user_id))
+        return payload
+    achievement_rule("a", "evento")(predicate)
+    achievement_rule("b", "evento")(predicate)
+    achievement_rule("sem_catalogo", "evento")(predicate)
+    return calls
+
+def test_evaluate_skips_unlocked_and_unknown_trophies(test_rules):
+    db = FakeSession(unlocked=[(1, 10)])
+    unlocked = evaluate_achievements(db, "evento", {1: True, 2: True, 3: False})
+
+    # O antigo `if not existing_achievement and ...`: o troféu já desbloqueado não volta a ser avaliado,
+    # e o antigo `if achievement:`: uma tag sem troféu no catálogo é ignorada
+    assert [user_id for _, user_id in test_rules] == [1, 2, 2, 3, 3]
+    assert len({shared for shared, _ in test_rules}) == 1
+    assert db.inserted == [(1, 11), (2, 10), (2, 11)]
+    assert [(user_id, info.tag) for user_id, info in unlocked] == [(1, 'b'), (2, 'a'), (2, 'b')]
+
+def test_evaluate_drops_trophies_inserted_concurrently(test_rules):
+    db = FakeSession(unlocked=[], conflicts=[(2, 10)])
+    unlocked = evaluate_achievements(db, "evento", {2: True})
+    assert [(user_id, info.tag) for user_id, info in unlocked] == [(2, 'b')]
+
+def test_evaluate_without_unlocks_does_not_insert(test_rules):
+    db = FakeSession(unlocked=[])
+    assert evaluate_achievements(db, "evento", {1: False}) == []
+    assert db.inserted == []
@@ -0,0 +1,149 @@
+# Testes dos contadores de streak: record_task_toggle (incremental, a cada toggle) tem de dar o mesmo
+# streak que rebuild_streaks (gaps and islands sobre task_status) e que o antigo get_streak_count.
+# A linha bloqueada e a consulta às outras tarefas do dia são substituídas por estado em memória.
+import random
+from datetime import date, timedelta
+import pytest
+import streaks
+from models.userStreakModel import UserStreak
+from streaks import active_streak, record_task_toggle
+
+START = date(2025, 7, 1)
+
+# Cópia em Python da consulta de rebuild_streaks: dias consecutivos têm o mesmo day - row_number.
+# Devolve (current_streak, longest_streak, last_completed_date), ou None se não há dias concluídos.
+def rebuild_reference(done_days):
+    days = sorted(set(done_days))
+    if not days:
+        return None
+    runs = {}
+    for row_number, day in enumerate(days, start=1):
+        island = day - timedelta(days=row_number)
+        length, _ = runs.get(island, (0, None))
+        runs[island] = (length + 1, day)
+    last_day = max(last for _, last in runs.values())
+    current = next(length for length, last in runs.values() if last == last_day)
+    return current, max(length for length, _ in runs.values()), last_day
+
+# Versão antiga de get_streak_count
+def old_streak_count(done_days, today):
+    dates = sorted(set(done_days), reverse=True)
+    if not dates or dates[0] != today:
+        return 0
+    streak = 1
+    for i in range(1, len(dates)):
+        if dates[i] == dates[i - 1] - timedelta(days=1):
+            streak += 1
+        else:
+            break
+    return streak
+
+
+class Tasks:
+    # task_status de um utilizador em memória: (task_id, dia) das tarefas concluídas
+    def __init__(self, monkeypatch):
+        self.done = set()
+        self.row = UserStreak(id_user=1, current_streak=0, longest_streak=0, last_completed_date=None)
+        monkeypatch.setattr(streaks, "_locked_streak", lambda db, user_id: self.row)
+        monkeypatch.setattr(streaks, "other_done_today", lambda db, user_id, day: any(
+            done_day == day for _, done_day in self.done
+        ))
+
+    def done_days(self):
+        return {day for _, day in self.done}
+
+    # Como toggle_task: o novo estado da tarefa está na sessão antes de atualizar o streak
+    def toggle(self, task_id, day):
+        done = (task_id, day) not in self.done
+        if done:
+            self.done.add((task_id, day))
+        else:
+            self.done.discard((task_id, day))
+        return record_task_toggle(None, 1, done, day)
+
+@pytest.fixture
+def tasks(monkeypatch):
+    return Tasks(monkeypatch)
+
+
+def assert_matches_rebuild(streak, done_days, day, undone):
+    reference = rebuild_reference(done_days)
+    if streak.last_completed_date is not None:
+        assert (streak.current_streak, streak.last_completed_date) == (reference[0], reference[2])
+    else:
+        # Ao desfazer o único dia de um streak, o contador fica vazio mesmo que haja dias concluídos
+        # mais antigos: nenhum deles é a véspera de um toggle futuro, por isso o streak ativo é igual
+        assert reference is None or reference[2] < day - timedelta(days=1)
+    # O longest_streak só cresce: depois de desfazer uma tarefa pode ficar acima do reconstruído
+    if reference and not undone:
+        assert streak.longest_streak == reference[1]
+    elif reference:
+        assert streak.longest_streak >= reference[1]
+
+    # O streak ativo (o que os troféus e o checkModoZen leem) é o do antigo get_streak_count
+    for today in (day, day + timedelta(days=1)):
+        assert active_streak(streak, today) == old_streak_count(done_days, today)
+
+
+def test_consecutive_days_extend_the_streak(tasks):
+    for offset in range(5):
+        streak = tasks.toggle(1, START + timedelta(days=offset))
+    assert (streak.current_streak, streak.longest_streak, streak.last_completed_date) == (5, 5, START + timedelta(days=4))
+
+def test_second_task_on_the_same_day_counts_once(tasks):
+    tasks.toggle(1, START)
+    streak = tasks.toggle(2, START)
+    assert (streak.current_streak, streak.last_completed_date) == (1, START)
+
+def test_gap_restarts_the_streak(tasks):
+    tasks.toggle(1, START)
+    tasks.toggle(1, START + timedelta(days=1))
+    streak = tasks.toggle(1, START + timedelta(days=3))
+    assert (streak.current_streak, streak.longest_streak) == (1, 2)
+
+def test_undo_keeps_the_day_while_another_task_is_done(tasks):
+    tasks.toggle(1, START)
+    tasks.toggle(1, START + timedelta(days=1))
+    tasks.toggle(2, START + timedelta(days=1))
+    streak = tasks.toggle(1, START + timedelta(days=1))
+    assert (streak.current_streak, streak.last_completed_date) == (2, START + timedelta(days=1))
+
+def test_undo_of_the_last_task_of_the_day_drops_the_day(tasks):
+    tasks.toggle(1, START)
+    tasks.toggle(1, START + timedelta(days=1))
+    streak = tasks.toggle(1, START + timedelta(days=1))
+    assert (streak.current_streak, streak.last_completed_date) == (1, START)
+    # Voltar a concluir o mesmo dia continua o streak
+    streak = tasks.toggle(1, START + timedelta(days=1))
+    assert (streak.current_streak, streak.longest_streak) == (2, 2)
+
+def test_undo_of_a_single_day_streak_clears_it(tasks):
+    tasks.toggle(1, START)
+    streak = tasks.toggle(1, START + timedelta(days=2))
+    streak = tasks.toggle(1, START + timedelta(days=2))
+    assert (streak.current_streak, streak.last_completed_date) == (0, None)
+    assert active_streak(streak, START + timedelta(days=2)) == 0
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random_toggles_match_rebuild(tasks, seed):
+    rng = random.Random(seed)
+    day = START
+    undone = False
+    for _ in range(120):
+        # Os toggles são sempre sobre as tarefas do dia local atual, que nunca anda para trás
+        day += timedelta(days=rng.choice([0, 0, 0, 1, 1, 1, 2, 3]))
+        task_id = rng.randint(1, 3)
+        undone |= (task_id, day) in tasks.done
+        streak = tasks.toggle(task_id, day)
+        assert_matches_rebuild(streak, tasks.done_days(), day, undone)
+
+
+@pytest.mark.parametrize("last_completed_date, today, expected", [
+    (START, START, 4),
+    (START - timedelta(days=1), START, 0),
+    (None, START, 0),
+])
+def test_active_streak_only_counts_if_done_today(last_completed_date, today, expected):
+    streak = UserStreak(current_streak=4, longest_streak=4, last_completed_date=last_completed_date)
+    assert active_streak(streak, today) == expected
+    assert active_streak(None, today) == 0
@@ -0,0 +1,225 @@
+# Testes do dia local dos utilizadores e da passagem de dia escalonada das tarefas.
+# A seleção em SQL (ASSIGN_TASKS_SQL) precisa do PostgreSQL; aqui testa-se a mesma condição em Python
+# e o instante `since` que o job passa de uma execução para a seguinte.
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+import pytest
+import cronjob
+import timezones
+from timezones import DEFAULT_TIMEZONE, get_zone, is_supported_timezone, local_now, local_today
+
+UTC = timezone.utc
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    # Fixa o datetime.now() usado pelo módulo timezones
+    class FrozenDatetime(datetime):
+        instant = None
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.instant.astimezone(tz)
+
+    monkeypatch.setattr(timezones, "datetime", FrozenDatetime)
+    def freeze(instant):
+        FrozenDatetime.instant = instant
+    return freeze
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("UTC", date(2025, 7, 14)),
+    ("Europe/Lisbon", date(2025, 7, 15)),
+    ("Asia/Tokyo", date(2025, 7, 15)),
+    ("America/Los_Angeles", date(2025, 7, 14)),
+    ("Pacific/Kiritimati", date(2025, 7, 15)),
+    ("Pacific/Pago_Pago", date(2025, 7, 14)),
+])
+def test_local_today_per_timezone(frozen_now, name, expected):
+    frozen_now(datetime(2025, 7, 14, 23, 30, tzinfo=UTC))
+    assert local_today(name) == expected
+
+@pytest.mark.parametrize("name", [None, "", "Mars/Olympus", "../etc/passwd"])
+def test_unknown_timezone_uses_default(frozen_now, name):
+    frozen_now(datetime(2025, 7, 14, 23, 30, tzinfo=UTC))
+    assert get_zone(name) == ZoneInfo(DEFAULT_TIMEZONE)
+    assert local_today(name) == local_today(DEFAULT_TIMEZONE)
+
+def test_local_now_is_naive_local_time(frozen_now):
+    # O completed_at das tarefas é guardado como hora local sem timezone
+    frozen_now(datetime(2025, 1, 10, 12, 0, tzinfo=UTC))
+    assert local_now("Asia/Kathmandu") == datetime(2025, 1, 10, 17, 45)
+
+
+class ScalarResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+class PgTimezones:
+    # Só responde à consulta a pg_timezone_names
+    def __init__(self, names):
+        self.names = set(names)
+        self.queries = 0
+
+    def execute(self, statement, params):
+        self.queries += 1
+        return ScalarResult(params["name"] in self.names)
+
+def test_supported_timezone_must_exist_in_zoneinfo_and_postgres():
+    db = PgTimezones({"Europe/Lisbon", "Asia/Tokyo"})
+    assert is_supported_timezone(db, "Europe/Lisbon")
+    # Existe no zoneinfo mas não no PostgreSQL
+    assert not is_supported_timezone(db, "posixrules")
+    assert db.queries == 2
+    # Inválida para o zoneinfo: nem chega a consultar a base de dados
+    assert not is_supported_timezone(db, "Mars/Olympus")
+    assert db.queries == 2
+
+
+# A condição de ASSIGN_TASKS_SQL: entra quem já passou a meia-noite local desde `since`
+def due(since, now, name):
+    zone = get_zone(name)
+    return since is None or since.astimezone(zone).date() < now.astimezone(zone).date()
+
+@pytest.mark.parametrize("name", [
+    "Europe/Lisbon",          # muda para a hora de inverno a 26/10
+    "America/New_York",       # muda a 2/11
+    "Australia/Lord_Howe",    # meia hora de diferença na mudança de hora, a 5/10
+    "Asia/Kathmandu",         # +05:45
+    "Pacific/Chatham",        # +12:45 / +13:45
+    "Pacific/Kiritimati",     # +14
+    "Pacific/Pago_Pago",      # -11
+])
+@pytest.mark.parametrize("start", [date(2025, 10, 3), date(2025, 10, 24), date(2025, 10, 31)])
+def test_rollover_picks_each_user_once_per_local_day(name, start):
+    zone = get_zone(name)
+    interval = timedelta(minutes=cronjob.ROLLOVER_INTERVAL_MINUTES)
+    run = datetime.combine(start, datetime.min.time(), tzinfo=UTC)
+    since = None
+    picked = []
+    for _ in range(4 * 24 * 60 // cronjob.ROLLOVER_INTERVAL_MINUTES):
+        if due(since, run, name):
+            picked.append(run)
+        since, run = run, run + interval
+
+    # A primeira execução processa todos; depois, uma vez por dia local, na primeira execução após a meia-noite
+    local_days = [moment.astimezone(zone).date() for moment in picked]
+    assert local_days == sorted(set(local_days))
+    assert local_days[1:] == [local_days[0] + timedelta(days=offset) for offset in range(1, len(local_days))]
+    for moment in picked[1:]:
+        local = moment.astimezone(zone)
+        assert (moment - interval).astimezone(zone).date() < local.date()
+        assert local - datetime.combine(local.date(), datetime.min.time(), tzinfo=zone) < interval
+
+
+class FakeSession:
+    # Sessão para assign_missing_tasks: o now() da base de dados, o número de tarefas e os IDs dos utilizadores
+    def __init__(self, now, tasks=5, user_ids=(1, 45)):
+        self.now = now
+        self.tasks = tasks
+        self.user_ids = user_ids
+        self.commits = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, statement):
+        return ScalarResult(self.now)
+
+    def query(self, *entities):
+        return self
+
+    def count(self):
+        return self.tasks
+
+    def one(self):
+        return self.user_ids
+
+    def commit(self):
+        self.commits += 1
+
+@pytest.fixture
+def assignment(monkeypatch):
+    monkeypatch.setattr(cronjob, "_last_assignment", None)
+    state = {"session": None, "calls": [], "fail_at": None}
+    monkeypatch.setattr(cronjob, "Session", lambda engine: state["session"])
+
+    def assign_tasks_in_range(session, start, end, today=None, since=None):
+        if start == state["fail_at"]:
+            raise RuntimeError("chunk failed")
+        state["calls"].append((start, end, since))
+        return 2
+    monkeypatch.setattr(cronjob, "assign_tasks_in_range", assign_tasks_in_range)
+    return state
+
+def test_first_assignment_covers_all_users_in_chunks(assignment):
+    started_at = datetime(2025, 7, 14, 23, 0, tzinfo=UTC)
+    assignment["session"] = FakeSession(started_at, user_ids=(1, 45))
+    assert cronjob.assign_missing_tasks(chunk_size=20) == 6
+    assert assignment["calls"] == [(1, 21, None), (21, 41, None), (41, 61, None)]
+    assert assignment["session"].commits == 3
+    assert cronjob._last_assignment == started_at
+
+def test_rollover_passes_the_previous_assignment_start(assignment):
+    first = datetime(2025, 7, 14, 23, 0, tzinfo=UTC)
+    assignment["session"] = FakeSession(first)
+    cronjob.rollover_due_users()
+    assert [since for _, _, since in assignment["calls"]] == [None]
+
+    second = first + timedelta(minutes=cronjob.ROLLOVER_INTERVAL_MINUTES)
+    assignment["session"] = FakeSession(second)
+    assignment["calls"].clear()
+    cronjob.rollover_due_users()
+    assert [since for _, _, since in assignment["calls"]] == [first]
+    assert cronjob._last_assignment == second
+
+def test_failed_rollover_is_retried_from_the_same_instant(assignment):
+    first = datetime(2025, 7, 14, 23, 0, tzinfo=UTC)
+    assignment["session"] = FakeSession(first, user_ids=(1, 45))
+    cronjob.assign_missing_tasks(chunk_size=20)
+
+    # Um bloco falha: o instante não avança, para que a execução seguinte volte a apanhar
+    # os utilizadores que passaram a meia-noite entretanto
+    assignment["session"] = FakeSession(first + timedelta(minutes=15), user_ids=(1, 45))
+    assignment["fail_at"] = 21
+    with pytest.raises(RuntimeError):
+        cronjob.assign_missing_tasks(chunk_size=20, since=cronjob._last_assignment)
+    assert cronjob._last_assignment == first
+
+    assignment["session"] = FakeSession(first + timedelta(minutes=30), user_ids=(1, 45))
+    assignment["fail_at"] = None
+    assignment["calls"].clear()
+    cronjob.rollover_due_users()
+    assert {since for _, _, since in assignment["calls"]} == {first}
+
+def test_no_assignment_without_enough_tasks(assignment):
+    assignment["session"] = FakeSession(datetime(2025, 7, 14, 23, 0, tzinfo=UTC), tasks=cronjob.TASKS_PER_DAY - 1)
+    assert cronjob.rollover_due_users() == 0
+    assert assignment["calls"] == []
+    assert cronjob._last_assignment is None
+
+
+class CapturingSession:
+    def __init__(self):
+        self.params = None
+
+    def execute(self, statement, params):
+        self.params = params
+        return type("Result", (), {"rowcount": 2})()
+
+def test_assign_tasks_for_user_fixes_the_local_day():
+    session = CapturingSession()
+    assert cronjob.assign_tasks_for_user(session, 7, date(2025, 7, 15)) == 2
+    assert session.params == {
+        "start": 7,
+        "end": 8,
+        "today": date(2025, 7, 15),
+        "since": None,
+        "per_day": cronjob.TASKS_PER_DAY,
+        "default_timezone": DEFAULT_TIMEZONE,
+    }
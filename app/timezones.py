@@ -0,0 +1,41 @@
+import os
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from models.userModel import User
+
+# Timezone dos utilizadores sem timezone definida (nome IANA, ex: 'Europe/Lisbon')
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Europe/Lisbon")
+
+def is_valid_timezone(name: str) -> bool:
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+# O zoneinfo (Python) e o AT TIME ZONE (PostgreSQL) não usam a mesma base de dados de timezones
+# (ex: o zoneinfo tem `posixrules` e `right/...`): só se guardam as que existem nas duas
+def is_supported_timezone(db: Session, name: str) -> bool:
+    return is_valid_timezone(name) and db.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_timezone_names WHERE name = :name)"), {"name": name}
+    ).scalar()
+
+@lru_cache(maxsize=None)
+def get_zone(name: Optional[str]) -> ZoneInfo:
+    if name and is_valid_timezone(name):
+        return ZoneInfo(name)
+    return ZoneInfo(DEFAULT_TIMEZONE)
+
+# Hora local do utilizador, sem tzinfo: é assim que o completed_at das tarefas é guardado
+def local_now(timezone: Optional[str]) -> datetime:
+    return datetime.now(get_zone(timezone)).replace(tzinfo=None)
+
+def local_today(timezone: Optional[str]) -> date:
+    return local_now(timezone).date()
+
+def user_timezone(db: Session, user_id: int) -> Optional[str]:
+    return db.query(User.timezone).filter(User.id == user_id).scalar()